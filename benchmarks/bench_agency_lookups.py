@@ -0,0 +1,51 @@
+"""
+Measure the cost of Agency lookups as the number of entities grows.
+
+Run from the repository root:  python -m benchmarks.bench_agency_lookups
+"""
+import random
+import time
+
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+LOOKUPS = 100_000
+
+
+def build_agency(size: int) -> Agency:
+    agency = Agency()
+    for paper_id in range(1, 51):
+        agency.add_newspaper(Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0))
+    for subscriber_id in range(size):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id, name="Reader", address="Vienna"))
+    return agency
+
+
+def time_per_call(func, keys) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def main():
+    print(f"{'entities':>10} {'get_subscriber':>16} {'get_newspaper':>15} {'add+remove':>12}")
+    for size in SIZES:
+        agency = build_agency(size)
+        keys = [random.randrange(size) for _ in range(LOOKUPS)]
+        lookup = time_per_call(agency.get_subscriber, keys)
+        paper_lookup = time_per_call(agency.get_newspaper, [key % 50 + 1 for key in keys])
+
+        def add_remove(key):
+            sub = Subscriber(subscriber_id=size + key, name="Reader", address="Vienna")
+            agency.add_subscriber(sub)
+            agency.remove_subscriber(sub)
+
+        churn = time_per_call(add_remove, keys[:10_000])
+        print(f"{size:>10} {lookup * 1e9:>13.0f} ns {paper_lookup * 1e9:>12.0f} ns {churn * 1e9:>9.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Time auto_assign_issues for 50k unassigned issues over 10 newspapers with 20 editors each, against handing the same
+issues out one specify_editor call at a time.
+
+Run from the repository root:  python -m benchmarks.bench_auto_assign
+"""
+import time
+from collections import Counter
+
+from src.model.agency import Agency
+from src.model.editor import Editor
+from src.model.newspaper import Newspaper
+
+PAPERS = 10
+ISSUES_PER_PAPER = 5_000
+EDITORS_PER_PAPER = 20
+
+
+def build_agency() -> Agency:
+    agency = Agency()
+    agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0)
+                           for paper_id in range(1, PAPERS + 1)])
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                        for editor_id in range(1, PAPERS * EDITORS_PER_PAPER + 1)])
+    for paper in agency.newspapers:
+        agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                         "number_of_pages": 10}] * ISSUES_PER_PAPER)
+        first = 1 + (paper.paper_id - 1) * EDITORS_PER_PAPER
+        for editor_id in range(first, first + EDITORS_PER_PAPER):
+            agency.add_newspaper_to_editor(paper.paper_id, editor_id)
+    return agency
+
+
+def main():
+    agency = build_agency()
+    start = time.perf_counter()
+    orphans = agency.unassigned_issues()
+    for number, issue in enumerate(orphans):
+        paper_id = issue.paper_id
+        agency.specify_editor(paper_id, issue.issue_id, 1 + (paper_id - 1) * EDITORS_PER_PAPER
+                              + number % EDITORS_PER_PAPER)
+    print(f"specify_editor per issue: {len(orphans)} issues in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    agency = build_agency()
+    start = time.perf_counter()
+    assigned = agency.auto_assign_issues()
+    elapsed = time.perf_counter() - start
+    loads = Counter(assigned.values())
+    print(f"auto_assign_issues: {len(assigned)} issues to {len(loads)} editors in {elapsed * 1000:.0f} ms, "
+          f"{min(loads.values())} to {max(loads.values())} issues each, {len(agency.orphans)} left")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Measure the throughput of the bulk subscriber endpoint against one POST per subscriber.
+
+Run from the repository root:  python -m benchmarks.bench_bulk_ingestion
+"""
+import time
+
+from src.app import create_app
+from src.model.agency import Agency
+
+SIZES = [10_000, 100_000]
+SINGLE_POSTS = 2_000
+
+
+def payload(size: int):
+    return [{"subscriber_name": f"Reader {number}", "subscriber_address": "Vienna"} for number in range(size)]
+
+
+def main():
+    client = create_app().test_client()
+
+    Agency.singleton_instance = None
+    start = time.perf_counter()
+    for item in payload(SINGLE_POSTS):
+        client.post("/subscriber/", json=item)
+    elapsed = time.perf_counter() - start
+    print(f"single POST: {SINGLE_POSTS / elapsed:>9.0f} subscribers/s")
+
+    for size in SIZES:
+        Agency.singleton_instance = None
+        items = payload(size)
+        start = time.perf_counter()
+        response = client.post("/subscriber/bulk", json=items)
+        elapsed = time.perf_counter() - start
+        assert response.get_json()["created"] == size
+        print(f"bulk {size:>7}: {size / elapsed:>9.0f} subscribers/s ({elapsed:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Time remove_newspaper for a long-running daily paper and for a small paper, in an agency of 100k subscribers. The
+cascade walks only what refers to the removed paper, so the small one should be quick however big the agency is.
+
+Run from the repository root:  python -m benchmarks.bench_cascade
+"""
+import time
+
+from src.model.agency import Agency
+from src.model.editor import Editor
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+PAPERS = 50
+SUBSCRIBERS = 100_000
+EDITORS = 200
+DAILY_ISSUES = 5_000
+DELIVERED_ISSUES = 30
+
+
+def build_agency() -> Agency:
+    agency = Agency()
+    agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0)
+                           for paper_id in range(1, PAPERS + 1)])
+    daily = agency.get_newspaper(1)
+    issues = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 10}] * DAILY_ISSUES)
+    for paper_id in range(2, PAPERS + 1):
+        agency.add_issues_to_newspaper(paper_id, [{"release_date": "14.04.2024", "number_of_pages": 10}] * 10)
+
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                        for editor_id in range(1, EDITORS + 1)])
+    for number, issue in enumerate(issues):
+        agency.specify_editor(daily.paper_id, issue.issue_id, number % EDITORS + 1)
+    for paper_id in range(2, PAPERS + 1):
+        agency.add_newspaper_to_editor(paper_id, paper_id % EDITORS + 1)
+
+    # A third of the subscribers read the daily, everybody reads two other papers
+    agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                            for sub_id in range(1, SUBSCRIBERS + 1)])
+    for sub in agency.subscribers:
+        if sub.subscriber_id % 3 == 0:
+            sub.subscriptions.append(1)
+        sub.subscriptions.extend({2 + sub.subscriber_id % (PAPERS - 1), 2 + (sub.subscriber_id * 7) % (PAPERS - 1)})
+    for issue in issues[:DELIVERED_ISSUES]:
+        agency.release_issue(daily.paper_id, issue.issue_id)
+        agency.deliver_issue_to_all(daily.paper_id, issue.issue_id)
+    return agency
+
+
+def main():
+    start = time.perf_counter()
+    agency = build_agency()
+    print(f"built agency with {len(agency.deliveries)} deliveries in {time.perf_counter() - start:.1f} s")
+
+    for paper_id in (PAPERS, 1):
+        start = time.perf_counter()
+        report = agency.remove_newspaper(agency.get_newspaper(paper_id))
+        print(f"removed paper {paper_id} in {(time.perf_counter() - start) * 1000:.1f} ms: {report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Stress the agency with reader threads while a writer keeps changing it, and measure the read throughput per number of
+reader threads. Reads which walk many entities share the read lock, only the writer excludes them.
+
+Run from the repository root:  python -m benchmarks.bench_concurrency
+"""
+import random
+import threading
+import time
+
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+READERS = [1, 2, 4, 8, 16]
+SUBSCRIBERS = 10_000
+NEWSPAPERS = 20
+SECONDS = 2.0
+
+
+def build_agency() -> Agency:
+    agency = Agency()
+    agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0)
+                           for paper_id in range(1, NEWSPAPERS + 1)])
+    subscribers = []
+    for sub_id in agency.new_subscriber_ids(SUBSCRIBERS):
+        sub = Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+        sub.subscriptions.append(sub_id % NEWSPAPERS + 1)
+        subscribers.append(sub)
+    agency.add_subscribers(subscribers)
+    return agency
+
+
+def main():
+    agency = build_agency()
+    subscriber_ids = agency.subscribers.keys()
+    print(f"{'readers':>8} {'reads/s':>10} {'writes/s':>10}")
+    for readers in READERS:
+        stop = threading.Event()
+        reads = [0] * readers
+        writes = [0]
+
+        def read(slot):
+            rng = random.Random(slot)
+            while not stop.is_set():
+                sub_id = rng.choice(subscriber_ids)
+                agency.get_subscriber_stats(sub_id)
+                agency.get_newspaper_stats(rng.randrange(NEWSPAPERS) + 1)
+                agency.subscribers_page(None, 50)
+                reads[slot] += 3
+
+        def write():
+            rng = random.Random(readers)
+            while not stop.is_set():
+                agency.update_subscriber(agency.get_subscriber(rng.choice(subscriber_ids)), address="Graz")
+                paper = agency.get_newspaper(rng.randrange(NEWSPAPERS) + 1)
+                agency.update_newspaper(paper, price=paper.price + 0.01)
+                writes[0] += 2
+
+        threads = [threading.Thread(target=read, args=(slot,)) for slot in range(readers)]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        time.sleep(SECONDS)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"{readers:>8} {sum(reads) / SECONDS:>10.0f} {writes[0] / SECONDS:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
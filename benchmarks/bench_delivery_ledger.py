@@ -0,0 +1,38 @@
+"""
+Measure the memory used per delivery and the cost of delivery queries.
+
+Run from the repository root:  python -m benchmarks.bench_delivery_ledger
+"""
+import time
+
+from src.model.ledger import DeliveryLedger
+
+SUBSCRIBERS = 100_000
+PAPERS = 5
+ISSUES_PER_PAPER = 10
+
+
+def main():
+    ledger = DeliveryLedger()
+    start = time.perf_counter()
+    for subscriber_id in range(SUBSCRIBERS):
+        for paper_id in range(1, PAPERS + 1):
+            for issue_id in range(1000, 1000 + ISSUES_PER_PAPER):
+                ledger.record(subscriber_id, paper_id, issue_id)
+    elapsed = time.perf_counter() - start
+    print(f"recorded {len(ledger)} deliveries in {elapsed:.2f} s ({elapsed / len(ledger) * 1e9:.0f} ns each)")
+    print(f"memory: {ledger.nbytes() / 2 ** 20:.1f} MiB, {ledger.bytes_per_delivery():.1f} bytes per delivery")
+
+    start = time.perf_counter()
+    for subscriber_id in range(SUBSCRIBERS):
+        ledger.delivered(subscriber_id, PAPERS, 1000 + ISSUES_PER_PAPER - 1)
+    print(f"delivered(): {(time.perf_counter() - start) / SUBSCRIBERS * 1e9:.0f} ns per query")
+
+    start = time.perf_counter()
+    for subscriber_id in range(SUBSCRIBERS):
+        ledger.count(subscriber_id, PAPERS)
+    print(f"count(): {(time.perf_counter() - start) / SUBSCRIBERS * 1e9:.0f} ns per query")
+
+
+if __name__ == '__main__':
+    main()
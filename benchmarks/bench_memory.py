@@ -0,0 +1,82 @@
+"""
+Measure the memory per entity of the model: issues, newspapers, editors with their references, and subscribers with
+their subscriptions and deliveries. Allocations are traced with tracemalloc, so the numbers include every index the
+agency keeps for the entities.
+
+Run from the repository root:  python -m benchmarks.bench_memory
+"""
+import gc
+import tracemalloc
+
+from src.model.agency import Agency
+from src.model.editor import Editor
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+PAPERS = 100
+ISSUES_PER_PAPER = 1_000
+EDITORS = 1_000
+SUBSCRIBERS = 100_000
+SUBSCRIPTIONS_PER_SUBSCRIBER = 3
+
+
+def traced(step) -> int:
+    # Bytes still allocated after the step
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    step()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def main():
+    agency = Agency()
+    tracemalloc.start()
+
+    def add_papers():
+        agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=7, price=2.5)
+                               for paper_id in agency.new_paper_ids(PAPERS)])
+
+    def add_issues():
+        for paper in agency.newspapers:
+            agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                             "number_of_pages": 10}] * ISSUES_PER_PAPER)
+
+    def add_editors():
+        agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                            for editor_id in agency.new_editor_ids(EDITORS)])
+
+    def assign():
+        # Every editor edits one paper and a tenth of its issues
+        for number, editor in enumerate(agency.editors):
+            paper = agency.newspapers[number % PAPERS]
+            editor.newspapers.append(paper)
+            for issue in list(paper.issues)[number // PAPERS::10]:
+                editor.issues.append(issue)
+
+    def add_subscribers():
+        agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                                for sub_id in agency.new_subscriber_ids(SUBSCRIBERS)])
+
+    def subscribe():
+        paper_ids = agency.newspapers.keys()
+        for number, sub in enumerate(agency.subscribers):
+            for offset in range(SUBSCRIPTIONS_PER_SUBSCRIBER):
+                sub.subscriptions.append(paper_ids[(number + offset) % PAPERS])
+
+    issues = PAPERS * ISSUES_PER_PAPER
+    references = EDITORS * (1 + ISSUES_PER_PAPER // 10)
+    subscriptions = SUBSCRIBERS * SUBSCRIPTIONS_PER_SUBSCRIBER
+    for label, step, count in [("newspaper", add_papers, PAPERS),
+                               ("issue", add_issues, issues),
+                               ("editor", add_editors, EDITORS),
+                               ("editor reference", assign, references),
+                               ("subscriber", add_subscribers, SUBSCRIBERS),
+                               ("subscription", subscribe, subscriptions)]:
+        size = traced(step)
+        print(f"{label:>17}: {size / count:8.0f} bytes each ({count} in {size / 2 ** 20:.1f} MiB)")
+    tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    main()
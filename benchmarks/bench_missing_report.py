@@ -0,0 +1,85 @@
+"""
+Time the agency-wide missing-delivery report for 100k subscribers and 50 newspapers, and the latency of writes
+while the report is streamed.
+
+Run from the repository root:  python -m benchmarks.bench_missing_report
+"""
+import random
+import statistics
+import threading
+import time
+
+from src.api.reportNS import stream_missing_report
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+SUBSCRIBERS = 100_000
+PAPERS = 50
+SUBSCRIPTIONS_PER_SUBSCRIBER = 3
+RELEASED_ISSUES = 10
+DELIVERY_RATE = 0.9
+
+
+def build_agency() -> Agency:
+    rng = random.Random(1)
+    agency = Agency()
+    for paper_id in range(1, PAPERS + 1):
+        agency.add_newspaper(Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0))
+        for _ in range(RELEASED_ISSUES):
+            issue = agency.add_issue_to_newspaper(paper_id, {"release_date": "14.04.2024", "number_of_pages": 10})
+            agency.release_issue(paper_id, issue.issue_id)
+
+    for subscriber_id in range(100_000, 100_000 + SUBSCRIBERS):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id, name="Reader", address="Vienna"))
+        for paper_id in rng.sample(range(1, PAPERS + 1), SUBSCRIPTIONS_PER_SUBSCRIBER):
+            agency.subscribe(paper_id, subscriber_id)
+            for issue_id in agency.released_issues[paper_id]:
+                if rng.random() < DELIVERY_RATE:
+                    agency.deliveries.record(subscriber_id, paper_id, issue_id)
+    return agency
+
+
+def main():
+    start = time.perf_counter()
+    agency = build_agency()
+    print(f"built agency with {len(agency.deliveries)} deliveries in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    rows = sum(len(block.subscriber_ids) for block in agency.missing_report())
+    print(f"computed {rows} missing deliveries in {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in stream_missing_report(agency.missing_report()))
+    print(f"computed and encoded {size / 2 ** 20:.1f} MiB of JSON in {time.perf_counter() - start:.2f} s")
+
+    # Pinning after a single change copies only the changed paper
+    agency.update_newspaper(agency.newspapers[0], price=2.0)
+    start = time.perf_counter()
+    agency.pin()
+    print(f"pinned a new version in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Writes while the report is streamed in another thread
+    latencies = []
+    streaming = threading.Event()
+    streaming.set()
+
+    def stream():
+        for _ in stream_missing_report(agency.missing_report()):
+            pass
+        streaming.clear()
+
+    reader = threading.Thread(target=stream)
+    reader.start()
+    subscribers = agency.all_subscribers()
+    while streaming.is_set():
+        start = time.perf_counter()
+        agency.update_subscriber(random.choice(subscribers), address="Graz")
+        latencies.append(time.perf_counter() - start)
+    reader.join()
+    print(f"{len(latencies)} writes during the report: median {statistics.median(latencies) * 1e6:.0f} us, "
+          f"max {max(latencies) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
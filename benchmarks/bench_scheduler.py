@@ -0,0 +1,74 @@
+"""
+Time a burst of 20k issues coming due at once: released by the scheduler thread, against one release_issue call per
+issue. With SQLite, the scheduler commits once per burst instead of once per issue.
+
+Run from the repository root:  python -m benchmarks.bench_scheduler
+"""
+import os
+import tempfile
+import time
+
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.scheduler import ReleaseScheduler
+from src.model.storage import MemoryStorage, SqliteStorage
+
+PAPERS = 20
+ISSUES_PER_PAPER = 1_000
+
+
+def build_agency(storage) -> Agency:
+    agency = Agency(storage=storage)
+    agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0)
+                           for paper_id in range(1, PAPERS + 1)])
+    return agency
+
+
+def add_burst(agency: Agency):
+    # Every issue is due already
+    for paper in agency.newspapers:
+        agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                         "number_of_pages": 10}] * ISSUES_PER_PAPER)
+
+
+def by_hand(storage) -> float:
+    agency = build_agency(storage)
+    add_burst(agency)
+    start = time.perf_counter()
+    for paper in agency.newspapers:
+        for issue in paper.issues:
+            agency.release_issue(paper.paper_id, issue.issue_id)
+    return time.perf_counter() - start
+
+
+def scheduled(storage):
+    agency = build_agency(storage)
+    add_burst(agency)
+    scheduler = ReleaseScheduler(agency)
+    start = time.perf_counter()
+    scheduler.start()
+    while scheduler.released < PAPERS * ISSUES_PER_PAPER:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    scheduler.stop()
+    return elapsed, scheduler.metrics()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {
+            "memory": MemoryStorage,
+            "sqlite": lambda: SqliteStorage(os.path.join(directory, f"{time.monotonic_ns()}.db")),
+        }
+        for name, engine in engines.items():
+            elapsed = by_hand(engine())
+            print(f"{name:7} release_issue per issue: {PAPERS * ISSUES_PER_PAPER / elapsed:9.0f} releases/s")
+            elapsed, metrics = scheduled(engine())
+            lag = metrics["lag"]
+            print(f"{name:7} scheduler:               {metrics['released'] / elapsed:9.0f} releases/s, "
+                  f"{metrics['wakeups']} wakeups, largest burst {metrics['largest_burst']}, "
+                  f"lag p50 {lag['p50'] * 1000:.0f} ms, p99 {lag['p99'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
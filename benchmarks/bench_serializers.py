@@ -0,0 +1,64 @@
+"""
+Measure the per-object cost of flask-restx marshal() against the compiled serializers, with and without encoding, and
+of an issue listing which joins cached fragments.
+
+Run from the repository root:  python -m benchmarks.bench_serializers
+"""
+import json
+import time
+
+from flask_restx import marshal
+
+from src.api.editorNS import editor_model
+from src.api.newspaperNS import issue_model, paper_model
+from src.api.serializers import orjson, render_fragments, serializer_for
+from src.api.subscriberNS import subscriber_model
+from src.model.editor import Editor
+from src.model.issue import Issue
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+COUNT = 100_000
+
+
+def entities(model):
+    if model is paper_model:
+        return [Newspaper(paper_id=n, name=f"Paper {n}", frequency=7, price=3.5) for n in range(COUNT)]
+    if model is issue_model:
+        return [Issue(issue_id=n, release_date="14.04.2024", number_of_pages=12) for n in range(COUNT)]
+    if model is editor_model:
+        return [Editor(editor_id=n, editor_name=f"Editor {n}", address="Vienna") for n in range(COUNT)]
+    return [Subscriber(subscriber_id=n, name=f"Reader {n}", address="Vienna") for n in range(COUNT)]
+
+
+def per_object(func, items) -> float:
+    start = time.perf_counter()
+    func(items)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    for model in (paper_model, issue_model, editor_model, subscriber_model):
+        items = entities(model)
+        serializer = serializer_for(model)
+        timings = {
+            "marshal": per_object(lambda objs: marshal(objs, model, envelope='items'), items),
+            "compiled": per_object(lambda objs: serializer.envelope(objs, 'items'), items),
+            "marshal+json": per_object(lambda objs: json.dumps(marshal(objs, model, envelope='items')), items),
+            "compiled+json": per_object(lambda objs: json.dumps(serializer.envelope(objs, 'items')), items),
+        }
+        if orjson is not None:
+            timings["compiled+orjson"] = per_object(lambda objs: orjson.dumps(serializer.envelope(objs, 'items')),
+                                                    items)
+        print(f"{model.name:<16}" + "  ".join(f"{name}: {micros:5.2f} us" for name, micros in timings.items()))
+
+    issues = entities(issue_model)
+    serializer = serializer_for(issue_model)
+    join = lambda objs: '{"issue": [' + ', '.join(render_fragments(serializer, objs)) + ']}'
+    cold = per_object(join, issues)
+    warm = per_object(join, issues)
+    print(f"issue listing   fragments cold: {cold:5.2f} us  fragments warm: {warm:5.2f} us")
+
+
+if __name__ == '__main__':
+    main()
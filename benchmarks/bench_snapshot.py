@@ -0,0 +1,103 @@
+"""
+Measure how long a snapshot of a large agency takes to write and to load, against replaying the log of the same agency,
+and the longest time the snapshot holds the read lock of the agency, which writers (and readers behind them) wait for.
+
+Run from the repository root:  python -m benchmarks.bench_snapshot
+"""
+import gc
+import os
+import tempfile
+import time
+
+from src.model.agency import Agency
+from src.model.issue import Issue
+from src.model.newspaper import Newspaper
+from src.model.snapshot import load_snapshot, save_snapshot
+from src.model.subscriber import Subscriber
+
+NEWSPAPERS = 100
+ISSUES_PER_PAPER = 20
+SUBSCRIBERS = [200_000, 1_000_000]
+# Subscribers in the log used for the replay comparison, replay time grows linearly with it
+REPLAYED_SUBSCRIBERS = 100_000
+
+
+def build_agency(subscribers: int, wal_path: str = None) -> Agency:
+    agency = Agency(id_ranges={"subscriber": (100000, None)})
+    if wal_path is not None:
+        agency.open_log(wal_path, fsync=False)
+    papers = []
+    for paper_id in range(1, NEWSPAPERS + 1):
+        paper = Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=7, price=2.5)
+        paper.issues.extend(Issue(issue_id=1000 + n, release_date="14.04.2024", number_of_pages=20,
+                                  released=n < ISSUES_PER_PAPER // 2) for n in range(ISSUES_PER_PAPER))
+        papers.append(paper)
+    agency.add_newspapers(papers)
+    new_subscribers = []
+    for number, sub_id in enumerate(agency.new_subscriber_ids(subscribers)):
+        sub = Subscriber(subscriber_id=sub_id, name=f"Reader {sub_id}", address="Vienna")
+        sub.subscriptions.extend((1 + (number + k) % NEWSPAPERS) for k in range(2))
+        new_subscribers.append(sub)
+    agency.add_subscribers(new_subscribers)
+    # Every paper delivers its first released issue to all subscribers
+    for paper in papers:
+        agency.deliver_issue_to_all(paper.paper_id, 1000)
+    return agency
+
+
+class TimedRead(object):
+    # Wraps the read side of the agency's lock and keeps the longest time it was held
+
+    def __init__(self, read):
+        self.read = read
+        self.longest = 0.0
+
+    def __enter__(self):
+        self.read.__enter__()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.longest = max(self.longest, time.perf_counter() - self.start)
+        return self.read.__exit__(*exc)
+
+
+def timed_snapshot(agency: Agency, path: str):
+    # Seconds to write the snapshot, and the longest hold of the read lock
+    read = agency.lock.read
+    agency.lock.read = timed = TimedRead(read)
+    try:
+        start = time.perf_counter()
+        save_snapshot(agency, path)
+        return time.perf_counter() - start, timed.longest
+    finally:
+        agency.lock.read = read
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for subscribers in SUBSCRIBERS:
+            path = os.path.join(directory, f"agency-{subscribers}.snapshot")
+            agency = build_agency(subscribers)
+            written, held = timed_snapshot(agency, path)
+            del agency
+            # The agency is full of reference cycles, free it before the next one is loaded
+            gc.collect()
+
+            loaded = Agency()
+            info = load_snapshot(path, loaded)
+            # Again from the loaded agency, its subscribers are copied from the columns of the snapshot
+            rewritten, reheld = timed_snapshot(loaded, path)
+            print(f"{subscribers:>9} subscribers, {info.deliveries:>9} deliveries: write {written:6.2f} s "
+                  f"(lock held {held * 1000:6.1f} ms), load {info.seconds:6.2f} s, write loaded {rewritten:6.2f} s "
+                  f"(lock held {reheld * 1000:6.1f} ms), {os.path.getsize(path) / 2 ** 20:6.1f} MiB")
+            del loaded
+            gc.collect()
+
+        wal_path = os.path.join(directory, "agency.wal")
+        build_agency(REPLAYED_SUBSCRIBERS, wal_path).close_log()
+        replayed, seconds = Agency(id_ranges={"subscriber": (100000, None)}).open_log(wal_path, fsync=False)
+        print(f"{REPLAYED_SUBSCRIBERS:>9} subscribers replayed from the log ({replayed} operations): {seconds:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare the storage engines per operation: the in-memory registries against SQLite, committing every mutation or
+batches of them.
+
+Run from the repository root:  python -m benchmarks.bench_storage
+"""
+import os
+import tempfile
+import time
+
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.storage import MemoryStorage, SqliteStorage
+from src.model.subscriber import Subscriber
+
+SUBSCRIBERS = 10_000
+NEWSPAPERS = 10
+
+
+def time_per_call(func, keys) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def measure(storage) -> dict:
+    agency = Agency(storage=storage)
+    for paper_id in range(1, NEWSPAPERS + 1):
+        agency.add_newspaper(Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0))
+    issues = {paper_id: agency.add_issue_to_newspaper(paper_id, {"release_date": "14.04.2024", "number_of_pages": 8})
+              for paper_id in range(1, NEWSPAPERS + 1)}
+    for paper_id, issue in issues.items():
+        agency.release_issue(paper_id, issue.issue_id)
+    keys = agency.new_subscriber_ids(SUBSCRIBERS)
+
+    timings = {
+        "add_subscriber": time_per_call(
+            lambda key: agency.add_subscriber(Subscriber(subscriber_id=key, name="Reader", address="Vienna")), keys),
+        "subscribe": time_per_call(lambda key: agency.subscribe(key % NEWSPAPERS + 1, key), keys),
+        "update_subscriber": time_per_call(
+            lambda key: agency.update_subscriber(agency.get_subscriber(key), address="Graz"), keys),
+        "deliver_issue": time_per_call(
+            lambda key: agency.deliver_issue(key % NEWSPAPERS + 1, issues[key % NEWSPAPERS + 1].issue_id, key), keys),
+        "get_subscriber": time_per_call(agency.get_subscriber, keys),
+        "remove_subscriber": time_per_call(lambda key: agency.remove_subscriber(agency.get_subscriber(key)), keys),
+    }
+    agency.close()
+    return timings
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {
+            "memory": lambda: MemoryStorage(),
+            "sqlite": lambda: SqliteStorage(os.path.join(directory, "single.db")),
+            "sqlite, batch 100": lambda: SqliteStorage(os.path.join(directory, "batched.db"), batch_size=100),
+        }
+        results = {name: measure(engine()) for name, engine in engines.items()}
+
+    print(f"{'operation':>18}" + "".join(f"{name:>20}" for name in results))
+    for operation in next(iter(results.values())):
+        print(f"{operation:>18}" + "".join(f"{timings[operation] * 1e6:>17.1f} us" for timings in results.values()))
+
+
+if __name__ == '__main__':
+    main()
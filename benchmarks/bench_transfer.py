@@ -0,0 +1,50 @@
+"""
+Time transfer_issues for a senior editor with 50k issues over 10 newspapers, each newspaper with 20 other editors.
+
+Run from the repository root:  python -m benchmarks.bench_transfer
+"""
+import time
+from collections import Counter
+
+from src.model.agency import Agency
+from src.model.editor import Editor
+from src.model.newspaper import Newspaper
+
+PAPERS = 10
+ISSUES_PER_PAPER = 5_000
+COLLEAGUES_PER_PAPER = 20
+SENIOR = 1
+
+
+def build_agency() -> Agency:
+    agency = Agency()
+    agency.add_newspapers([Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=1, price=1.0)
+                           for paper_id in range(1, PAPERS + 1)])
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                        for editor_id in range(SENIOR, SENIOR + 1 + PAPERS * COLLEAGUES_PER_PAPER)])
+    senior = agency.get_editor(SENIOR)
+    for paper in agency.newspapers:
+        issues = agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                                  "number_of_pages": 10}] * ISSUES_PER_PAPER)
+        for issue in issues:
+            issue.editor_id = SENIOR
+        senior.issues.extend(issues)
+        agency.add_newspaper_to_editor(paper.paper_id, SENIOR)
+        first = SENIOR + 1 + (paper.paper_id - 1) * COLLEAGUES_PER_PAPER
+        for editor_id in range(first, first + COLLEAGUES_PER_PAPER):
+            agency.add_newspaper_to_editor(paper.paper_id, editor_id)
+    return agency
+
+
+def main():
+    agency = build_agency()
+    start = time.perf_counter()
+    transferred = agency.transfer_issues(agency.get_editor(SENIOR))
+    elapsed = time.perf_counter() - start
+    loads = Counter(transferred.values())
+    print(f"transferred {sum(loads.values())} issues to {len(loads)} editors in {elapsed * 1000:.0f} ms, "
+          f"{min(loads.values())} to {max(loads.values())} issues each")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure the cost of logging mutations with group commit, and how fast a log is replayed.
+
+Run from the repository root:  python -m benchmarks.bench_wal
+"""
+import os
+import tempfile
+import threading
+import time
+
+from src.model.agency import Agency
+from src.model.newspaper import Newspaper
+from src.model.subscriber import Subscriber
+
+THREADS = [1, 8, 32]
+OPERATIONS = 20_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for threads in THREADS:
+            path = os.path.join(directory, f"agency-{threads}.wal")
+            agency = Agency()
+            agency.open_log(path)
+            agency.add_newspaper(Newspaper(paper_id=1, name="Heute", frequency=1, price=1.12))
+            subscriber_ids = agency.new_subscriber_ids(OPERATIONS)
+            per_thread = OPERATIONS // threads
+
+            def subscribe(ids):
+                for sub_id in ids:
+                    agency.add_subscriber(Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna"))
+
+            workers = [threading.Thread(target=subscribe, args=(subscriber_ids[n * per_thread:(n + 1) * per_thread],))
+                       for n in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+            wal = agency.wal
+            print(f"{threads:>3} threads: {wal.records / elapsed:>8.0f} operations/s, "
+                  f"{elapsed / wal.records * 1e6:>7.1f} us per operation, "
+                  f"{wal.records / wal.commits:>6.1f} records per fsync")
+            agency.close_log()
+
+            restored = Agency()
+            replayed, seconds = restored.open_log(path)
+            restored.close_log()
+            print(f"             replayed {replayed} operations at {replayed / seconds:>8.0f} operations/s")
+
+
+if __name__ == '__main__':
+    main()
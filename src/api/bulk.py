@@ -0,0 +1,72 @@
+from typing import Dict, List, Tuple
+
+from flask import jsonify
+from flask_restx import Model, abort, fields
+from jsonschema import Draft4Validator
+
+# The JSON types accepted by each field type, bool is checked separately because it is a subclass of int
+_FIELD_TYPES = {
+    fields.Integer: (int,),
+    fields.Float: (int, float),
+    fields.String: (str,),
+    fields.Boolean: (bool,),
+}
+
+
+class BatchValidator(object):
+    """
+    Validates every item of a bulk payload against a model in one pass.
+
+    Invalid items are reported on their own instead of rejecting the whole batch, like validate=True would. The
+    model is compiled into plain type checks, jsonschema is only used to explain why an item is invalid.
+    """
+
+    def __init__(self, model: Model):
+        self.model = model
+        self._validator = None
+        self._checks = [(name, field.required, _FIELD_TYPES[type(field)]) for name, field in model.items()]
+
+    def _is_valid(self, item) -> bool:
+        if not isinstance(item, dict):
+            return False
+        for name, required, types in self._checks:
+            if name not in item:
+                if required:
+                    return False
+                continue
+            value = item[name]
+            if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+                return False
+        return True
+
+    def validate(self, payload) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+        # Returns the valid (index, item) pairs, and a result slot for every item with the invalid ones filled in
+        if not isinstance(payload, list):
+            abort(400, message="Expected a JSON array of items")
+        if self._validator is None:
+            # The schema is compiled once, on first use
+            self._validator = Draft4Validator(self.model.__schema__)
+
+        valid = []
+        results: List[dict] = [None] * len(payload)
+        for index, item in enumerate(payload):
+            if self._is_valid(item):
+                valid.append((index, item))
+                continue
+            error = next(self._validator.iter_errors(item), None)
+            if error is None:
+                valid.append((index, item))
+            else:
+                results[index] = {"index": index, "status": "invalid", "error": error.message}
+        return valid, results
+
+
+def bulk_response(results: List[dict], envelope: str, created: Dict[int, dict]):
+    # Fill in the created items and count both outcomes
+    for index, item in created.items():
+        results[index] = {"index": index, "status": "created", envelope: item}
+    return jsonify({
+        "created": len(created),
+        "invalid": len(results) - len(created),
+        "results": results
+    })
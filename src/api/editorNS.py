@@ -3,9 +3,12 @@ from flask_restx import Namespace, reqparse, Resource, fields, abort
 
 from ..model.agency import Agency
 from ..model.editor import Editor
+from .newspaperNS import issue_model
+from .bulk import BatchValidator, bulk_response
+from .serializers import serialize_with, serializer_for
+from .pagination import pagination_parser, page_arguments, paged_response
+from .streaming import NDJSON, ndjson_response, wants_ndjson
 
-# Use a simple generator for ID's
-import random
 
 editor_ns = Namespace("editor", description="Editor related operations")
 
@@ -24,13 +27,13 @@ class EditorAPI(Resource):
 
     @editor_ns.doc(editor_model, description="Add a new editor")
     @editor_ns.expect(editor_model, validate=True)
-    @editor_ns.marshal_with(editor_model, envelope='editor')
+    @serialize_with(editor_model, envelope='editor')
     def post(self):
-        # Create a unique and simple ID
-        editor_id = random.randint(10000, 99999)
-        # Check if ID already exists
-        while any(editor.editor_id == editor_id for editor in Agency.get_instance().editors):
-            editor_id = random.randint(10000, 99999)
+        # IDs are handed out in sequence, IDs which are taken already are skipped
+        try:
+            editor_id = Agency.get_instance().new_editor_id()
+        except ValueError as err:
+            abort(400, message=str(err))
 
         # create a new editor object and add it
         new_editor = Editor(editor_id=editor_id,
@@ -41,9 +44,44 @@ class EditorAPI(Resource):
         # return the new editor
         return new_editor
 
-    @editor_ns.marshal_list_with(editor_model, envelope='editor')
+    @editor_ns.doc(description="List all editors, or one page of them if a limit or cursor is given")
+    @editor_ns.expect(pagination_parser)
+    @editor_ns.produces(['application/json', NDJSON])
     def get(self):
-        return Agency.get_instance().all_editor()
+        if wants_ndjson():
+            return ndjson_response(Agency.get_instance().editors_page, editor_model)
+        page = page_arguments()
+        if page is None:
+            # Small deployments can still get everything at once
+            return serializer_for(editor_model).envelope(Agency.get_instance().all_editor(), 'editor')
+        editors, next_cursor = Agency.get_instance().editors_page(*page)
+        return paged_response(editors, next_cursor, editor_model, 'editor')
+
+
+@editor_ns.route('/bulk')
+class EditorBulk(Resource):
+    validator = BatchValidator(editor_model)
+
+    @editor_ns.doc(description="Add many editors at once, the results are reported per item")
+    @editor_ns.expect([editor_model], validate=False)
+    def post(self):
+        valid, results = self.validator.validate(editor_ns.payload)
+        agency = Agency.get_instance()
+        try:
+            # One block of IDs for the whole batch
+            editor_ids = agency.new_editor_ids(len(valid))
+        except ValueError as err:
+            abort(400, message=str(err))
+
+        new_editors = [Editor(editor_id=editor_id,
+                              editor_name=item['editor_name'],
+                              address=item['address'])
+                       for editor_id, (_, item) in zip(editor_ids, valid)]
+        agency.add_editors(new_editors)
+
+        serialize = serializer_for(editor_model)
+        created = {index: serialize(editor) for (index, _), editor in zip(valid, new_editors)}
+        return bulk_response(results, 'editor', created)
 
 
 @editor_ns.route('/<int:editor_id>')
@@ -53,7 +91,7 @@ class EditorID(Resource):
     parser.add_argument('address', type=str, required=False, help="The address of the editor")
 
     @editor_ns.doc(description="Get an editor's information")
-    @editor_ns.marshal_with(editor_model, envelope='editor')
+    @serialize_with(editor_model, envelope='editor')
     def get(self, editor_id):
         search_result = Agency.get_instance().get_editor(editor_id)
         # Manage the situation when the editor is not found
@@ -64,7 +102,7 @@ class EditorID(Resource):
 
     @editor_ns.doc(description="Update a new editor")
     @editor_ns.expect(parser, validate=False)
-    @editor_ns.marshal_with(editor_model, envelope='editor')
+    @serialize_with(editor_model, envelope='editor')
     def post(self, editor_id):
         arguments = self.parser.parse_args()
 
@@ -72,13 +110,9 @@ class EditorID(Resource):
         if not search_result:
             abort(404, message=f"No editor with the ID {editor_id} was found")
 
-        updated = False
-        if arguments['editor_name'] is not None:
-            search_result.editor_name = arguments['editor_name']
-            updated = True
-        if arguments['address'] is not None:
-            search_result.address = arguments['address']
-            updated = True
+        updated = Agency.get_instance().update_editor(search_result,
+                                                      editor_name=arguments['editor_name'],
+                                                      address=arguments['address'])
 
         if not updated:
             abort(400, message=f"No updates have been made")
@@ -91,9 +125,15 @@ class EditorID(Resource):
         if not targeted_editor:
             return jsonify(f"Editor with ID {editor_id} was not found")
         # When an editor is removed, transfer all issues to another editor of the same newspaper
-        Agency.get_instance().transfer_issues(targeted_editor)
-        Agency.get_instance().remove_editor(targeted_editor)
-        return jsonify(f"Editor with ID {editor_id} was removed")
+        try:
+            transferred = Agency.get_instance().transfer_and_remove_editor(targeted_editor)
+        except ValueError:
+            # Removed by another request meanwhile
+            return jsonify(f"Editor with ID {editor_id} was not found")
+        return jsonify({'message': f"Editor with ID {editor_id} was removed",
+                        # editor_id is null for issues of newspapers without another editor
+                        'transferred': [{'paper_id': paper_id, 'issue_id': issue_id, 'editor_id': receiver_id}
+                                        for (paper_id, issue_id), receiver_id in transferred.items()]})
 
 
 # In order to handle the transfer of issues of the same newspaper, I consider adding this:
@@ -130,18 +170,8 @@ class EditorIssues(Resource):
             abort(404, message=f"No editor with ID {editor_id} found")
 
         # TypeError: Object of type Issue is not JSON serializable
-        # Format each issue object into a dictionary
-
-        issues = []
-        for issue in search_result:
-            issue_dict = {
-                'issue_id': issue.issue_id,
-                'release_date': issue.release_date,
-                'number_of_pages': issue.number_of_pages,
-                'released': issue.released,
-                'editor_id': issue.editor_id
-            }
-            issues.append(issue_dict)
+        # Format each issue object into a dictionary, the same way as the newspaper namespace does
+        issues = serializer_for(issue_model).many(search_result)
 
         if not issues:
             return jsonify(f"No issues found for editor with ID {editor_id}")
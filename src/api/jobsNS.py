@@ -0,0 +1,78 @@
+from flask import current_app, jsonify
+from flask_restx import Namespace, reqparse, Resource, abort
+
+from ..model.jobs import JobQueue
+
+jobs_ns = Namespace("jobs", description="Background delivery jobs")
+
+
+@jobs_ns.route('/')
+class JobsAPI(Resource):
+    @jobs_ns.doc(description="List the tracked delivery jobs")
+    def get(self):
+        return jsonify([job.as_dict() for job in JobQueue.get_instance().all_jobs()])
+
+
+@jobs_ns.route('/delivery')
+class DeliveryJobs(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('paper_id', type=int, required=True, help='The unique identifier of a newspaper')
+    parser.add_argument('issue_id', type=int, required=True, help='The unique identifier of an issue')
+    parser.add_argument('subscriber_id', type=int, required=True, help='The unique identifier of a subscriber')
+
+    @jobs_ns.doc(description="Enqueue the delivery of an issue to a subscriber")
+    @jobs_ns.expect(parser, validate=True)
+    def post(self):
+        arguments = self.parser.parse_args()
+        try:
+            job = JobQueue.get_instance().submit(arguments['paper_id'], arguments['issue_id'],
+                                                 subscriber_ids=[arguments['subscriber_id']])
+        except ValueError as err:
+            abort(503, message=str(err))
+        return jsonify(job.as_dict())
+
+
+@jobs_ns.route('/fanout')
+class FanoutJobs(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('paper_id', type=int, required=True, location='json',
+                        help='The unique identifier of a newspaper')
+    parser.add_argument('issue_id', type=int, required=True, location='json', help='The unique identifier of an issue')
+    parser.add_argument('subscriber_ids', type=list, required=False, location='json',
+                        help='Deliver to these subscribers only, instead of all subscribers of the newspaper')
+    parser.add_argument('chunk_size', type=int, required=False, location='json',
+                        help='The number of subscribers handled per chunk')
+
+    @jobs_ns.doc(description="Enqueue the delivery of an issue to all subscribers of the newspaper")
+    @jobs_ns.expect(parser, validate=True)
+    def post(self):
+        arguments = self.parser.parse_args()
+        if arguments['chunk_size'] is not None and arguments['chunk_size'] < 1:
+            abort(400, message="The chunk size has to be at least 1")
+        try:
+            job = JobQueue.get_instance().submit(arguments['paper_id'], arguments['issue_id'],
+                                                 subscriber_ids=arguments['subscriber_ids'],
+                                                 chunk_size=arguments['chunk_size'])
+        except ValueError as err:
+            abort(503, message=str(err))
+        return jsonify(job.as_dict())
+
+
+@jobs_ns.route('/<int:job_id>')
+class JobID(Resource):
+    @jobs_ns.doc(description="Get the progress of a delivery job")
+    def get(self, job_id):
+        job = JobQueue.get_instance().get_job(job_id)
+        if job is None:
+            abort(404, message=f"No job with ID {job_id} found")
+        return jsonify(job.as_dict())
+
+
+@jobs_ns.route('/releases')
+class ReleaseSchedule(Resource):
+    @jobs_ns.doc(description="The state of the release scheduler: pending releases, throughput and lag")
+    def get(self):
+        scheduler = current_app.config.get('RELEASE_SCHEDULER')
+        if scheduler is None:
+            abort(404, message="The release scheduler is not running")
+        return jsonify(scheduler.metrics())
@@ -1,12 +1,17 @@
+from functools import partial
+
 from flask import jsonify
 # Import abort to handel errors
 from flask_restx import Namespace, reqparse, Resource, fields, abort
 
 from ..model.agency import Agency
 from ..model.newspaper import Newspaper
+from .bulk import BatchValidator, bulk_response
+from .serializers import (can_join_fragments, fragments_response, render_fragments, serialize_with,
+                          serializer_for)
+from .pagination import pagination_parser, page_arguments, paged_response
+from .streaming import NDJSON, ndjson_response, wants_ndjson
 
-# Use a simple generator for ID's
-import random
 
 newspaper_ns = Namespace("newspaper", description="Newspaper related operations")
 
@@ -36,23 +41,24 @@ issue_model = newspaper_ns.model('IssueModel', {
                                 help='The unique identifier of an editor')
 })
 
+# Unassigned issues are listed across newspapers, so they name their newspaper
+unassigned_issue_model = newspaper_ns.clone('UnassignedIssueModel', issue_model, {
+    'paper_id': fields.Integer(help='The unique identifier of the newspaper of the issue')
+})
+
 
 @newspaper_ns.route('/')
 class NewspaperAPI(Resource):
 
     @newspaper_ns.doc(paper_model, description="Add a new newspaper")
     @newspaper_ns.expect(paper_model, validate=True)
-    @newspaper_ns.marshal_with(paper_model, envelope='newspaper')
+    @serialize_with(paper_model, envelope='newspaper')
     def post(self):
-        # Create a unique and simple ID
-        paper_id = random.randint(1, 999)
-        # Check if ID already exists
-        while any(newspaper.paper_id == paper_id for newspaper in Agency.get_instance().newspapers):
-            paper_id = random.randint(1, 999)
-
-        # I was thinking to use uuid module in order to get real unique ID, but I think random is much better in such
-        # a project when I care more about the functionality
-        # paper_id = int(str(uuid.uuid4().int)[:8])
+        # IDs are handed out in sequence, IDs which are taken already are skipped
+        try:
+            paper_id = Agency.get_instance().new_paper_id()
+        except ValueError as err:
+            abort(400, message=str(err))
 
         # create a new paper object and add it
         new_paper = Newspaper(paper_id=paper_id,
@@ -64,9 +70,81 @@ class NewspaperAPI(Resource):
         # return the new paper
         return new_paper
 
-    @newspaper_ns.marshal_list_with(paper_model, envelope='newspapers')
+    @newspaper_ns.doc(description="List all newspapers, or one page of them if a limit or cursor is given")
+    @newspaper_ns.expect(pagination_parser)
+    @newspaper_ns.produces(['application/json', NDJSON])
     def get(self):
-        return Agency.get_instance().all_newspapers()
+        if wants_ndjson():
+            return ndjson_response(Agency.get_instance().newspapers_page, paper_model)
+        page = page_arguments()
+        if page is None:
+            # Small deployments can still get everything at once
+            return serializer_for(paper_model).envelope(Agency.get_instance().all_newspapers(), 'newspapers')
+        newspapers, next_cursor = Agency.get_instance().newspapers_page(*page)
+        return paged_response(newspapers, next_cursor, paper_model, 'newspapers')
+
+
+@newspaper_ns.route('/bulk')
+class NewspaperBulk(Resource):
+    validator = BatchValidator(paper_model)
+
+    @newspaper_ns.doc(description="Add many newspapers at once, the results are reported per item")
+    @newspaper_ns.expect([paper_model], validate=False)
+    def post(self):
+        valid, results = self.validator.validate(newspaper_ns.payload)
+        agency = Agency.get_instance()
+        try:
+            # One block of IDs for the whole batch
+            paper_ids = agency.new_paper_ids(len(valid))
+        except ValueError as err:
+            abort(400, message=str(err))
+
+        new_papers = [Newspaper(paper_id=paper_id,
+                                name=item['name'],
+                                frequency=item['frequency'],
+                                price=item['price'])
+                      for paper_id, (_, item) in zip(paper_ids, valid)]
+        agency.add_newspapers(new_papers)
+
+        serialize = serializer_for(paper_model)
+        created = {index: serialize(paper) for (index, _), paper in zip(valid, new_papers)}
+        return bulk_response(results, 'newspaper', created)
+
+
+@newspaper_ns.route('/unassigned')
+class NewspaperUnassignedIssues(Resource):
+    @newspaper_ns.doc(description="List the issues without an editor, or one page of them if a limit or cursor is "
+                                  "given")
+    @newspaper_ns.expect(pagination_parser)
+    def get(self):
+        page = page_arguments()
+        if page is None:
+            return serializer_for(unassigned_issue_model).envelope(Agency.get_instance().unassigned_issues(), "issue")
+        # The cached renderings of the issues lack the paper_id, so they are serialized here
+        issues, next_cursor = Agency.get_instance().unassigned_issues_page(*page)
+        return paged_response(issues, next_cursor, unassigned_issue_model, "issue")
+
+
+@newspaper_ns.route('/unassigned/assign')
+class NewspaperUnassignedAssign(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('paper_id', type=int, required=False, location='json',
+                        help='Only assign the issues of this newspaper, instead of those of all newspapers')
+
+    @newspaper_ns.doc(description="Assign the issues without an editor to the least loaded editors of their newspaper")
+    @newspaper_ns.expect(parser, validate=True)
+    def post(self):
+        arguments = self.parser.parse_args()
+        agency = Agency.get_instance()
+        try:
+            assigned = agency.auto_assign_issues(arguments['paper_id'])
+        except ValueError as err:
+            abort(404, message=str(err))
+
+        return jsonify({'assigned': [{'paper_id': paper_id, 'issue_id': issue_id, 'editor_id': editor_id}
+                                     for (paper_id, issue_id), editor_id in assigned.items()],
+                        # Issues of newspapers without editors stay unassigned
+                        'unassigned': len(agency.orphans)})
 
 
 @newspaper_ns.route('/<int:paper_id>')
@@ -80,7 +158,7 @@ class NewspaperID(Resource):
     parser.add_argument('price', type=float, required=False, help="Monthly price of the newspaper")
 
     @newspaper_ns.doc(description="Get a newspaper's information.")
-    @newspaper_ns.marshal_with(paper_model, envelope='newspaper')
+    @serialize_with(paper_model, envelope='newspaper')
     def get(self, paper_id):
         search_result = Agency.get_instance().get_newspaper(paper_id)
         # Manage the situation when the newspaper is not found
@@ -92,7 +170,7 @@ class NewspaperID(Resource):
     @newspaper_ns.doc(description="Update a new newspaper")
     @newspaper_ns.expect(parser, validate=False)  # Expect fields from parser without strict validation
     # marshal_with may get a conflict with jsonify !!!
-    @newspaper_ns.marshal_with(paper_model, envelope='newspaper')
+    @serialize_with(paper_model, envelope='newspaper')
     def post(self, paper_id):
         arguments = self.parser.parse_args()
 
@@ -100,18 +178,11 @@ class NewspaperID(Resource):
         if not search_result:
             abort(404, message=f"No newspaper with ID {paper_id} found")
 
-        # Create a flag to track if any update was made
-        updated = False
-        # Update the newspaper if arguments exist
-        if arguments['name'] is not None:
-            search_result.name = arguments['name']
-            updated = True
-        if arguments['frequency'] is not None:
-            search_result.frequency = arguments['frequency']
-            updated = True
-        if arguments['price'] is not None:
-            search_result.price = arguments['price']
-            updated = True
+        # Update the newspaper if arguments exist, the agency keeps the revenue counters in sync with the price
+        updated = Agency.get_instance().update_newspaper(search_result,
+                                                         name=arguments['name'],
+                                                         frequency=arguments['frequency'],
+                                                         price=arguments['price'])
 
         if not updated:
             abort(400, message=f"No updates have been made")
@@ -130,17 +201,34 @@ class NewspaperID(Resource):
 # Issues Endpoints
 @newspaper_ns.route('/<int:paper_id>/issue')
 class NewspaperIssues(Resource):
-    @newspaper_ns.doc(description="List all issues of a specific newspaper")
-    @newspaper_ns.marshal_with(issue_model, envelope="issue")
+    @newspaper_ns.doc(description="List all issues of a specific newspaper, or one page of them if a limit or cursor "
+                                  "is given")
+    @newspaper_ns.expect(pagination_parser)
+    @newspaper_ns.produces(['application/json', NDJSON])
     def get(self, paper_id):
-        search_result = Agency.get_instance().get_issues(paper_id)
+        if wants_ndjson():
+            if Agency.get_instance().get_newspaper(paper_id) is None:
+                abort(404, message=f"No newspaper with ID {paper_id} found")
+            return ndjson_response(partial(Agency.get_instance().issues_page, paper_id), issue_model, fragments=True)
+        page = page_arguments()
+        if page is None:
+            search_result = Agency.get_instance().get_issues(paper_id)
+        else:
+            search_result = Agency.get_instance().issues_page(paper_id, *page)
         if search_result is None:
             abort(404, message=f"No newspaper with ID {paper_id} found")
-        return search_result
+
+        # Issues cache their rendered JSON, the listing only has to join it
+        if page is None:
+            if can_join_fragments():
+                return fragments_response(render_fragments(serializer_for(issue_model), search_result), "issue")
+            return serializer_for(issue_model).envelope(search_result, "issue")
+        issues, next_cursor = search_result
+        return paged_response(issues, next_cursor, issue_model, "issue", fragments=True)
 
     @newspaper_ns.doc(issue_model, description="Create a new issue")
     @newspaper_ns.expect(issue_model, validate=True)
-    @newspaper_ns.marshal_with(issue_model, envelope="issue")
+    @serialize_with(issue_model, envelope="issue")
     def post(self, paper_id):
         # Extract the issue data from payload
         issue_data = newspaper_ns.payload
@@ -149,14 +237,42 @@ class NewspaperIssues(Resource):
             new_issue = Agency.get_instance().add_issue_to_newspaper(paper_id, issue_data)
             # Return the new issue
             return new_issue
-        except ValueError:
-            newspaper_ns.abort(404, message=f"No newspaper with ID {paper_id} found")
+        except ValueError as err:
+            # The newspaper doesn't exist
+            if "doesn't exist" in str(err):
+                newspaper_ns.abort(404, message=f"No newspaper with ID {paper_id} found")
+            else:
+                # The newspaper has run out of issue IDs
+                newspaper_ns.abort(400, message=str(err))
+
+
+@newspaper_ns.route('/<int:paper_id>/issue/bulk')
+class NewspaperIssuesBulk(Resource):
+    validator = BatchValidator(issue_model)
+
+    @newspaper_ns.doc(description="Create many issues at once, the results are reported per item")
+    @newspaper_ns.expect([issue_model], validate=False)
+    def post(self, paper_id):
+        valid, results = self.validator.validate(newspaper_ns.payload)
+        try:
+            new_issues = Agency.get_instance().add_issues_to_newspaper(paper_id, [item for _, item in valid])
+        except ValueError as err:
+            # The newspaper doesn't exist
+            if "doesn't exist" in str(err):
+                abort(404, message=f"No newspaper with ID {paper_id} found")
+            else:
+                # The newspaper has run out of issue IDs
+                abort(400, message=str(err))
+
+        serialize = serializer_for(issue_model)
+        created = {index: serialize(issue) for (index, _), issue in zip(valid, new_issues)}
+        return bulk_response(results, 'issue', created)
 
 
 @newspaper_ns.route('/<int:paper_id>/issue/<int:issue_id>')
 class NewspaperIssueID(Resource):
     @newspaper_ns.doc(description="Get information of a newspaper issue")
-    @newspaper_ns.marshal_with(issue_model, envelope="issue")
+    @serialize_with(issue_model, envelope="issue")
     def get(self, paper_id, issue_id):
         search_result = Agency.get_instance().get_issue(paper_id, issue_id)
         if search_result is None:
@@ -169,7 +285,7 @@ class NewspaperIssueID(Resource):
 class NewspaperIssueRelease(Resource):
     @newspaper_ns.doc(description="Release an issue")
     # @newspaper_ns.expect(issue_model, validate=True)
-    @newspaper_ns.marshal_with(issue_model, envelope="issue")
+    @serialize_with(issue_model, envelope="issue")
     def post(self, paper_id, issue_id):
         # This time I cannot check if the action is None, therefore try:
         try:
@@ -197,7 +313,7 @@ class NewspaperIssueEditor(Resource):
 
     @newspaper_ns.doc(description="Specify an editor for an issue")
     @newspaper_ns.expect(parser, validate=True)  # Ensure that editor_id is provided
-    @newspaper_ns.marshal_with(issue_model, envelope='issue')
+    @serialize_with(issue_model, envelope='issue')
     def post(self, paper_id, issue_id):
         # Get and set the editor_id
         arguments = self.parser.parse_args()
@@ -235,19 +351,36 @@ class NewspaperIssueDeliver(Resource):
         try:
             deliver_issue = Agency.get_instance().deliver_issue(paper_id, issue_id, subscriber_id)
             # Construct the record
-            record = {
-                'issue_id': deliver_issue.issue_id,
-                'release_date': deliver_issue.release_date,
-                'number_of_pages': deliver_issue.number_of_pages,
-                'released': deliver_issue.released,
-                'editor_id': deliver_issue.editor_id,
-                'delivered_to': subscriber_id
-            }
+            record = serializer_for(issue_model)(deliver_issue)
+            record['delivered_to'] = subscriber_id
             return jsonify(record)
         except ValueError as err:
             return jsonify({'error': str(err)})
 
 
+@newspaper_ns.route('/<int:paper_id>/issue/<int:issue_id>/deliver/all')
+class NewspaperIssueDeliverAll(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('subscriber_ids', type=list, required=False, location='json',
+                        help='Deliver to these subscribers only, instead of all subscribers of the newspaper')
+    parser.add_argument('batch_size', type=int, required=False, location='json',
+                        help='The number of subscribers handled per batch')
+
+    @newspaper_ns.doc(description="Send an issue to all subscribers of the newspaper (or to a list of subscribers)")
+    @newspaper_ns.expect(parser, validate=True)
+    def post(self, paper_id, issue_id):
+        arguments = self.parser.parse_args()
+        batch_size = arguments['batch_size'] or 10000
+
+        try:
+            result = Agency.get_instance().deliver_issue_to_all(paper_id, issue_id,
+                                                                subscriber_ids=arguments['subscriber_ids'],
+                                                                batch_size=batch_size)
+            return jsonify(result)
+        except ValueError as err:
+            return jsonify({'error': str(err)})
+
+
 @newspaper_ns.route('/<int:paper_id>/stats')
 class NewspaperStatistics(Resource):
     @newspaper_ns.doc(description="Information about the specific newspaper")
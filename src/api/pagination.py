@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+
+from flask_restx import Model, abort, reqparse
+
+from ..model.registry import Cursor
+from .serializers import can_join_fragments, fragments_response, render_fragments, serializer_for
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+pagination_parser = reqparse.RequestParser()
+pagination_parser.add_argument('limit', type=int, required=False, location='args',
+                               help=f'Return pages of at most this many items (1 to {MAX_LIMIT})')
+pagination_parser.add_argument('cursor', type=str, required=False, location='args',
+                               help='The next_cursor of the previous page')
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    # Opaque to the client, it only has to hand it back
+    return base64.urlsafe_b64encode(json.dumps([cursor.key, cursor.rank]).encode()).decode()
+
+
+def decode_cursor(token: str) -> Cursor:
+    try:
+        key, rank = json.loads(base64.urlsafe_b64decode(token.encode()))
+        # All listings are keyed on integer IDs, anything else (like a list) can't be looked up
+        for value in (key, rank):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(value)
+        return Cursor(key, rank)
+    except (binascii.Error, ValueError, TypeError):
+        abort(400, message="Invalid cursor")
+
+
+def page_arguments() -> Optional[Tuple[Optional[Cursor], int]]:
+    # The (cursor, limit) of a listing request, or None if the whole collection is asked for
+    arguments = pagination_parser.parse_args()
+    if arguments['limit'] is None and arguments['cursor'] is None:
+        return None
+
+    limit = arguments['limit'] if arguments['limit'] is not None else DEFAULT_LIMIT
+    if not 1 <= limit <= MAX_LIMIT:
+        abort(400, message=f"The limit has to be between 1 and {MAX_LIMIT}")
+    cursor = decode_cursor(arguments['cursor']) if arguments['cursor'] else None
+    return cursor, limit
+
+
+def paged_response(items, next_cursor: Optional[Cursor], model: Model, envelope: str, fragments: bool = False):
+    # With fragments, the items' cached renderings are joined into the body (see render_fragments)
+    token = encode_cursor(next_cursor) if next_cursor is not None else None
+    if fragments and can_join_fragments():
+        return fragments_response(render_fragments(serializer_for(model), items), envelope, next_cursor=token)
+    body = serializer_for(model).envelope(items, envelope)
+    body['next_cursor'] = token
+    return body
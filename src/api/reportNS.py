@@ -0,0 +1,34 @@
+from flask import Response, stream_with_context
+from flask_restx import Namespace, Resource
+
+from ..model.agency import Agency
+
+report_ns = Namespace("report", description="Agency-wide reports")
+
+# Number of rows encoded at once when streaming a report
+CHUNK_SIZE = 10000
+
+
+def stream_missing_report(blocks):
+    # Encode the report as one JSON array, chunk by chunk, so it never has to be held in memory as a whole
+    yield '['
+    separator = ''
+    for block in blocks:
+        subscriber_ids = block.subscriber_ids.tolist()
+        issue_ids = block.issue_ids.tolist()
+        for start in range(0, len(subscriber_ids), CHUNK_SIZE):
+            rows = ', '.join(
+                f'{{"subscriber_id": {subscriber_id}, "newspaper_id": {block.paper_id}, "issue_id": {issue_id}}}'
+                for subscriber_id, issue_id in zip(subscriber_ids[start:start + CHUNK_SIZE],
+                                                   issue_ids[start:start + CHUNK_SIZE]))
+            yield separator + rows
+            separator = ', '
+    yield ']\n'
+
+
+@report_ns.route('/missing')
+class MissingReport(Resource):
+    @report_ns.doc(description="List every released issue which was not delivered to a subscriber of its newspaper")
+    def get(self):
+        blocks = Agency.get_instance().missing_report()
+        return Response(stream_with_context(stream_missing_report(blocks)), mimetype='application/json')
@@ -0,0 +1,173 @@
+import json
+from functools import wraps
+from typing import Callable, Dict, List
+
+from flask import Response, current_app, has_app_context, make_response, request
+from flask_restx import Model, fields, marshal
+from flask_restx.utils import merge, unpack
+
+# orjson is optional, the standard library encoder is used if it is not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# The fields which can be formatted inline, with the function their format() applies
+_FORMATTERS = {
+    fields.Integer: int,
+    fields.Float: float,
+    fields.String: str,
+    fields.Boolean: bool,
+}
+
+
+def _default_of(field: fields.Raw):
+    # What field.output() returns for a missing value
+    default = field.default() if callable(field.default) else field.default
+    return field.format(default) if default else default
+
+
+def _compile(model: Model) -> Callable[[object], dict]:
+    # Generate one function for the whole model instead of calling output() of every field for every object
+    names = {'_getattr': getattr}
+    lines = []
+    items = []
+    for number, (key, field) in enumerate(model.items()):
+        if isinstance(field, type):
+            field = field()
+        formatter = _FORMATTERS.get(type(field))
+        attribute = key if field.attribute is None else field.attribute
+        value = f"value{number}"
+        if formatter is None or not isinstance(attribute, str) or '.' in attribute or field.mask:
+            # Anything unusual (nested models, dotted or callable attributes, ...) goes through flask-restx
+            names[f"_field{number}"] = field
+            items.append(f"{key!r}: _field{number}.output({key!r}, obj)")
+            continue
+        names[f"_format{number}"] = formatter
+        names[f"_default{number}"] = _default_of(field)
+        lines.append(f"    {value} = _getattr(obj, {attribute!r}, None)")
+        items.append(f"{key!r}: _default{number} if {value} is None else _format{number}({value})")
+    source = "def serialize(obj):\n" + "\n".join(lines) + "\n    return {" + ", ".join(items) + "}\n"
+    exec(compile(source, f"<serializer {model.name}>", "exec"), names)
+    return names["serialize"]
+
+
+class Serializer(object):
+    """
+    A flask-restx model compiled into a single function.
+
+    It gives the same dicts as marshal(), in the same key order, so the encoded responses stay byte for byte the same.
+    Dicts are passed on to marshal(), entities are read with plain attribute lookups.
+    """
+
+    def __init__(self, model: Model):
+        self.model = model
+        self._serialize = _compile(model)
+
+    def __call__(self, obj) -> dict:
+        if isinstance(obj, dict):
+            return dict(marshal(obj, self.model))
+        return self._serialize(obj)
+
+    def many(self, objs) -> list:
+        serialize = self.__call__
+        return [serialize(obj) for obj in objs]
+
+    def envelope(self, data, envelope: str = None):
+        # Like marshal(data, model, envelope), lists and tuples are serialized item by item
+        out = self.many(data) if isinstance(data, (list, tuple)) else self(data)
+        return {envelope: out} if envelope else out
+
+
+_serializers: Dict[int, Serializer] = {}
+
+
+def serializer_for(model: Model) -> Serializer:
+    # Every model is compiled only once
+    serializer = _serializers.get(id(model))
+    if serializer is None or serializer.model is not model:
+        serializer = _serializers[id(model)] = Serializer(model)
+    return serializer
+
+
+def serialize_with(model: Model, envelope: str = None):
+    """Drop-in replacement for the marshal_with() decorator of a namespace, using the compiled serializer."""
+    serializer = serializer_for(model)
+
+    def wrapper(func):
+        # Same documentation as marshal_with
+        doc = {"responses": {"200": (None, model, {"envelope": envelope})}, "__mask__": True}
+        func.__apidoc__ = merge(getattr(func, "__apidoc__", {}), doc)
+
+        @wraps(func)
+        def serialize(*args, **kwargs):
+            resp = func(*args, **kwargs)
+            data, code, headers = unpack(resp) if isinstance(resp, tuple) else (resp, None, None)
+            mask = request.headers.get(current_app.config["RESTX_MASK_HEADER"]) if has_app_context() else None
+            if mask:
+                # Field masks are rare, flask-restx handles them
+                out = marshal(data, model, envelope, mask=mask)
+            else:
+                out = serializer.envelope(data, envelope)
+            return (out, code, headers) if isinstance(resp, tuple) else out
+
+        return serialize
+
+    return wrapper
+
+
+def _fast_json() -> bool:
+    return orjson is not None and has_app_context() and bool(current_app.config.get('FAST_JSON'))
+
+
+def dumps(data) -> str:
+    # The encoder of the app: orjson if the app enabled it, otherwise the same output as flask-restx
+    if _fast_json():
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+def render_fragments(serializer: Serializer, items) -> List[str]:
+    """
+    The JSON text of every item, reusing what was rendered before if the item did not change since.
+
+    The items have to keep a version which changes on every update, and a fragment attribute for the cache (see Issue).
+    """
+    fast = _fast_json()
+    encode = (lambda data: orjson.dumps(data).decode()) if fast else json.dumps
+    fragments = []
+    for item in items:
+        key = (item.version, fast)
+        cached = item.fragment
+        if cached is not None and cached[0] == key:
+            fragments.append(cached[1])
+        else:
+            text = encode(serializer(item))
+            item.fragment = (key, text)
+            fragments.append(text)
+    return fragments
+
+
+def can_join_fragments() -> bool:
+    # Joined fragments equal the output of the representation only with its default settings
+    return _fast_json() or not (current_app.debug or current_app.config.get('RESTX_JSON'))
+
+
+def fragments_response(fragments: List[str], envelope: str, **extra) -> Response:
+    """Join pre-rendered items into the body {envelope: [...], **extra} with the separators of the app's encoder."""
+    if _fast_json():
+        item_separator, key_separator = ',', ':'
+    else:
+        item_separator, key_separator = ', ', ': '
+    parts = [f'{{{dumps(envelope)}{key_separator}[', item_separator.join(fragments), ']']
+    for key, value in extra.items():
+        parts.append(f'{item_separator}{dumps(key)}{key_separator}{dumps(value)}')
+    parts.append('}\n')
+    return Response(''.join(parts), mimetype='application/json')
+
+
+def output_fast_json(data, code, headers=None):
+    # Representation for application/json which encodes with orjson, the counterpart of flask_restx output_json
+    resp = make_response(orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE), code)
+    resp.headers.extend(headers or {})
+    return resp
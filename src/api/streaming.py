@@ -0,0 +1,40 @@
+from typing import Callable, Optional
+
+from flask import Response, request, stream_with_context
+from flask_restx import Model
+
+from .serializers import dumps, render_fragments, serializer_for
+
+NDJSON = 'application/x-ndjson'
+
+# Number of entities serialized per chunk. Small enough that the first chunk is sent right away, large enough that
+# the generator overhead does not matter.
+STREAM_CHUNK_SIZE = 1000
+
+
+def wants_ndjson() -> bool:
+    # Only if the client prefers NDJSON over JSON, so "*/*" and missing Accept headers keep the JSON listing
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def iter_ndjson(page: Callable, model: Model, chunk_size: int, fragments: bool = False):
+    # One JSON object per line. The collection is walked page by page, so only one chunk is held in memory and
+    # entities added or removed while streaming don't break the iteration.
+    serializer = serializer_for(model)
+    cursor = None
+    while True:
+        result = page(cursor, chunk_size)
+        if result is None:
+            # The owner of the collection was removed meanwhile
+            return
+        items, cursor = result
+        if items and fragments:
+            yield '\n'.join(render_fragments(serializer, items)) + '\n'
+        elif items:
+            yield ''.join(dumps(serializer(item)) + '\n' for item in items)
+        if cursor is None:
+            return
+
+
+def ndjson_response(page: Callable[..., Optional[tuple]], model: Model, fragments: bool = False) -> Response:
+    return Response(stream_with_context(iter_ndjson(page, model, STREAM_CHUNK_SIZE, fragments)), mimetype=NDJSON)
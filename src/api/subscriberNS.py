@@ -3,9 +3,11 @@ from flask_restx import Namespace, reqparse, Resource, fields, abort
 
 from ..model.agency import Agency
 from ..model.subscriber import Subscriber
+from .bulk import BatchValidator, bulk_response
+from .serializers import serialize_with, serializer_for
+from .pagination import pagination_parser, page_arguments, paged_response
+from .streaming import NDJSON, ndjson_response, wants_ndjson
 
-# Use a simple generator for ID's
-import random
 
 subscriber_ns = Namespace("subscriber", description="Subscriber related operations")
 
@@ -24,13 +26,13 @@ class SubscriberAPI(Resource):
 
     @subscriber_ns.doc(subscriber_model, description="Add a new subscriber")
     @subscriber_ns.expect(subscriber_model, validate=True)
-    @subscriber_ns.marshal_with(subscriber_model, envelope='subscriber')
+    @serialize_with(subscriber_model, envelope='subscriber')
     def post(self):
-        # Create a unique and simple ID
-        subscriber_id = random.randint(100000, 999999)
-        # Check if ID already exists
-        while any(subscriber.subscriber_id == subscriber_id for subscriber in Agency.get_instance().subscribers):
-            subscriber_id = random.randint(100000, 999999)
+        # IDs are handed out in sequence, IDs which are taken already are skipped
+        try:
+            subscriber_id = Agency.get_instance().new_subscriber_id()
+        except ValueError as err:
+            abort(400, message=str(err))
 
         # create a new subscriber object and add it
         new_subscriber = Subscriber(subscriber_id=subscriber_id,
@@ -41,9 +43,44 @@ class SubscriberAPI(Resource):
         # return the new subscriber
         return new_subscriber
 
-    @subscriber_ns.marshal_list_with(subscriber_model, envelope='subscriber')
+    @subscriber_ns.doc(description="List all subscribers, or one page of them if a limit or cursor is given")
+    @subscriber_ns.expect(pagination_parser)
+    @subscriber_ns.produces(['application/json', NDJSON])
     def get(self):
-        return Agency.get_instance().all_subscribers()
+        if wants_ndjson():
+            return ndjson_response(Agency.get_instance().subscribers_page, subscriber_model)
+        page = page_arguments()
+        if page is None:
+            # Small deployments can still get everything at once
+            return serializer_for(subscriber_model).envelope(Agency.get_instance().all_subscribers(), 'subscriber')
+        subscribers, next_cursor = Agency.get_instance().subscribers_page(*page)
+        return paged_response(subscribers, next_cursor, subscriber_model, 'subscriber')
+
+
+@subscriber_ns.route('/bulk')
+class SubscriberBulk(Resource):
+    validator = BatchValidator(subscriber_model)
+
+    @subscriber_ns.doc(description="Add many subscribers at once, the results are reported per item")
+    @subscriber_ns.expect([subscriber_model], validate=False)
+    def post(self):
+        valid, results = self.validator.validate(subscriber_ns.payload)
+        agency = Agency.get_instance()
+        try:
+            # One block of IDs for the whole batch
+            subscriber_ids = agency.new_subscriber_ids(len(valid))
+        except ValueError as err:
+            abort(400, message=str(err))
+
+        new_subscribers = [Subscriber(subscriber_id=subscriber_id,
+                                      name=item['subscriber_name'],
+                                      address=item['subscriber_address'])
+                           for subscriber_id, (_, item) in zip(subscriber_ids, valid)]
+        agency.add_subscribers(new_subscribers)
+
+        serialize = serializer_for(subscriber_model)
+        created = {index: serialize(sub) for (index, _), sub in zip(valid, new_subscribers)}
+        return bulk_response(results, 'subscriber', created)
 
 
 @subscriber_ns.route('/<int:subscriber_id>')
@@ -53,7 +90,7 @@ class SubscriberID(Resource):
     parser.add_argument('subscriber_address', type=str, required=False, help="The address of the subscriber")
 
     @subscriber_ns.doc(description="Get a subscriber's information")
-    @subscriber_ns.marshal_with(subscriber_model, envelope='subscriber')
+    @serialize_with(subscriber_model, envelope='subscriber')
     def get(self, subscriber_id):
         search_result = Agency.get_instance().get_subscriber(subscriber_id)
         # Manage the situation when the subscriber is not found
@@ -64,7 +101,7 @@ class SubscriberID(Resource):
 
     @subscriber_ns.doc(description="Update a new subscriber")
     @subscriber_ns.expect(parser, validate=False)  # Expect fields from parser without strict validation
-    @subscriber_ns.marshal_with(subscriber_model, envelope='subscriber')
+    @serialize_with(subscriber_model, envelope='subscriber')
     def post(self, subscriber_id):
         arguments = self.parser.parse_args()
 
@@ -72,14 +109,10 @@ class SubscriberID(Resource):
         if not search_result:
             abort(404, message=f"No subscriber with the ID {subscriber_id} found")
 
-        # Create a flag to track if any update was made
-        updated = False
-        if arguments['subscriber_name'] is not None:
-            search_result.subscriber_name = arguments['subscriber_name']
-            updated = True
-        if arguments['subscriber_address'] is not None:
-            search_result.subscriber_address = arguments['subscriber_address']
-            updated = True
+        # The agency reports if any update was made
+        updated = Agency.get_instance().update_subscriber(search_result,
+                                                          name=arguments['subscriber_name'],
+                                                          address=arguments['subscriber_address'])
 
         if not updated:
             abort(400, message=f"No updates have been made")
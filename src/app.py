@@ -1,27 +1,145 @@
+import atexit
+import os
+
+from typing import Dict, Optional, Tuple
+
 from flask import Flask
 from flask_restx import Api
 
 from .api.newspaperNS import newspaper_ns
 from .api.editorNS import editor_ns
 from .api.subscriberNS import subscriber_ns
+from .api.reportNS import report_ns
+from .api.jobsNS import jobs_ns
+from .api import serializers
 
 from .model.agency import Agency
+from .model.allocator import IdService
+from .model.jobs import JobQueue
+from .model.scheduler import ReleaseScheduler
+from .model.snapshot import Snapshotter, load_snapshot
+from .model.storage import SqliteStorage
 
 agency = Agency()
 
 
-def create_app():
+def create_app(fast_json: bool = False, wal_path: str = None, snapshot_path: str = None,
+               snapshot_interval: float = 60.0, database_path: str = None, auto_release: bool = False,
+               deliver_on_release: bool = False, id_ranges: Dict[str, Tuple[int, Optional[int]]] = None):
     paperroute_app = Flask(__name__)
     # need to extend this class for custom objects, so that they can be jsonified
     paperroute_api = Api(paperroute_app, title="PaperBack: An App for Newspaper Issue and Subscription Management")
 
+    # orjson is faster, but its output is more compact than the standard encoder's, so it has to be asked for
+    paperroute_app.config['FAST_JSON'] = fast_json and serializers.orjson is not None
+    if paperroute_app.config['FAST_JSON']:
+        paperroute_api.representations['application/json'] = serializers.output_fast_json
+
     # add individual namespaces
     paperroute_api.add_namespace(newspaper_ns)
     paperroute_api.add_namespace(editor_ns)
     paperroute_api.add_namespace(subscriber_ns)
+    paperroute_api.add_namespace(report_ns)
+    paperroute_api.add_namespace(jobs_ns)
+
+    # With a database, the agency keeps all its entities in it. Every stored row is loaded into memory on start, the
+    # database is for durability and not for a state larger than the RAM (see SqliteStorage).
+    if database_path is not None:
+        open_database(database_path, id_ranges)
+    # The ID ranges per kind of entity, e.g. {"newspaper": (1, 999)}
+    if id_ranges:
+        Agency.get_instance().ids.configure(id_ranges)
+
+    # Durability is opt-in: with a log, the agency is restored from it and every further mutation is appended to it.
+    # With a snapshot as well, the agency is loaded from the snapshot and only the newer part of the log is replayed.
+    # A database stores the lsn of the last mutation it applied, on a restart from it only the records after that are
+    # replayed and the snapshot is only used to fill an empty database.
+    after_lsn = 0
+    if snapshot_path is not None:
+        after_lsn = open_snapshot(paperroute_app, Agency.get_instance(), snapshot_path, snapshot_interval)
+    if wal_path is not None:
+        open_write_ahead_log(paperroute_app, Agency.get_instance(), wal_path, after_lsn)
+
+    # Also opt-in, since it releases every issue whose release date has passed right away
+    if auto_release:
+        open_release_scheduler(paperroute_app, Agency.get_instance(), deliver_on_release)
 
     return paperroute_app
 
 
+def open_database(database_path: str, id_ranges: Dict[str, Tuple[int, Optional[int]]] = None):
+    # The agency singleton is replaced by one on the database, unless it uses that database already
+    agency = Agency.singleton_instance
+    if agency is not None and getattr(agency.storage, 'path', None) == database_path:
+        return
+    agency = Agency.singleton_instance = Agency(id_ranges=id_ranges, storage=SqliteStorage(database_path))
+    atexit.register(agency.close)
+
+
+def parse_id_ranges(text: Optional[str]) -> Optional[Dict[str, Tuple[int, Optional[int]]]]:
+    # "newspaper=1-999,subscriber=100000-" -> {"newspaper": (1, 999), "subscriber": (100000, None)}
+    if not text:
+        return None
+    ranges = {}
+    for part in text.split(","):
+        try:
+            kind, bounds = part.split("=")
+            low, high = bounds.split("-")
+            kind = kind.strip()
+            if kind not in IdService.DEFAULT_RANGES:
+                raise ValueError(kind)
+            ranges[kind] = (int(low), int(high) if high.strip() else None)
+        except ValueError:
+            raise ValueError(f"Invalid ID range {part!r}, expected kind=low-high or kind=low-") from None
+    return ranges
+
+
+def open_snapshot(app: Flask, agency: Agency, snapshot_path: str, interval: float) -> int:
+    # Load the snapshot if there is one and keep taking snapshots in the background. Returns the lsn it includes.
+    after_lsn = 0
+    if os.path.exists(snapshot_path) and not (agency.newspapers or agency.editors or agency.subscribers):
+        info = load_snapshot(snapshot_path, agency)
+        after_lsn = info.lsn
+        app.config['SNAPSHOT_LOAD'] = info._asdict()
+        app.logger.info(f"Loaded {info.subscribers} subscribers and {info.deliveries} deliveries from {snapshot_path} "
+                        f"in {info.seconds:.3f} s")
+    if interval > 0:
+        snapshotter = Snapshotter(agency, snapshot_path, interval)
+        snapshotter.start()
+        atexit.register(snapshotter.stop)
+        app.config['SNAPSHOTTER'] = snapshotter
+    return after_lsn
+
+
+def open_write_ahead_log(app: Flask, agency: Agency, wal_path: str, after_lsn: int = 0):
+    if agency.wal is not None and agency.wal.path == wal_path:
+        return
+    replayed, seconds = agency.open_log(wal_path, after_lsn=after_lsn)
+    atexit.register(agency.close_log)
+    rate = replayed / seconds if seconds > 0 else 0.0
+    app.config['WAL_REPLAY'] = {"path": wal_path, "operations": replayed, "seconds": seconds, "rate": rate}
+    app.logger.info(f"Replayed {replayed} operations from {wal_path} in {seconds:.3f} s ({rate:.0f} operations/s)")
+
+
+def open_release_scheduler(app: Flask, agency: Agency, deliver: bool = False):
+    # Release the issues at their release date, and with deliver also hand them to the delivery jobs
+    scheduler = ReleaseScheduler(agency, jobs=JobQueue.get_instance() if deliver else None)
+    scheduler.start()
+    atexit.register(scheduler.stop)
+    app.config['RELEASE_SCHEDULER'] = scheduler
+
+
 if __name__ == '__main__':
-    create_app().run(debug=False, port=7890)
+    app = create_app(wal_path=os.environ.get('PAPERBACK_WAL'), snapshot_path=os.environ.get('PAPERBACK_SNAPSHOT'),
+                     database_path=os.environ.get('PAPERBACK_DB'),
+                     auto_release=os.environ.get('PAPERBACK_AUTO_RELEASE') in ('release', 'deliver'),
+                     deliver_on_release=os.environ.get('PAPERBACK_AUTO_RELEASE') == 'deliver',
+                     id_ranges=parse_id_ranges(os.environ.get('PAPERBACK_ID_RANGES')))
+    if 'SNAPSHOT_LOAD' in app.config:
+        load = app.config['SNAPSHOT_LOAD']
+        print(f"Loaded a snapshot of {load['subscribers']} subscribers in {load['seconds']:.3f} s")
+    if 'WAL_REPLAY' in app.config:
+        replay = app.config['WAL_REPLAY']
+        print(f"Replayed {replay['operations']} operations in {replay['seconds']:.3f} s "
+              f"({replay['rate']:.0f} operations/s)")
+    app.run(debug=False, port=7890)
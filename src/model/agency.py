@@ -1,20 +1,130 @@
-from typing import List, Union, Optional
-
+import time
+from functools import partial, wraps
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Union, Optional
+
+from .allocator import EDITOR, ISSUE, NEWSPAPER, SUBSCRIBER, IdService
+from .balance import least_loaded
+from .cascade import CascadeReport, remove_newspaper_cascade
 from .issue import Issue
 from .newspaper import Newspaper
 from .subscriber import Subscriber
 from .editor import Editor
-
-import random
+from .ledger import DeliveryLedger, pack_key, unpack_key
+from .locks import ReadWriteLock
+from .registry import Cursor, Registry
+from .report import MissingBlock
+from .stats import NewspaperStats
+from .storage import MemoryStorage
+from .versions import AgencyVersion, Versions
+from .refs import issue_key
+from .records import (editor_from_record, editor_record, issue_from_record, issue_record, newspaper_from_record,
+                      newspaper_record, subscriber_from_record, subscriber_record)
+from .wal import WriteAheadLog, read_log
+
+
+def mutation(method):
+    # Runs a mutating method of the agency under its write lock. The log record is queued while the lock is held, so
+    # the log has the order in which the mutations were applied, but the fsync is waited for after releasing the lock.
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        pending = None
+        try:
+            with self.lock.write:
+                outermost = not self._mutating
+                self._mutating = True
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    if outermost:
+                        self._mutating = False
+                        self.mutations += 1
+                        self.storage.commit()
+                        pending, self._pending_log = self._pending_log, None
+        finally:
+            if pending is not None:
+                wal, lsn = pending
+                wal.wait(lsn)
+
+    return locked
+
+
+def reading(method):
+    # Runs a method of the agency under its read lock, so it never sees a mutation half applied. Looking up a single
+    # entity by its ID needs no lock.
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read:
+            return method(self, *args, **kwargs)
+
+    return locked
 
 
 class Agency(object):
     singleton_instance = None
 
-    def __init__(self):
-        self.newspapers: List[Newspaper] = []
-        self.subscribers: List[Subscriber] = []
-        self.editors: List[Editor] = []
+    def __init__(self, verify_stats: bool = False, id_ranges: Dict[str, Tuple[int, Optional[int]]] = None,
+                 storage: MemoryStorage = None):
+        # Registries keep the insertion order of a list, plus a dict index on the ID for O(1) lookups
+        self.newspapers: Registry[Newspaper] = Registry(attrgetter('paper_id'))
+        self.subscribers: Registry[Subscriber] = Registry(attrgetter('subscriber_id'))
+        self.editors: Registry[Editor] = Registry(attrgetter('editor_id'))
+
+        # Copy-on-write versions of the newspapers for long reads, the hooks below mark the papers that change
+        self.versions = Versions(self)
+
+        # Sequential IDs for all new entities, the ranges can be configured per kind of entity
+        self.ids = IdService(id_ranges)
+
+        # Reverse index of the subscriptions: paper_id -> IDs of its subscribers
+        self.paper_subscribers: Dict[int, Set[int]] = {}
+        self.subscribers.watch(self, self._subscriber_added, self._subscriber_removed)
+        self.subscribers.watch_loads(self, self._subscriber_loaded)
+        # Bound once and shared by all subscribers and editors, instead of a bound method or closure for each
+        self.subscription_watchers = (self._index_subscription, self._unindex_subscription)
+        self.issue_resolver = self.get_issue
+        self.paper_resolver = self.newspapers.get
+        self.issue_key_resolver = self._issue_by_key
+        # Back-references of the editors: paper_id -> IDs of the editors with the paper among their newspapers, and
+        # paper_id -> editor_id -> number of the paper's issues the editor holds
+        self.paper_editors: Dict[int, Set[int]] = {}
+        self.issue_editors: Dict[int, Dict[int, int]] = {}
+        self.editors.watch(self, self._editor_added, self._editor_removed)
+
+        # Every delivery, stored column-wise as IDs
+        self.deliveries = DeliveryLedger()
+        self.deliveries.on_record = self._delivery_recorded
+        self.deliveries.on_remove = self._delivery_removed
+
+        # IDs of the released issues per paper, and the released issues each subscriber still waits for:
+        # subscriber_id -> paper_id -> issue IDs. Lazily loaded subscribers get theirs once they are created.
+        self.released_issues: Dict[int, Set[int]] = {}
+        self.backlogs: Dict[int, Dict[int, Set[int]]] = {}
+
+        # Issues without an editor by their key (see refs.issue_key), in the order they became unassigned
+        self.orphans: Registry[int] = Registry(_orphan_key)
+
+        # Subscriber and revenue counters per newspaper, kept up to date on every change
+        self.paper_stats: Dict[int, NewspaperStats] = {}
+        self.newspapers.watch(self, self._newspaper_added, self._newspaper_removed)
+        # Debug mode: compare the counters with a full recomputation on every stats call
+        self.verify_stats = verify_stats
+
+        # Every mutation is appended to the write-ahead log, once one is opened
+        self.wal: Optional[WriteAheadLog] = None
+        # Mutations run one at a time (see mutation) while readers which walk many entities run concurrently (see
+        # reading). The log record of the running mutation waits for its fsync here.
+        self.lock = ReadWriteLock()
+        self._mutating = False
+        self._pending_log: Optional[Tuple[WriteAheadLog, int]] = None
+        # Number of mutations so far, tells a background snapshot whether anything changed
+        self.mutations = 0
+        # Notes the subscribers which change while a snapshot copies them (see snapshot.capture), None otherwise
+        self.subscriber_changes = None
+
+        # The storage engine loads the stored entities and follows every change from now on
+        self.storage = MemoryStorage() if storage is None else storage
+        self.storage.open(self)
 
     # This ensures that only one instance of 'Agency' exists (Singleton pattern)
     @staticmethod
@@ -24,44 +134,185 @@ class Agency(object):
 
         return Agency.singleton_instance
 
+    def open_log(self, path: str, fsync: bool = True, after_lsn: int = 0) -> Tuple[int, float]:
+        # Replay the log at path, then append all further mutations to it. Records up to after_lsn are skipped, they
+        # are part of the snapshot the agency was loaded from, and so are the records the storage engine has applied
+        # already. Returns the number of replayed records and the seconds it took.
+        if self.wal is not None:
+            raise ValueError("A write-ahead log is open already!")
+        after_lsn = max(after_lsn, self.storage.applied_lsn() or 0)
+        last_lsn = after_lsn
+
+        def tail():
+            nonlocal last_lsn
+            for record in read_log(path):
+                last_lsn = max(last_lsn, record["lsn"])
+                if record["lsn"] > after_lsn:
+                    yield record
+
+        start = time.perf_counter()
+        count = self.replay(tail())
+        elapsed = time.perf_counter() - start
+        self.wal = WriteAheadLog(path, fsync, last_lsn)
+        return count, elapsed
+
+    def close_log(self):
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+    def close(self):
+        # Close the log and the storage engine
+        self.close_log()
+        self.storage.close()
+
+    @mutation
+    def replay(self, records: Iterable[dict]) -> int:
+        # Apply logged mutations again, without logging them a second time
+        wal, self.wal = self.wal, None
+        count = 0
+        try:
+            for record in records:
+                apply = _REPLAY.get(record["op"])
+                if apply is None:
+                    raise ValueError(f"Unknown operation {record['op']} in the write-ahead log!")
+                apply(self, **record["args"])
+                # Don't hand out IDs again which were used by removed entities
+                self.ids.restore(record.get("ids", {}))
+                if "lsn" in record:
+                    self.storage.save_lsn(record["lsn"])
+                count += 1
+        finally:
+            self.wal = wal
+        return count
+
+    def _log(self, op: str, sequence: Tuple[str, Optional[int]] = None, **args):
+        # Queues the record, the mutation returns once it is on disk. sequence is the ID sequence the mutation drew
+        # from, if any.
+        if sequence is not None:
+            self.storage.save_ids(self.ids.position(*sequence))
+        if self.wal is None:
+            return
+        record = {"op": op, "args": args}
+        if sequence is not None:
+            record["ids"] = self.ids.position(*sequence)
+        lsn = self.wal.enqueue(record)
+        self.storage.save_lsn(lsn)
+        self._pending_log = (self.wal, lsn)
+
+    @mutation
     def add_newspaper(self, new_paper: Newspaper):
         # Assert that ID does not exist
-        if any(new_paper.paper_id == paper.paper_id for paper in self.newspapers):
+        if self.newspapers.has_key(new_paper.paper_id):
             raise ValueError(f"A newspaper with ID {new_paper.paper_id} already exists!")
         self.newspapers.append(new_paper)
+        self._log("add_newspapers", (NEWSPAPER, None), newspapers=[newspaper_record(new_paper)])
 
-    def get_newspaper(self, paper_id: Union[int, str]) -> Optional[Newspaper]:
-        for paper in self.newspapers:
-            if paper.paper_id == paper_id:
-                return paper
-        return None
+    @mutation
+    def add_newspapers(self, new_papers: List[Newspaper]):
+        # An empty batch isn't logged, so it doesn't wait for an fsync either
+        if not new_papers:
+            return
+        # Check the whole batch first, so either all or none of the newspapers are added
+        self._check_new_ids(self.newspapers, [paper.paper_id for paper in new_papers],
+                            "A newspaper with ID {} already exists!")
+        self.newspapers.extend(new_papers)
+        self._log("add_newspapers", (NEWSPAPER, None), newspapers=[newspaper_record(paper) for paper in new_papers])
 
-    def all_newspapers(self) -> List[Newspaper]:
-        return self.newspapers
+    # IDs for new entities, IDs which are taken already are skipped
+    def new_paper_id(self) -> int:
+        return self.ids.next_id(NEWSPAPER, self.newspapers.has_key)
+
+    def new_editor_id(self) -> int:
+        return self.ids.next_id(EDITOR, self.editors.has_key)
+
+    def new_subscriber_id(self) -> int:
+        return self.ids.next_id(SUBSCRIBER, self.subscribers.has_key)
+
+    # Blocks of IDs for bulk inserts
+    def new_paper_ids(self, count: int) -> List[int]:
+        return self.ids.reserve(NEWSPAPER, count, self.newspapers.has_key)
 
-    def remove_newspaper(self, paper: Newspaper):
-        # Make sure to remove issues and newspaper from editor and subscriber
-        for editor in self.editors:
-            if paper in editor.newspapers:
-                editor.issues = [issue for issue in editor.issues if issue not in paper.issues]
-                editor.newspapers.remove(paper)
+    def new_editor_ids(self, count: int) -> List[int]:
+        return self.ids.reserve(EDITOR, count, self.editors.has_key)
 
-        for sub in self.subscribers:
-            if paper.paper_id in sub.subscriptions:
-                sub.delivered_issues = [issue for issue in sub.delivered_issues if issue not in paper.issues]
-                sub.subscriptions.remove(paper.paper_id)
+    def new_subscriber_ids(self, count: int) -> List[int]:
+        return self.ids.reserve(SUBSCRIBER, count, self.subscribers.has_key)
 
-        # Clear all issues from the newspaper
-        paper.issues.clear()
-        # Remove the newspaper
-        self.newspapers.remove(paper)
+    @staticmethod
+    def _check_new_ids(registry: Registry, new_ids: List[int], message: str):
+        seen = set()
+        for new_id in new_ids:
+            if registry.has_key(new_id) or new_id in seen:
+                raise ValueError(message.format(new_id))
+            seen.add(new_id)
+
+    def get_newspaper(self, paper_id: Union[int, str]) -> Optional[Newspaper]:
+        return self.newspapers.get(paper_id)
 
+    @reading
+    def all_newspapers(self) -> List[Newspaper]:
+        return list(self.newspapers)
+
+    # Paging follows the insertion order, a page costs O(limit)
+    @reading
+    def newspapers_page(self, after: Optional[Cursor], limit: int):
+        return self.newspapers.page(after, limit)
+
+    @mutation
+    def remove_newspaper(self, paper: Newspaper) -> CascadeReport:
+        # Remove the newspaper with its issues, and everything that refers to it (see cascade.py)
+        report = remove_newspaper_cascade(self, paper)
+        self._log("remove_newspaper", paper_id=paper.paper_id)
+        return report
+
+    @reading
+    def subscribers_of(self, paper_id: int) -> List[Subscriber]:
+        return [self.subscribers.get(sub_id) for sub_id in self.paper_subscribers.get(paper_id, ())]
+
+    @reading
+    def subscriber_ids_of(self, paper_id: int) -> List[int]:
+        return sorted(self.paper_subscribers.get(paper_id, ()))
+
+    @mutation
+    def update_newspaper(self, paper: Newspaper, name: str = None, frequency: int = None, price: float = None) -> bool:
+        # Update the given fields and report if anything changed
+        updated = False
+        if name is not None:
+            paper.name = name
+            updated = True
+        if frequency is not None:
+            paper.frequency = frequency
+            updated = True
+        if price is not None:
+            paper.price = price
+            # Keep the revenue counters in sync with the new price
+            stats = self.paper_stats.get(paper.paper_id)
+            if stats is not None:
+                stats.set_price(price)
+            updated = True
+        if updated:
+            self.versions.touch(paper.paper_id)
+            self.storage.save_newspaper(paper)
+            self._log("update_newspaper", paper_id=paper.paper_id, name=name, frequency=frequency, price=price)
+        return updated
+
+    @reading
     def get_newspaper_stats(self, paper_id):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
             raise ValueError(f"A newspaper with ID {paper_id} doesn't exist!")
 
-        # Count subscribers
+        statistics = self.paper_stats[paper_id].as_dict()
+        if self.verify_stats:
+            expected = self.recompute_newspaper_stats(paper_id)
+            if statistics != expected:
+                raise RuntimeError(f"Stats of newspaper {paper_id} are out of sync: {statistics} != {expected}")
+        return statistics
+
+    def recompute_newspaper_stats(self, paper_id):
+        # The slow way, by walking all subscribers. Only used to verify the counters.
+        newspaper = self.get_newspaper(paper_id)
         sub_count = sum(1 for sub in self.subscribers if paper_id in sub.subscriptions)
 
         # Calculate revenues
@@ -74,28 +325,156 @@ class Agency(object):
             'annual_revenue': annual_revenue
         }
 
+    def _newspaper_added(self, paper: Newspaper):
+        self.versions.touch(paper.paper_id)
+        # The issue IDs of the paper become one of the agency's sequences
+        self.ids.attach(paper.issue_ids, ISSUE, paper.paper_id)
+        self.paper_stats[paper.paper_id] = NewspaperStats(paper.price,
+                                                          len(self.paper_subscribers.get(paper.paper_id, ())))
+        # Follow the issues of the paper, to keep the backlogs up to date
+        paper.issues.watch(self, partial(self._issue_added, paper), partial(self._issue_removed, paper))
+        paper.watch_releases(self, self._issue_released)
+        paper.watch_assignments(self, self._issue_assigned)
+        for issue in paper.issues:
+            self._issue_added(paper, issue)
+
+    def _newspaper_removed(self, paper: Newspaper):
+        self.versions.touch(paper.paper_id)
+        self.ids.detach(ISSUE, paper.paper_id)
+        self.paper_stats.pop(paper.paper_id, None)
+        paper.issues.unwatch(self)
+        paper.unwatch_releases(self)
+        paper.unwatch_assignments(self)
+        self.released_issues.pop(paper.paper_id, None)
+        for issue in paper.issues:
+            self._orphan_discard(paper, issue)
+
+    # Keep the backlogs of missing issues and the orphans in sync
+    def _issue_added(self, paper: Newspaper, issue: Issue):
+        if issue.editor_id is None:
+            self._issue_assigned(paper, issue)
+        if issue.released:
+            self._issue_released(paper, issue)
+
+    def _issue_removed(self, paper: Newspaper, issue: Issue):
+        self._orphan_discard(paper, issue)
+        released = self.released_issues.get(paper.paper_id)
+        if released is None or issue.issue_id not in released:
+            return
+        released.discard(issue.issue_id)
+        self.versions.touch(paper.paper_id)
+        for sub_id in self.paper_subscribers.get(paper.paper_id, ()):
+            self._backlog_discard(sub_id, paper.paper_id, issue.issue_id)
+
+    def _issue_released(self, paper: Newspaper, issue: Issue):
+        self.released_issues.setdefault(paper.paper_id, set()).add(issue.issue_id)
+        self.versions.touch(paper.paper_id)
+        # Every subscriber of the paper now misses this issue, unless it was delivered already. The backlog of a
+        # subscriber which is still to be loaded is built once it is.
+        subscribers = self.subscribers
+        for sub_id in self.paper_subscribers.get(paper.paper_id, ()):
+            if subscribers.pending(sub_id):
+                continue
+            if not self.deliveries.delivered(sub_id, paper.paper_id, issue.issue_id):
+                self.backlogs.setdefault(sub_id, {}).setdefault(paper.paper_id, set()).add(issue.issue_id)
+
+    def _issue_assigned(self, paper: Newspaper, issue: Issue):
+        if issue.editor_id is not None:
+            self._orphan_discard(paper, issue)
+            return
+        key = pack_key(paper.paper_id, issue.issue_id)
+        if not self.orphans.has_key(key):
+            self.orphans.append(key)
+
+    def _orphan_discard(self, paper: Newspaper, issue: Issue):
+        # The paper ID is passed along, the newspaper may have cleared the issue's already
+        key = pack_key(paper.paper_id, issue.issue_id)
+        if self.orphans.has_key(key):
+            self.orphans.remove(key)
+
+    def _delivery_recorded(self, sub_id: int, paper_id: int, issue_id: int):
+        self.versions.touch(paper_id)
+        self._backlog_discard(sub_id, paper_id, issue_id)
+
+    def _delivery_removed(self, sub_id: int, paper_id: int, issue_id: int):
+        self.versions.touch(paper_id)
+        if (issue_id in self.released_issues.get(paper_id, ())
+                and sub_id in self.paper_subscribers.get(paper_id, ()) and not self.subscribers.pending(sub_id)):
+            self.backlogs.setdefault(sub_id, {}).setdefault(paper_id, set()).add(issue_id)
+
+    def _backlog_discard(self, sub_id: int, paper_id: int, issue_id: int):
+        pending = self.backlogs.get(sub_id, {}).get(paper_id)
+        if pending is not None:
+            pending.discard(issue_id)
+
+    # The newspapers and issues of an editor are stored as IDs, resolved through the agency
+    def _editor_added(self, editor: Editor):
+        editor.newspapers.watch(self, self._editor_paper_added, self._editor_paper_removed)
+        editor.issues.watch(self, self._editor_issue_added, self._editor_issue_removed)
+        editor.newspapers.attach(self.paper_resolver)
+        editor.issues.attach(self.issue_key_resolver)
+
+    def _editor_removed(self, editor: Editor):
+        editor.newspapers.detach()
+        editor.issues.detach()
+        editor.newspapers.unwatch(self)
+        editor.issues.unwatch(self)
+
+    def _editor_paper_added(self, editor: Editor, paper_id: int):
+        self.paper_editors.setdefault(paper_id, set()).add(editor.editor_id)
+
+    def _editor_paper_removed(self, editor: Editor, paper_id: int):
+        editors = self.paper_editors.get(paper_id)
+        if editors is not None:
+            editors.discard(editor.editor_id)
+            if not editors:
+                del self.paper_editors[paper_id]
+
+    def _editor_issue_added(self, editor: Editor, key: int):
+        counts = self.issue_editors.setdefault(unpack_key(key)[0], {})
+        counts[editor.editor_id] = counts.get(editor.editor_id, 0) + 1
+
+    def _editor_issue_removed(self, editor: Editor, key: int):
+        paper_id = unpack_key(key)[0]
+        counts = self.issue_editors.get(paper_id)
+        if counts is None or editor.editor_id not in counts:
+            return
+        counts[editor.editor_id] -= 1
+        if not counts[editor.editor_id]:
+            del counts[editor.editor_id]
+            if not counts:
+                del self.issue_editors[paper_id]
+
+    def _issue_by_key(self, key: int) -> Optional[Issue]:
+        return self.get_issue(*unpack_key(key))
+
     # METHODS for issues
     def get_issue(self, paper_id: int, issue_id: int) -> Optional[Issue]:
         newspaper = self.get_newspaper(paper_id)
         if newspaper is not None:
-            for issue in newspaper.issues:
-                if issue.issue_id == issue_id:
-                    return issue
-            return None
+            return newspaper.get_issue(issue_id)
 
+    @reading
     def get_issues(self, paper_id: int) -> Optional[List[Issue]]:
         newspaper = self.get_newspaper(paper_id)
         if newspaper is not None:
-            return newspaper.issues
+            return list(newspaper.issues)
+        else:
+            return None
+
+    @reading
+    def issues_page(self, paper_id: int, after: Optional[Cursor], limit: int):
+        newspaper = self.get_newspaper(paper_id)
+        if newspaper is not None:
+            return newspaper.issues.page(after, limit)
         else:
             return None
 
     def generate_unique_issue_id(self, newspaper):
-        new_issue_id = random.randint(1000, 9999)
-        while any(issue.issue_id == new_issue_id for issue in newspaper.issues):
-            new_issue_id = random.randint(1000, 9999)
-        return new_issue_id
+        # IDs are handed out in sequence by the newspaper, so there is no retry loop
+        return newspaper.next_issue_id()
 
+    @mutation
     def add_issue_to_newspaper(self, paper_id: int, issue_data):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
@@ -116,14 +495,37 @@ class Agency(object):
 
         # Add the issue to the newspaper
         newspaper.issues.append(new_issue)
+        self._log("add_issues", (ISSUE, paper_id), paper_id=paper_id, issues=[issue_record(new_issue)])
         return new_issue
 
+    @mutation
+    def add_issues_to_newspaper(self, paper_id: int, issues_data: List[dict]) -> List[Issue]:
+        newspaper = self.get_newspaper(paper_id)
+        if newspaper is None:
+            raise ValueError(f"A newspaper with ID {paper_id} doesn't exist!")
+
+        if not issues_data:
+            return []
+        # One block of IDs for the whole batch
+        issue_ids = newspaper.next_issue_ids(len(issues_data))
+        new_issues = []
+        for issue_id, issue_data in zip(issue_ids, issues_data):
+            # Like a single issue, it can't get an ID, an editor or be released on creation
+            new_issues.append(Issue(issue_id=issue_id,
+                                    release_date=issue_data["release_date"],
+                                    number_of_pages=issue_data["number_of_pages"]))
+        newspaper.issues.extend(new_issues)
+        self._log("add_issues", (ISSUE, paper_id), paper_id=paper_id,
+                  issues=[issue_record(issue) for issue in new_issues])
+        return new_issues
+
+    @mutation
     def release_issue(self, paper_id: int, issue_id: int):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
             raise ValueError(f"A newspaper with ID {paper_id} does not exist!")
 
-        issue = self.get_issue(paper_id, issue_id)
+        issue = newspaper.get_issue(issue_id)
         # Check if the issue exists
         if issue is None:
             raise ValueError(f"An issue with ID {issue_id} doesn't exist!")
@@ -134,8 +536,23 @@ class Agency(object):
 
         # Release it
         issue.released = True
+        self.storage.save_issue(issue)
+        self._log("release_issue", paper_id=paper_id, issue_id=issue_id)
         return issue
 
+    @mutation
+    def release_issues(self, keys: Iterable[Tuple[int, int]]) -> List[Issue]:
+        # Release many (paper_id, issue_id) at once, with one commit for all of them. Issues which can't be released
+        # (unknown or released already) are skipped, the released ones are returned.
+        released = []
+        for paper_id, issue_id in keys:
+            try:
+                released.append(self.release_issue(paper_id, issue_id))
+            except ValueError:
+                continue
+        return released
+
+    @mutation
     def specify_editor(self, paper_id, issue_id, editor_id):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
@@ -143,7 +560,7 @@ class Agency(object):
 
         # This also handle the situation in which I cannot specify an editor to an issue of another editor! (and
         # vice versa) - But the error message is a bit unclear now
-        issue = self.get_issue(paper_id, issue_id)
+        issue = newspaper.get_issue(issue_id)
         if issue is None:
             raise ValueError(f"An issue with ID {issue_id} doesn't exist!")
 
@@ -162,14 +579,18 @@ class Agency(object):
         if newspaper not in editor.newspapers:
             editor.newspapers.append(newspaper)
 
+        self.storage.save_issue(issue)
+        self.storage.save_editor(editor)
+        self._log("specify_editor", paper_id=paper_id, issue_id=issue_id, editor_id=editor_id)
         return issue
 
-    def deliver_issue(self, paper_id: int, issue_id: int, subscriber_id: int):
+    @mutation
+    def deliver_issue(self, paper_id: int, issue_id: int, subscriber_id: int, timestamp: float = None):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
             raise ValueError(f"A newspaper with ID {paper_id} doesn't exist!")
 
-        issue = self.get_issue(paper_id, issue_id)
+        issue = newspaper.get_issue(issue_id)
         if issue is None:
             raise ValueError(f"An issue with ID {issue_id} doesn't exist!")
 
@@ -180,31 +601,129 @@ class Agency(object):
         if not issue.released:
             raise ValueError(f"Issue with ID {issue_id} has not been released yet!")
 
-        # Record the delivery in a list
-        sub.delivered_issues.append(issue)
+        # Record the delivery in the ledger, delivering the same issue again is not recorded twice
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.deliveries.record(sub.subscriber_id, newspaper.paper_id, issue.issue_id, timestamp):
+            self.storage.record_deliveries([(sub.subscriber_id, newspaper.paper_id, issue.issue_id, timestamp)])
+            self._log("deliver_issue", paper_id=paper_id, issue_id=issue_id, subscriber_id=subscriber_id,
+                      timestamp=timestamp)
 
         return issue
 
+    @mutation
+    def deliver_issue_to_all(self, paper_id: int, issue_id: int, subscriber_ids: List[int] = None,
+                             batch_size: int = 10000, timestamp: float = None):
+        # Deliver a released issue to all current subscribers of the paper, or to the given subscribers only
+        newspaper = self.get_newspaper(paper_id)
+        if newspaper is None:
+            raise ValueError(f"A newspaper with ID {paper_id} doesn't exist!")
+
+        issue = newspaper.get_issue(issue_id)
+        if issue is None:
+            raise ValueError(f"An issue with ID {issue_id} doesn't exist!")
+
+        if not issue.released:
+            raise ValueError(f"Issue with ID {issue_id} has not been released yet!")
+
+        if batch_size < 1:
+            raise ValueError("The batch size has to be at least 1!")
+
+        if subscriber_ids is None:
+            targets = sorted(self.paper_subscribers.get(paper_id, ()))
+        else:
+            targets = list(subscriber_ids)
+
+        timestamp = time.time() if timestamp is None else timestamp
+        batches = []
+        for start in range(0, len(targets), batch_size):
+            batch = targets[start:start + batch_size]
+            known = [sub_id for sub_id in batch if self.subscribers.has_key(sub_id)]
+            first_row = len(self.deliveries.subscriber_ids)
+            delivered = self.deliveries.record_many(known, paper_id, issue_id, timestamp)
+            # The new rows are appended to the ledger
+            self.storage.record_deliveries((sub_id, paper_id, issue_id, timestamp)
+                                           for sub_id in self.deliveries.subscriber_ids[first_row:])
+            batches.append({
+                "delivered": delivered,
+                "already_delivered": len(known) - delivered,
+                "unknown_subscribers": len(batch) - len(known)
+            })
+
+        if any(batch["delivered"] for batch in batches):
+            # Without subscriber_ids the targets are recomputed on replay, they are the same at this point of the log
+            self._log("deliver_issue_to_all", paper_id=paper_id, issue_id=issue_id, subscriber_ids=subscriber_ids
+                      if subscriber_ids is None else targets, timestamp=timestamp)
+
+        return {
+            "newspaper_id": paper_id,
+            "issue_id": issue_id,
+            "delivered": sum(batch["delivered"] for batch in batches),
+            "already_delivered": sum(batch["already_delivered"] for batch in batches),
+            "unknown_subscribers": sum(batch["unknown_subscribers"] for batch in batches),
+            "batches": batches
+        }
+
     # METHODS for editor
+    @mutation
     def add_editor(self, new_editor: Editor):
         # Assert that ID does not exist  yet
-        if any(new_editor.editor_id == editor.editor_id for editor in self.editors):
+        if self.editors.has_key(new_editor.editor_id):
             raise ValueError(f"An editor with ID {new_editor.editor_id} already exists!")
         self.editors.append(new_editor)
+        self._log("add_editors", (EDITOR, None), editors=[editor_record(new_editor)])
+
+    @mutation
+    def add_editors(self, new_editors: List[Editor]):
+        if not new_editors:
+            return
+        self._check_new_ids(self.editors, [editor.editor_id for editor in new_editors],
+                            "An editor with ID {} already exists!")
+        self.editors.extend(new_editors)
+        self._log("add_editors", (EDITOR, None), editors=[editor_record(editor) for editor in new_editors])
+
+    @mutation
+    def update_editor(self, editor: Editor, editor_name: str = None, address: str = None) -> bool:
+        # Update the given fields and report if anything changed
+        updated = False
+        if editor_name is not None:
+            editor.editor_name = editor_name
+            updated = True
+        if address is not None:
+            editor.address = address
+            updated = True
+        if updated:
+            self.storage.save_editor(editor)
+            self._log("update_editor", editor_id=editor.editor_id, editor_name=editor_name, address=address)
+        return updated
 
     def get_editor(self, editor_id: Union[int, str]) -> Optional[Editor]:
-        for editor in self.editors:
-            if editor.editor_id == editor_id:
-                return editor
-        return None
+        return self.editors.get(editor_id)
 
+    @reading
     def all_editor(self) -> List[Editor]:
-        return self.editors
+        return list(self.editors)
 
+    @reading
+    def editors_page(self, after: Optional[Cursor], limit: int):
+        return self.editors.page(after, limit)
+
+    @mutation
     def remove_editor(self, editor: Editor):
         self.editors.remove(editor)
+        self._log("remove_editor", editor_id=editor.editor_id)
+
+    @mutation
+    def transfer_and_remove_editor(self, editor: Editor) -> Dict[Tuple[int, int], Optional[int]]:
+        # Both in one mutation, so nobody sees the editor without its issues or a removal without the transfer. Returns
+        # where each issue went, like transfer_issues.
+        if editor not in self.editors:
+            raise ValueError(f"An editor with ID {editor.editor_id} doesn't exist!")
+        transferred = self.transfer_issues(editor)
+        self.remove_editor(editor)
+        return transferred
 
     # An editor may be responsible for the content of the newspaper, not just the issue
+    @mutation
     def add_newspaper_to_editor(self, paper_id: int, editor_id: int):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
@@ -216,57 +735,227 @@ class Agency(object):
 
         if newspaper not in editor.newspapers:
             editor.newspapers.append(newspaper)
+            self.storage.save_editor(editor)
+            self._log("add_newspaper_to_editor", paper_id=paper_id, editor_id=editor_id)
 
     # When an editor is removed, transfer all issues to another editor of the same newspaper
-    def transfer_issues(self, targeted_editor: Editor):
-        # For each newspaper the editor has
+    @mutation
+    def transfer_issues(self, targeted_editor: Editor) -> Dict[Tuple[int, int], Optional[int]]:
+        # The issues still assigned to the editor: the ones of its newspapers naming it, and the ones it holds of
+        # other newspapers
+        editor_id = targeted_editor.editor_id
+        moving = []
         for paper in targeted_editor.newspapers:
-            # Create a list of issues to be transferred
-            issue_to_transfer = [issue for issue in paper.issues if issue.editor_id == targeted_editor.editor_id]
-
-            # Find another editor and transfer issues
-            for issue in issue_to_transfer:
-                # Use a flag to check if the transfer take place
-                transfer = False
-                for editor in self.editors:
-                    # Find another editor with the same newspaper assigned
-                    if editor.editor_id != targeted_editor.editor_id and paper in editor.newspapers:
-                        # Because I set only one editor to each issue, I assume that each issue has only one editor
-                        # assigned
-                        editor.issues.append(issue)
-                        issue.set_editor(editor.editor_id)
-                        transfer = True
-                        break  # No need to iterate anymore
-                if not transfer:
-                    # Be sure that the issue doesn't remain set to this editor
-                    issue.editor_id = None
-
+            moving.extend(issue for issue in paper.issues if issue.editor_id == editor_id)
+        own_papers = set(targeted_editor.newspapers.ids)
+        for key in targeted_editor.issues.ids:
+            if unpack_key(key)[0] not in own_papers:
+                issue = self._issue_by_key(key)
+                if issue is not None and issue.editor_id == editor_id:
+                    moving.append(issue)
+
+        # Spread them over the other editors of each newspaper, the least loaded first
+        assignments = least_loaded(moving,
+                                   lambda paper_id: (colleague for colleague in self.paper_editors.get(paper_id, ())
+                                                     if colleague != editor_id),
+                                   lambda colleague: len(self.editors.get(colleague).issues))
+
+        # Where each issue went, None if the newspaper has no other editor
+        transferred = {}
+        # Receiver ID -> keys of the issues it gets
+        received: Dict[int, List[int]] = {}
+        for issue, receiver_id in assignments:
+            # Unassigned issues don't remain set to this editor either
+            issue.set_editor(receiver_id)
+            if receiver_id is not None:
+                received.setdefault(receiver_id, []).append(issue_key(issue))
+            transferred[(issue.paper_id, issue.issue_id)] = receiver_id
+            self.storage.save_issue(issue)
+
+        # The editor keeps none of its issues
+        targeted_editor.issues = []
+        self.storage.save_editor(targeted_editor)
+        for receiver_id, keys in received.items():
+            receiver = self.editors.get(receiver_id)
+            receiver.issues.extend_ids(keys)
+            self.storage.save_editor(receiver)
+        # The transfer only depends on the state, so replaying the call gives the same result
+        self._log("transfer_issues", editor_id=editor_id)
+        return transferred
+
+    @reading
     def editor_issues(self, editor_id: int) -> Optional[List[Issue]]:
         editor = self.get_editor(editor_id)
         if editor is not None:
-            return editor.issues
+            return list(editor.issues)
         else:
             return None
 
+    @reading
+    def unassigned_issues(self) -> List[Issue]:
+        return [self._issue_by_key(key) for key in self.orphans]
+
+    @reading
+    def unassigned_issues_page(self, after: Optional[Cursor], limit: int):
+        keys, next_cursor = self.orphans.page(after, limit)
+        return [self._issue_by_key(key) for key in keys], next_cursor
+
+    @mutation
+    def auto_assign_issues(self, paper_id: int = None) -> Dict[Tuple[int, int], int]:
+        # Hand the unassigned issues (of one newspaper, or of all) to the least loaded editors of their newspapers, in
+        # one pass. Issues of newspapers without editors stay unassigned. Returns where each assigned issue went.
+        if paper_id is not None and self.get_newspaper(paper_id) is None:
+            raise ValueError(f"A newspaper with ID {paper_id} doesn't exist!")
+        orphans = [self._issue_by_key(key) for key in self.orphans
+                   if paper_id is None or unpack_key(key)[0] == paper_id]
+        assignments = least_loaded(orphans, lambda orphan_paper_id: self.paper_editors.get(orphan_paper_id, ()),
+                                   lambda editor_id: len(self.editors.get(editor_id).issues))
+        # The order of the orphans isn't kept by snapshots or the database, so the log gets the result, not the call
+        return self.assign_issues([(issue.paper_id, issue.issue_id, editor_id) for issue, editor_id in assignments
+                                   if editor_id is not None])
+
+    @mutation
+    def assign_issues(self, assignments: List[Tuple[int, int, int]]) -> Dict[Tuple[int, int], int]:
+        # Set the editor of many issues at once, given as (paper_id, issue_id, editor_id)
+        assigned = {}
+        received: Dict[int, List[int]] = {}
+        for paper_id, issue_id, editor_id in assignments:
+            issue = self.get_issue(paper_id, issue_id)
+            if issue is None:
+                raise ValueError(f"An issue with ID {issue_id} doesn't exist!")
+            if self.get_editor(editor_id) is None:
+                raise ValueError(f"An editor with ID {editor_id} doesn't exist!")
+            issue.set_editor(editor_id)
+            received.setdefault(editor_id, []).append(issue_key(issue))
+            assigned[(paper_id, issue_id)] = editor_id
+            self.storage.save_issue(issue)
+        for editor_id, keys in received.items():
+            editor = self.editors.get(editor_id)
+            # An editor may hold an issue that names nobody, it isn't added twice
+            held = set(editor.issues.ids)
+            editor.issues.extend_ids(key for key in keys if key not in held)
+            self.storage.save_editor(editor)
+        if assigned:
+            self._log("assign_issues", assignments=[list(assignment) for assignment in assignments])
+        return assigned
+
     # METHODS for subscriber
+    @mutation
     def add_subscriber(self, new_subscriber: Subscriber):
         # Assert that ID does not exist  yet
-        if any(new_subscriber.subscriber_id == sub.subscriber_id for sub in self.subscribers):
+        if self.subscribers.has_key(new_subscriber.subscriber_id):
             raise ValueError(f"A subscriber with ID {new_subscriber.subscriber_id} already exists!")
         self.subscribers.append(new_subscriber)
+        self._log("add_subscribers", (SUBSCRIBER, None), subscribers=[subscriber_record(new_subscriber)])
+
+    @mutation
+    def add_subscribers(self, new_subscribers: List[Subscriber]):
+        if not new_subscribers:
+            return
+        self._check_new_ids(self.subscribers, [sub.subscriber_id for sub in new_subscribers],
+                            "A subscriber with ID {} already exists!")
+        self.subscribers.extend(new_subscribers)
+        self._log("add_subscribers", (SUBSCRIBER, None),
+                  subscribers=[subscriber_record(sub) for sub in new_subscribers])
+
+    @mutation
+    def update_subscriber(self, sub: Subscriber, name: str = None, address: str = None) -> bool:
+        # Update the given fields and report if anything changed
+        updated = False
+        if name is not None:
+            sub.subscriber_name = name
+            updated = True
+        if address is not None:
+            sub.subscriber_address = address
+            updated = True
+        if updated:
+            self._subscriber_changed(sub.subscriber_id)
+            self.storage.save_subscriber(sub)
+            self._log("update_subscriber", subscriber_id=sub.subscriber_id, name=name, address=address)
+        return updated
 
     def get_subscriber(self, subscriber_id: Union[int, str]) -> Optional[Subscriber]:
-        for sub in self.subscribers:
-            if sub.subscriber_id == subscriber_id:
-                return sub
-        return None
+        return self.subscribers.get(subscriber_id)
 
+    @reading
     def all_subscribers(self) -> List[Subscriber]:
-        return self.subscribers
+        return list(self.subscribers)
+
+    @reading
+    def subscribers_page(self, after: Optional[Cursor], limit: int):
+        return self.subscribers.page(after, limit)
 
+    @mutation
     def remove_subscriber(self, sub: Subscriber):
         self.subscribers.remove(sub)
-
+        self._log("remove_subscriber", subscriber_id=sub.subscriber_id)
+
+    def _subscriber_changed(self, subscriber_id: int, added: bool = False):
+        changes = self.subscriber_changes
+        if changes is not None:
+            changes.note(subscriber_id, added)
+
+    # Keep the reverse subscription index in sync, also when the lists are changed directly
+    def _subscriber_added(self, sub: Subscriber):
+        self._subscriber_changed(sub.subscriber_id, added=True)
+        # Attach the deliveries first, so the backlogs know what was delivered already
+        sub.delivered_issues.attach(self.deliveries, self.issue_resolver)
+        for paper_id in sub.subscriptions:
+            self._index_subscription(sub, paper_id)
+        sub.subscriptions.watch(self, *self.subscription_watchers)
+
+    def _subscriber_loaded(self, sub: Subscriber):
+        # A lazily loaded subscriber (see load_snapshot) is in the indexes already, its backlog is built now
+        sub.delivered_issues.attach(self.deliveries, self.issue_resolver)
+        sub.subscriptions.watch(self, *self.subscription_watchers)
+        backlog = {}
+        for paper_id in sub.subscriptions:
+            released = self.released_issues.get(paper_id)
+            if released:
+                missing = released - self.deliveries.issue_ids_for(sub.subscriber_id, paper_id)
+                if missing:
+                    backlog[paper_id] = missing
+        if backlog:
+            self.backlogs[sub.subscriber_id] = backlog
+
+    def _subscriber_removed(self, sub: Subscriber):
+        self._subscriber_changed(sub.subscriber_id)
+        sub.subscriptions.unwatch(self)
+        self.deliveries.remove_subscriber(sub.subscriber_id)
+        sub.delivered_issues.detach()
+        for paper_id in sub.subscriptions:
+            self._unindex_subscription(sub, paper_id)
+        self.backlogs.pop(sub.subscriber_id, None)
+
+    def _index_subscription(self, sub: Subscriber, paper_id: int):
+        self._subscriber_changed(sub.subscriber_id)
+        audience = self.paper_subscribers.setdefault(paper_id, set())
+        if sub.subscriber_id not in audience:
+            audience.add(sub.subscriber_id)
+            self.versions.touch(paper_id)
+            stats = self.paper_stats.get(paper_id)
+            if stats is not None:
+                stats.add_subscriber()
+            # The new subscriber misses all issues released so far
+            missing = {issue_id for issue_id in self.released_issues.get(paper_id, ())
+                       if not self.deliveries.delivered(sub.subscriber_id, paper_id, issue_id)}
+            if missing:
+                self.backlogs.setdefault(sub.subscriber_id, {})[paper_id] = missing
+
+    def _unindex_subscription(self, sub: Subscriber, paper_id: int):
+        self._subscriber_changed(sub.subscriber_id)
+        audience = self.paper_subscribers.get(paper_id)
+        if audience is not None and sub.subscriber_id in audience:
+            audience.remove(sub.subscriber_id)
+            self.versions.touch(paper_id)
+            if not audience:
+                del self.paper_subscribers[paper_id]
+            stats = self.paper_stats.get(paper_id)
+            if stats is not None:
+                stats.remove_subscriber()
+            self.backlogs.get(sub.subscriber_id, {}).pop(paper_id, None)
+
+    @mutation
     def subscribe(self, paper_id, subscriber_id):
         newspaper = self.get_newspaper(paper_id)
         if newspaper is None:
@@ -277,11 +966,15 @@ class Agency(object):
             raise ValueError(f"A subscriber with ID {subscriber_id} doesn't exist!")
 
         if paper_id in sub.subscriptions:
-            return {"subscriptions": sub.subscriptions, "status": "Subscriber already subscribed to this paper!"}
+            return {"subscriptions": list(sub.subscriptions), "status": "Subscriber already subscribed to this paper!"}
         else:
+            # The reverse index is updated by the subscriptions registry
             sub.subscriptions.append(paper_id)
-            return {"subscriptions": sub.subscriptions, "status": "Subscriber successfully subscribed to this paper!"}
+            self._log("subscribe", paper_id=paper_id, subscriber_id=subscriber_id)
+            return {"subscriptions": list(sub.subscriptions),
+                    "status": "Subscriber successfully subscribed to this paper!"}
 
+    @reading
     def get_subscriber_stats(self, subscriber_id):
         sub = self.get_subscriber(subscriber_id)
         if sub is None:
@@ -297,9 +990,8 @@ class Agency(object):
             if newspaper:
                 monthly_cost = newspaper.price
                 annual_cost = monthly_cost * 12
-                # Use a set for efficiency in checking
-                issue_ids = {issue.issue_id for issue in newspaper.issues}
-                number_of_issues = len([issue for issue in sub.delivered_issues if issue.issue_id in issue_ids])
+                # The ledger keeps a count per subscriber and newspaper
+                number_of_issues = self.deliveries.count(sub.subscriber_id, paper_id)
 
                 details.append({
                     "newspaper_id": paper_id,
@@ -319,6 +1011,7 @@ class Agency(object):
             "details": details
         }
 
+    @reading
     def missing_issues(self, subscriber_id):
         sub = self.get_subscriber(subscriber_id)
         if sub is None:
@@ -328,30 +1021,70 @@ class Agency(object):
         # And therefore, some issues which are released for that newspaper are not transferred
         missing_issues = []
 
+        # The backlog holds the released issues which were not delivered yet, per subscribed paper
+        backlog = self.backlogs.get(sub.subscriber_id, {})
         for paper_id in sub.subscriptions:
             newspaper = self.get_newspaper(paper_id)
-            if newspaper:
-                # Collect released issues based on IDs
-                released_issues = [issue.issue_id for issue in newspaper.issues if issue.released]
-                # Collect delivered issues based on IDs
-                delivered_issues = [issue.issue_id for issue in sub.delivered_issues]
-                # Identify missing issues using set operation
-                missing_issues_ids = set(released_issues) - set(delivered_issues)
+            if newspaper and backlog.get(paper_id):
+                # List them in the order of the newspaper's issues
+                missing = sorted((newspaper.get_issue(issue_id) for issue_id in backlog[paper_id]),
+                                 key=lambda missing_issue: newspaper.issues.rank(missing_issue.issue_id))
 
                 # Create a dictionary for details about missing issues
-                for issue in newspaper.issues:
-                    if issue.issue_id in missing_issues_ids:
-                        dict_details = {
-                            "newspaper_id": newspaper.paper_id,
-                            "newspaper_name": newspaper.name,
-                            "newspaper_frequency": newspaper.frequency,
-                            "newspaper_price": newspaper.price,
-                            "issue_id": issue.issue_id,
-                            "issue_release_date": issue.release_date,
-                            "issue_number_of_pages": issue.number_of_pages,
-                            "issue_editor_id": issue.editor_id,
-                            "status": "Missing"
-                        }
-                        missing_issues.append(dict_details)
+                for issue in missing:
+                    dict_details = {
+                        "newspaper_id": newspaper.paper_id,
+                        "newspaper_name": newspaper.name,
+                        "newspaper_frequency": newspaper.frequency,
+                        "newspaper_price": newspaper.price,
+                        "issue_id": issue.issue_id,
+                        "issue_release_date": issue.release_date,
+                        "issue_number_of_pages": issue.number_of_pages,
+                        "issue_editor_id": issue.editor_id,
+                        "status": "Missing"
+                    }
+                    missing_issues.append(dict_details)
 
         return missing_issues
+
+    def pin(self) -> AgencyVersion:
+        # A consistent version of the newspapers, which stays the same however long it is read
+        return self.versions.pin()
+
+    def missing_report(self) -> Iterator[MissingBlock]:
+        # Every released issue not yet delivered to a subscriber of its paper, one block per newspaper. The report is
+        # computed from a pinned version, so it holds no lock while the caller streams it.
+        return self.pin().missing_report()
+
+
+# How each logged operation is applied again, with the arguments it was logged with
+_REPLAY = {
+    "add_newspapers": lambda agency, newspapers: agency.add_newspapers(
+        [newspaper_from_record(record) for record in newspapers]),
+    "remove_newspaper": lambda agency, paper_id: agency.remove_newspaper(agency.get_newspaper(paper_id)),
+    "update_newspaper": lambda agency, paper_id, **fields: agency.update_newspaper(agency.get_newspaper(paper_id),
+                                                                                   **fields),
+    "add_issues": lambda agency, paper_id, issues: agency.get_newspaper(paper_id).issues.extend(
+        issue_from_record(record) for record in issues),
+    "release_issue": Agency.release_issue,
+    "specify_editor": Agency.specify_editor,
+    "deliver_issue": Agency.deliver_issue,
+    "deliver_issue_to_all": Agency.deliver_issue_to_all,
+    "add_editors": lambda agency, editors: agency.add_editors(
+        [editor_from_record(record, agency.get_newspaper, agency.get_issue) for record in editors]),
+    "update_editor": lambda agency, editor_id, **fields: agency.update_editor(agency.get_editor(editor_id), **fields),
+    "remove_editor": lambda agency, editor_id: agency.remove_editor(agency.get_editor(editor_id)),
+    "add_newspaper_to_editor": Agency.add_newspaper_to_editor,
+    "transfer_issues": lambda agency, editor_id: agency.transfer_issues(agency.get_editor(editor_id)),
+    "assign_issues": Agency.assign_issues,
+    "add_subscribers": lambda agency, subscribers: agency.add_subscribers(
+        [subscriber_from_record(record) for record in subscribers]),
+    "update_subscriber": lambda agency, subscriber_id, **fields: agency.update_subscriber(
+        agency.get_subscriber(subscriber_id), **fields),
+    "remove_subscriber": lambda agency, subscriber_id: agency.remove_subscriber(agency.get_subscriber(subscriber_id)),
+    "subscribe": Agency.subscribe,
+}
+
+
+def _orphan_key(key: int) -> int:
+    return key
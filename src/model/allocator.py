@@ -0,0 +1,144 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# The kinds of entities with their own ID sequence
+NEWSPAPER = "newspaper"
+EDITOR = "editor"
+SUBSCRIBER = "subscriber"
+ISSUE = "issue"
+
+
+class IdAllocator(object):
+    """
+    Hands out IDs from the range [low, high] in ascending order, a range without high never runs out.
+
+    IDs which are already taken (e.g. entities added with an explicit ID) are skipped. The cursor only moves forward,
+    so each ID is looked at once and allocating never rescans the collection.
+    """
+
+    def __init__(self, low: int, high: Optional[int]):
+        self.low = low
+        self.high = high
+        self.next_id = low
+        self._lock = threading.Lock()
+
+    def _exhausted(self) -> bool:
+        return self.high is not None and self.next_id > self.high
+
+    def _allocate(self, is_taken: Callable[[int], bool]) -> int:
+        while not self._exhausted():
+            candidate = self.next_id
+            self.next_id += 1
+            if not is_taken(candidate):
+                return candidate
+        raise ValueError(f"No free IDs left between {self.low} and {self.high}!")
+
+    def allocate(self, is_taken: Callable[[int], bool]) -> int:
+        with self._lock:
+            return self._allocate(is_taken)
+
+    def allocate_block(self, count: int, is_taken: Callable[[int], bool]) -> List[int]:
+        # Reserve count IDs at once. If there are not enough IDs left, none are used up.
+        with self._lock:
+            start = self.next_id
+            ids = []
+            try:
+                while len(ids) < count:
+                    ids.append(self._allocate(is_taken))
+            except ValueError:
+                self.next_id = start
+                raise ValueError(f"Not enough free IDs left between {self.low} and {self.high}!") from None
+            return ids
+
+    def advance(self, next_id: int):
+        # Continue at next_id at the earliest, e.g. after a restart. The cursor never moves backwards.
+        with self._lock:
+            self.next_id = max(self.next_id, next_id, self.low)
+
+
+class IdService(object):
+    """
+    The ID sequences of the agency: one per kind of entity, and one per newspaper for its issues.
+
+    The ranges can be configured per kind, e.g. {"newspaper": (1, 999)} allows at most 999 newspapers. IDs are never
+    handed out twice, not even those of removed entities, so by default only the issue IDs of a newspaper (which have
+    to fit into 32 bits) are limited. state() is the next ID of every sequence, restore() continues
+    from such a state. Sequences which don't exist yet (the issues
+    of a newspaper which is loaded later) pick up their restored position when they are created.
+    """
+
+    DEFAULT_RANGES: Dict[str, Tuple[int, Optional[int]]] = {
+        NEWSPAPER: (1, None),
+        EDITOR: (10000, None),
+        SUBSCRIBER: (100000, None),
+        # The ledger packs an issue ID into the low 32 bits of a delivery key
+        ISSUE: (1000, 2 ** 32 - 1),
+    }
+
+    def __init__(self, ranges: Dict[str, Tuple[int, Optional[int]]] = None):
+        self.ranges = dict(self.DEFAULT_RANGES, **(ranges or {}))
+        self._sequences: Dict[str, IdAllocator] = {}
+        # Restored positions of sequences which were not created yet
+        self._restored: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, ranges: Dict[str, Tuple[int, Optional[int]]]):
+        # Change the ranges of some kinds, the existing sequences of these kinds continue in their new range
+        with self._lock:
+            self.ranges.update(ranges)
+            for name, allocator in self._sequences.items():
+                kind = name.split(":", 1)[0]
+                if kind in ranges:
+                    allocator.low, allocator.high = ranges[kind]
+                    allocator.advance(allocator.low)
+
+    @staticmethod
+    def _name(kind: str, owner=None) -> str:
+        return kind if owner is None else f"{kind}:{owner}"
+
+    def sequence(self, kind: str, owner=None) -> IdAllocator:
+        name = self._name(kind, owner)
+        with self._lock:
+            allocator = self._sequences.get(name)
+            if allocator is None:
+                allocator = self._sequences[name] = IdAllocator(*self.ranges[kind])
+                allocator.advance(self._restored.pop(name, allocator.low))
+            return allocator
+
+    def attach(self, allocator: IdAllocator, kind: str, owner=None):
+        # Take over an allocator created elsewhere (like the issue IDs of a newspaper), in the configured range
+        allocator.low, allocator.high = self.ranges[kind]
+        name = self._name(kind, owner)
+        with self._lock:
+            allocator.advance(self._restored.pop(name, allocator.low))
+            self._sequences[name] = allocator
+
+    def detach(self, kind: str, owner=None):
+        with self._lock:
+            self._sequences.pop(self._name(kind, owner), None)
+
+    def next_id(self, kind: str, is_taken: Callable[[int], bool]) -> int:
+        return self.sequence(kind).allocate(is_taken)
+
+    def reserve(self, kind: str, count: int, is_taken: Callable[[int], bool]) -> List[int]:
+        # A block of IDs for a bulk insert
+        return self.sequence(kind).allocate_block(count, is_taken)
+
+    def position(self, kind: str, owner=None) -> Dict[str, int]:
+        # The state of a single sequence
+        return {self._name(kind, owner): self.sequence(kind, owner).next_id}
+
+    def state(self) -> Dict[str, int]:
+        with self._lock:
+            state = dict(self._restored)
+            state.update((name, allocator.next_id) for name, allocator in self._sequences.items())
+            return state
+
+    def restore(self, state: Dict[str, int]):
+        with self._lock:
+            for name, next_id in state.items():
+                allocator = self._sequences.get(name)
+                if allocator is not None:
+                    allocator.advance(next_id)
+                else:
+                    self._restored[name] = max(next_id, self._restored.get(name, next_id))
@@ -0,0 +1,39 @@
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .issue import Issue
+
+
+def least_loaded(issues: Iterable[Issue], editors_of: Callable[[int], Iterable[int]],
+                 load: Callable[[int], int]) -> List[Tuple[Issue, Optional[int]]]:
+    """
+    Spread issues over the editors of their newspapers, each issue going to the editor with the fewest issues.
+
+    editors_of(paper_id) gives the IDs of the eligible editors and load(editor_id) their current number of issues.
+    Per newspaper a heap keyed on (load, editor_id) hands out the issues, so n issues over k editors take
+    O(n log k) and ties go to the lowest editor ID. Returns (issue, editor_id) pairs grouped by newspaper,
+    editor_id is None if the newspaper has no eligible editor.
+    """
+    by_paper: Dict[int, List[Issue]] = {}
+    for issue in issues:
+        by_paper.setdefault(issue.paper_id, []).append(issue)
+
+    # The loads so far, including what was handed out for earlier newspapers
+    loads: Dict[int, int] = {}
+    assignments = []
+    for paper_id, paper_issues in by_paper.items():
+        heap = []
+        for editor_id in editors_of(paper_id):
+            if editor_id not in loads:
+                loads[editor_id] = load(editor_id)
+            heap.append((loads[editor_id], editor_id))
+        if not heap:
+            assignments.extend((issue, None) for issue in paper_issues)
+            continue
+        heapq.heapify(heap)
+        for issue in paper_issues:
+            count, editor_id = heap[0]
+            loads[editor_id] = count + 1
+            heapq.heapreplace(heap, (count + 1, editor_id))
+            assignments.append((issue, editor_id))
+    return assignments
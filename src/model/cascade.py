@@ -0,0 +1,47 @@
+from typing import NamedTuple
+
+from .ledger import _ISSUE_BITS
+
+
+class CascadeReport(NamedTuple):
+    """What removing a newspaper touched."""
+    paper_id: int
+    # Editors which lost the paper or some of its issues, and the issue references they lost
+    editors: int
+    editor_issues: int
+    # Subscribers which lost their subscription, and the deliveries dropped from the ledger
+    subscriptions: int
+    deliveries: int
+    # Issues of the paper
+    issues: int
+
+
+def remove_newspaper_cascade(agency, paper) -> CascadeReport:
+    """
+    Remove a newspaper and everything referring to it, in time linear in what is affected.
+
+    Nothing is scanned: the editors come from the back-references of the agency (paper_editors and issue_editors),
+    the subscribers from its reverse subscription index and the deliveries from the ledger's rows of the paper. An
+    affected editor's issue references are filtered in one pass.
+    """
+    paper_id = paper.paper_id
+
+    editor_ids = set(agency.paper_editors.get(paper_id, ())) | set(agency.issue_editors.get(paper_id, ()))
+    editor_issues = 0
+    for editor_id in editor_ids:
+        editor = agency.editors.get(editor_id)
+        editor_issues += editor.issues.remove_ids(lambda key: key >> _ISSUE_BITS == paper_id)
+        if paper in editor.newspapers:
+            editor.newspapers.remove(paper)
+        agency.storage.save_editor(editor)
+
+    # Unsubscribing keeps the stats and backlogs in sync
+    subscriber_ids = list(agency.paper_subscribers.get(paper_id, ()))
+    for subscriber_id in subscriber_ids:
+        agency.subscribers.get(subscriber_id).subscriptions.remove(paper_id)
+    deliveries = agency.deliveries.remove_paper(paper_id)
+
+    issues = len(paper.issues)
+    paper.issues.clear()
+    agency.newspapers.remove(paper)
+    return CascadeReport(paper_id, len(editor_ids), editor_issues, len(subscriber_ids), deliveries, issues)
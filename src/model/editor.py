@@ -1,16 +1,33 @@
-from typing import List, Optional
-
-from flask_restx import Model
+from typing import Iterable
 
 from .newspaper import Newspaper
 from .issue import Issue
+from .refs import References, issue_key, paper_key
 
 
 class Editor(object):
+    __slots__ = ('editor_id', 'editor_name', 'address', '_newspapers', '_issues')
+
     def __init__(self, editor_id: int, editor_name: str, address: str):
         self.editor_id = editor_id
         self.editor_name = editor_name
         self.address = address
-        self.newspapers: List[Newspaper] = []
-        self.issues: List[Issue] = []
+        # The newspapers and issues are stored as IDs, and resolved through the agency once the editor is added to it
+        self._newspapers: References[Newspaper] = References(self, paper_key)
+        self._issues: References[Issue] = References(self, issue_key)
+
+    @property
+    def newspapers(self) -> References[Newspaper]:
+        return self._newspapers
+
+    @newspapers.setter
+    def newspapers(self, newspapers: Iterable[Newspaper]):
+        self._newspapers.replace(newspapers)
+
+    @property
+    def issues(self) -> References[Issue]:
+        return self._issues
 
+    @issues.setter
+    def issues(self, issues: Iterable[Issue]):
+        self._issues.replace(issues)
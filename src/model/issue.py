@@ -1,11 +1,47 @@
+from typing import Callable, Optional, Tuple
+
+
 class Issue(object):
+    # The attributes an issue is rendered from, changing any of them bumps its version
+    VERSIONED = frozenset(('issue_id', 'release_date', 'number_of_pages', 'released', 'editor_id'))
+    # No __dict__ per issue, there are millions of them
+    __slots__ = ('version', 'fragment', 'issue_id', 'release_date', 'number_of_pages', 'on_release', 'on_assign',
+                 '_released', 'editor_id', 'paper_id')
+
     def __init__(self, issue_id: int, release_date: str, number_of_pages: int, released: bool = False, editor_id: int = None):
+        # Lets caches of the rendered issue tell whether they are stale
+        self.version = 0
+        # (cache key, JSON text) of the last rendering, kept by the API layer
+        self.fragment: Optional[Tuple[object, str]] = None
         self.issue_id = issue_id
         self.release_date = release_date
         self.number_of_pages = number_of_pages
-        self.released: bool = released
+        # Called by the newspaper of the issue once it gets released
+        self.on_release: Optional[Callable[['Issue'], None]] = None
+        # Called by the newspaper of the issue whenever its editor changes
+        self.on_assign: Optional[Callable[['Issue'], None]] = None
+        self._released: bool = released
         self.editor_id = editor_id
+        # Set by the newspaper the issue is added to
+        self.paper_id: int = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in Issue.VERSIONED:
+            object.__setattr__(self, 'version', self.version + 1)
+            if name == 'editor_id' and self.on_assign is not None:
+                self.on_assign(self)
+
+    @property
+    def released(self) -> bool:
+        return self._released
+
+    @released.setter
+    def released(self, released: bool):
+        was_released = self._released
+        self._released = released
+        if released and not was_released and self.on_release is not None:
+            self.on_release(self)
 
     def set_editor(self, editor_id: int):
         self.editor_id = editor_id
-
@@ -0,0 +1,185 @@
+import atexit
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class DeliveryJob(object):
+    """A delivery run processed in the background, in chunks of subscribers."""
+
+    # Only the first errors are kept, so a failing job cannot grow without bound
+    MAX_ERRORS = 100
+
+    def __init__(self, job_id: int, paper_id: int, issue_id: int, subscriber_ids: Optional[List[int]],
+                 chunk_size: int):
+        self.job_id = job_id
+        self.paper_id = paper_id
+        self.issue_id = issue_id
+        # None means all subscribers of the newspaper at the time the job starts
+        self.subscriber_ids = subscriber_ids
+        self.chunk_size = chunk_size
+        self.status = QUEUED
+        self.total = len(subscriber_ids) if subscriber_ids is not None else None
+        self.processed = 0
+        self.delivered = 0
+        self.already_delivered = 0
+        self.unknown_subscribers = 0
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (FINISHED, FAILED)
+
+    def throughput(self) -> float:
+        # Processed subscribers per second
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def add_error(self, message: str):
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(message)
+
+    def as_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "newspaper_id": self.paper_id,
+            "issue_id": self.issue_id,
+            "total": self.total,
+            "processed": self.processed,
+            "delivered": self.delivered,
+            "already_delivered": self.already_delivered,
+            "unknown_subscribers": self.unknown_subscribers,
+            "throughput": round(self.throughput(), 1),
+            "errors": self.errors
+        }
+
+
+class JobQueue(object):
+    """
+    Runs delivery jobs on a bounded pool of worker threads.
+
+    Only the last max_jobs jobs are tracked, the oldest finished ones are evicted first. shutdown() stops accepting
+    new jobs and lets the workers drain the queue, so no accepted delivery is lost.
+    """
+    singleton_instance = None
+
+    def __init__(self, get_agency: Callable, workers: int = 4, max_jobs: int = 1000, chunk_size: int = 10000):
+        self.get_agency = get_agency
+        self.max_jobs = max_jobs
+        self.chunk_size = chunk_size
+        self.jobs: Dict[int, DeliveryJob] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work, name=f"delivery-worker-{number}", daemon=True)
+                         for number in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    # Only one queue is shared by all requests (Singleton pattern, like the Agency)
+    @staticmethod
+    def get_instance():
+        if JobQueue.singleton_instance is None:
+            from .agency import Agency
+            JobQueue.singleton_instance = JobQueue(Agency.get_instance)
+            # Drain the queue when the process exits
+            atexit.register(JobQueue.singleton_instance.shutdown)
+        return JobQueue.singleton_instance
+
+    def submit(self, paper_id: int, issue_id: int, subscriber_ids: List[int] = None,
+               chunk_size: int = None) -> DeliveryJob:
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("The chunk size has to be at least 1!")
+        with self._lock:
+            if self._closed:
+                raise ValueError("The job queue has been shut down!")
+            job = DeliveryJob(next(self._ids), paper_id, issue_id,
+                              list(subscriber_ids) if subscriber_ids is not None else None,
+                              chunk_size or self.chunk_size)
+            self.jobs[job.job_id] = job
+            self._evict()
+        self._queue.put(job)
+        return job
+
+    def get_job(self, job_id: int) -> Optional[DeliveryJob]:
+        return self.jobs.get(job_id)
+
+    def all_jobs(self) -> List[DeliveryJob]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def _evict(self):
+        # Drop the oldest finished jobs, running and queued ones are always kept
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job.job_id for job in self.jobs.values() if job.done][:excess]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: DeliveryJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        agency = self.get_agency()
+        try:
+            # Validate the newspaper and issue once, even if there is nobody to deliver to
+            agency.deliver_issue_to_all(job.paper_id, job.issue_id, subscriber_ids=[])
+            if job.subscriber_ids is None:
+                targets = agency.subscriber_ids_of(job.paper_id)
+                job.total = len(targets)
+            else:
+                targets = job.subscriber_ids
+            for start in range(0, len(targets), job.chunk_size):
+                chunk = targets[start:start + job.chunk_size]
+                result = agency.deliver_issue_to_all(job.paper_id, job.issue_id, subscriber_ids=chunk,
+                                                     batch_size=job.chunk_size)
+                job.delivered += result["delivered"]
+                job.already_delivered += result["already_delivered"]
+                job.unknown_subscribers += result["unknown_subscribers"]
+                job.processed += len(chunk)
+            job.status = FINISHED
+        except Exception as err:
+            job.add_error(str(err))
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def join(self):
+        # Wait until every queued job has been processed
+        self._queue.join()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        # The sentinels are queued behind the pending jobs, so those are still processed
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,433 @@
+import sys
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import numpy as np
+
+from .issue import Issue
+
+# A delivery is identified by (paper_id, issue_id), packed into one 64-bit integer
+_ISSUE_BITS = 32
+_ISSUE_MASK = (1 << _ISSUE_BITS) - 1
+# Marks a deleted row in the subscriber column
+_DELETED = -1
+
+
+def pack_key(paper_id: int, issue_id: int) -> int:
+    if not (0 <= issue_id <= _ISSUE_MASK and 0 <= paper_id < (1 << 31)):
+        raise ValueError(f"Issue {issue_id} of newspaper {paper_id} cannot be recorded in the delivery ledger!")
+    return (paper_id << _ISSUE_BITS) | issue_id
+
+
+def unpack_key(key: int) -> Tuple[int, int]:
+    return key >> _ISSUE_BITS, key & _ISSUE_MASK
+
+
+class DeliveryLedger(object):
+    """
+    Columnar record of all deliveries, one (subscriber_id, paper_id, issue_id, timestamp) row each.
+
+    The rows live in typed arrays instead of Python lists of Issue objects. Each subscriber has an array of packed
+    (paper_id, issue_id) keys and an array of row offsets, each newspaper has an array of row offsets. That makes
+    "was this issue delivered to this subscriber" a C-level scan over that subscriber's keys, and the same issue is
+    never recorded twice for a subscriber.
+
+    After load() the per-subscriber indexes are built on first use, from the rows grouped by subscriber (see
+    _LazyIndex): most subscribers of a large ledger are not looked at for a long time.
+    """
+
+    def __init__(self):
+        self.subscriber_ids = array('q')
+        self.paper_ids = array('q')
+        self.issue_ids = array('q')
+        self.timestamps = array('d')
+        self._subscriber_keys: Dict[int, array] = {}
+        self._subscriber_rows: Dict[int, array] = {}
+        self._paper_rows: Dict[int, array] = {}
+        # Number of deliveries per subscriber and newspaper
+        self._counts: Dict[int, Dict[int, int]] = {}
+        self.deleted_rows = 0
+        # The subscribers of the loaded rows whose indexes were not built yet
+        self._lazy: Optional[_LazyIndex] = None
+        self._lazy_lock = threading.Lock()
+        # Called with (subscriber_id, paper_id, issue_id) when a single delivery is recorded or removed
+        self.on_record: Optional[Callable[[int, int, int], None]] = None
+        self.on_remove: Optional[Callable[[int, int, int], None]] = None
+
+    def record(self, subscriber_id: int, paper_id: int, issue_id: int, timestamp: float = None) -> bool:
+        # Returns False if the issue had already been delivered to the subscriber
+        key = pack_key(paper_id, issue_id)
+        keys = self._keys_of(subscriber_id)
+        if keys is None:
+            keys = self._subscriber_keys[subscriber_id] = array('q')
+            self._subscriber_rows[subscriber_id] = array('q')
+        elif key in keys:
+            return False
+
+        row = len(self.subscriber_ids)
+        self.subscriber_ids.append(subscriber_id)
+        self.paper_ids.append(paper_id)
+        self.issue_ids.append(issue_id)
+        self.timestamps.append(time.time() if timestamp is None else timestamp)
+
+        keys.append(key)
+        self._subscriber_rows[subscriber_id].append(row)
+        self._paper_rows.setdefault(paper_id, array('q')).append(row)
+        counts = self._counts.setdefault(subscriber_id, {})
+        counts[paper_id] = counts.get(paper_id, 0) + 1
+        if self.on_record is not None:
+            self.on_record(subscriber_id, paper_id, issue_id)
+        return True
+
+    def record_many(self, subscriber_ids: Iterable[int], paper_id: int, issue_id: int, timestamp: float = None) -> int:
+        # Record the same issue for many subscribers, appending to the columns in one go. Returns the number of new
+        # rows, subscribers who already got the issue are skipped.
+        key = pack_key(paper_id, issue_id)
+        timestamp = time.time() if timestamp is None else timestamp
+        subscriber_keys = self._subscriber_keys
+        subscriber_rows = self._subscriber_rows
+        recorded = array('q')
+        row = len(self.subscriber_ids)
+        for subscriber_id in subscriber_ids:
+            keys = subscriber_keys.get(subscriber_id)
+            if keys is None and self._lazy is not None:
+                keys = self._index_lazily(subscriber_id)
+            if keys is None:
+                keys = subscriber_keys[subscriber_id] = array('q')
+                subscriber_rows[subscriber_id] = array('q')
+            elif key in keys:
+                continue
+            keys.append(key)
+            subscriber_rows[subscriber_id].append(row)
+            recorded.append(subscriber_id)
+            row += 1
+
+        first_row = len(self.subscriber_ids)
+        count = len(recorded)
+        self.subscriber_ids.extend(recorded)
+        self.paper_ids.extend(array('q', [paper_id]) * count)
+        self.issue_ids.extend(array('q', [issue_id]) * count)
+        self.timestamps.extend(array('d', [timestamp]) * count)
+        self._paper_rows.setdefault(paper_id, array('q')).extend(range(first_row, first_row + count))
+
+        for subscriber_id in recorded:
+            counts = self._counts.setdefault(subscriber_id, {})
+            counts[paper_id] = counts.get(paper_id, 0) + 1
+            if self.on_record is not None:
+                self.on_record(subscriber_id, paper_id, issue_id)
+        return count
+
+    def load(self, subscriber_ids: array, paper_ids: array, issue_ids: array, timestamps: array):
+        # Replace the content with the given rows (e.g. from a snapshot), building the indexes in bulk. The rows have
+        # to be unique per subscriber and issue. No hooks are called.
+        self.subscriber_ids, self.paper_ids, self.issue_ids, self.timestamps = \
+            subscriber_ids, paper_ids, issue_ids, timestamps
+        self.deleted_rows = 0
+        self._subscriber_keys, self._subscriber_rows, self._paper_rows, self._counts = {}, {}, {}, {}
+        self._lazy = None
+        if not len(subscriber_ids):
+            return
+
+        subscribers = np.frombuffer(subscriber_ids, dtype=np.int64)
+        papers = np.frombuffer(paper_ids, dtype=np.int64)
+        keys = (papers << _ISSUE_BITS) | np.frombuffer(issue_ids, dtype=np.int64)
+
+        # Group the rows by subscriber, a stable sort keeps the delivery order within a subscriber
+        order = np.argsort(subscribers, kind='stable')
+        grouped = subscribers[order]
+        starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        self._lazy = _LazyIndex(grouped[starts], np.r_[starts, len(grouped)], keys[order], order.astype(np.int64))
+
+        by_paper = np.argsort(papers, kind='stable')
+        grouped = papers[by_paper]
+        starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        for paper_id, rows in zip(grouped[starts].tolist(), np.split(by_paper.astype(np.int64), starts[1:])):
+            self._paper_rows[paper_id] = array('q', rows.tobytes())
+
+    def _keys_of(self, subscriber_id: int) -> Optional[array]:
+        keys = self._subscriber_keys.get(subscriber_id)
+        if keys is None and self._lazy is not None:
+            keys = self._index_lazily(subscriber_id)
+        return keys
+
+    def _index_lazily(self, subscriber_id: int) -> Optional[array]:
+        # Build the indexes of a subscriber of the loaded rows. Readers may do this concurrently for the same
+        # subscriber, only one of them builds them.
+        with self._lazy_lock:
+            keys = self._subscriber_keys.get(subscriber_id)
+            if keys is not None or self._lazy is None:
+                return keys
+            taken = self._lazy.take(subscriber_id)
+            if taken is None:
+                return None
+            keys, rows = taken
+            counts = {}
+            for key in keys:
+                paper_id = key >> _ISSUE_BITS
+                counts[paper_id] = counts.get(paper_id, 0) + 1
+            self._subscriber_rows[subscriber_id] = rows
+            self._counts[subscriber_id] = counts
+            self._subscriber_keys[subscriber_id] = keys
+            if not self._lazy.remaining:
+                self._lazy = None
+            return keys
+
+    def delivered(self, subscriber_id: int, paper_id: int, issue_id: int) -> bool:
+        keys = self._keys_of(subscriber_id)
+        return keys is not None and pack_key(paper_id, issue_id) in keys
+
+    def count(self, subscriber_id: int, paper_id: int) -> int:
+        if self._keys_of(subscriber_id) is None:
+            return 0
+        return self._counts.get(subscriber_id, {}).get(paper_id, 0)
+
+    def issue_ids_for(self, subscriber_id: int, paper_id: int) -> Set[int]:
+        if not self.count(subscriber_id, paper_id):
+            return set()
+        return {key & _ISSUE_MASK for key in self._subscriber_keys[subscriber_id] if key >> _ISSUE_BITS == paper_id}
+
+    def total(self, subscriber_id: int) -> int:
+        return len(self._keys_of(subscriber_id) or ())
+
+    def deliveries_of(self, subscriber_id: int) -> Iterator[Tuple[int, int]]:
+        # (paper_id, issue_id) pairs, in delivery order
+        return (unpack_key(key) for key in self._keys_of(subscriber_id) or ())
+
+    def rows_of(self, paper_id: int) -> array:
+        # Row offsets of the deliveries of the paper, which may include deleted rows
+        return self._paper_rows.get(paper_id, array('q'))
+
+    def subscribers_of(self, paper_id: int) -> Set[int]:
+        # IDs of the subscribers which got at least one issue of the newspaper
+        subscriber_ids = self.subscriber_ids
+        return {subscriber_ids[row] for row in self._paper_rows.get(paper_id, ())
+                if subscriber_ids[row] != _DELETED}
+
+    def remove(self, subscriber_id: int, paper_id: int, issue_id: int) -> bool:
+        keys = self._keys_of(subscriber_id)
+        key = pack_key(paper_id, issue_id)
+        if keys is None or key not in keys:
+            return False
+        position = keys.index(key)
+        row = self._subscriber_rows[subscriber_id][position]
+        del keys[position]
+        del self._subscriber_rows[subscriber_id][position]
+        self._delete_row(row)
+        self._decrement(subscriber_id, paper_id)
+        if self.on_remove is not None:
+            self.on_remove(subscriber_id, paper_id, issue_id)
+        return True
+
+    def remove_subscriber(self, subscriber_id: int) -> int:
+        # The per-paper offsets of the deleted rows are skipped when read and dropped on compaction
+        self._keys_of(subscriber_id)
+        self._subscriber_keys.pop(subscriber_id, None)
+        self._counts.pop(subscriber_id, None)
+        rows = self._subscriber_rows.pop(subscriber_id, ())
+        for row in rows:
+            self._delete_row(row)
+        self._maybe_compact()
+        return len(rows)
+
+    def remove_paper(self, paper_id: int) -> int:
+        # Time is linear in the deliveries of this paper, plus the deliveries of the subscribers that got them
+        rows = np.frombuffer(self._paper_rows.pop(paper_id, array('q')), dtype=np.int64)
+        # A writable view on the column, the rows are marked deleted in one step
+        subscriber_column = np.frombuffer(self.subscriber_ids, dtype=np.int64)
+        subscriber_ids = subscriber_column[rows]
+        live = subscriber_ids != _DELETED
+        subscriber_column[rows[live]] = _DELETED
+        del subscriber_column
+        affected = set(subscriber_ids[live].tolist())
+        removed = int(np.count_nonzero(live))
+        self.deleted_rows += removed
+
+        for subscriber_id in affected:
+            keys = self._keys_of(subscriber_id)
+            offsets = self._subscriber_rows[subscriber_id]
+            kept = [i for i, key in enumerate(keys) if key >> _ISSUE_BITS != paper_id]
+            self._subscriber_keys[subscriber_id] = array('q', (keys[i] for i in kept))
+            self._subscriber_rows[subscriber_id] = array('q', (offsets[i] for i in kept))
+            self._counts[subscriber_id].pop(paper_id, None)
+
+        self._maybe_compact()
+        return removed
+
+    def _delete_row(self, row: int):
+        self.subscriber_ids[row] = _DELETED
+        self.deleted_rows += 1
+
+    def _decrement(self, subscriber_id: int, paper_id: int):
+        counts = self._counts[subscriber_id]
+        counts[paper_id] -= 1
+        if not counts[paper_id]:
+            del counts[paper_id]
+
+    def _maybe_compact(self):
+        if self.deleted_rows > 1024 and self.deleted_rows * 2 > len(self.subscriber_ids):
+            self.compact()
+
+    def compact(self):
+        # Drop the deleted rows and rebuild all offsets
+        live = np.frombuffer(self.subscriber_ids, dtype=np.int64) != _DELETED
+        # Old row -> new row, -1 for the deleted ones
+        remap = np.where(live, np.cumsum(live) - 1, -1)
+        self.subscriber_ids = _kept(self.subscriber_ids, live)
+        self.paper_ids = _kept(self.paper_ids, live)
+        self.issue_ids = _kept(self.issue_ids, live)
+        self.timestamps = _kept(self.timestamps, live)
+        for subscriber_id, rows in self._subscriber_rows.items():
+            self._subscriber_rows[subscriber_id] = array('q', remap[np.frombuffer(rows, dtype=np.int64)].tobytes())
+        if self._lazy is not None:
+            # Only the rows of subscribers with indexes can be deleted, a subscriber's indexes are built first
+            self._lazy.rows = remap[self._lazy.rows]
+        for paper_id, rows in list(self._paper_rows.items()):
+            rows = remap[np.frombuffer(rows, dtype=np.int64)]
+            rows = rows[rows >= 0]
+            if len(rows):
+                self._paper_rows[paper_id] = array('q', rows.tobytes())
+            else:
+                del self._paper_rows[paper_id]
+        self.deleted_rows = 0
+
+    def __len__(self) -> int:
+        return len(self.subscriber_ids) - self.deleted_rows
+
+    def nbytes(self) -> int:
+        # Approximate memory used by the ledger, including the index dicts
+        total = sum(column.buffer_info()[1] * column.itemsize
+                    for column in (self.subscriber_ids, self.paper_ids, self.issue_ids, self.timestamps))
+        for index in (self._subscriber_keys, self._subscriber_rows, self._paper_rows):
+            total += sys.getsizeof(index) + sum(sys.getsizeof(arr) for arr in index.values())
+        total += sys.getsizeof(self._counts) + sum(sys.getsizeof(counts) for counts in self._counts.values())
+        if self._lazy is not None:
+            total += self._lazy.nbytes()
+        return total
+
+    def bytes_per_delivery(self) -> float:
+        return self.nbytes() / len(self) if len(self) else 0.0
+
+
+def _kept(column: array, live: np.ndarray) -> array:
+    # The rows of a column where live is True
+    values = np.frombuffer(column, dtype=np.float64 if column.typecode == 'd' else np.int64)
+    return array(column.typecode, values[live].tobytes())
+
+
+class _LazyIndex(object):
+    """
+    The keys and row offsets of loaded rows, grouped by subscriber, for the subscribers whose indexes were not built.
+
+    The subscriber IDs are sorted, so a subscriber's group is found with a binary search. A group is handed out once.
+    """
+
+    def __init__(self, subscriber_ids: np.ndarray, bounds: np.ndarray, keys: np.ndarray, rows: np.ndarray):
+        self.subscriber_ids = subscriber_ids
+        # The group of the n-th subscriber is keys[bounds[n]:bounds[n + 1]]
+        self.bounds = bounds
+        self.keys = keys
+        self.rows = rows
+        self.pending = np.ones(len(subscriber_ids), dtype=np.bool_)
+        self.remaining = len(subscriber_ids)
+
+    def take(self, subscriber_id: int) -> Optional[Tuple[array, array]]:
+        # The keys and rows of the subscriber, or None if the subscriber has none or they were taken already
+        position = int(self.subscriber_ids.searchsorted(subscriber_id))
+        if (position == len(self.subscriber_ids) or self.subscriber_ids[position] != subscriber_id
+                or not self.pending[position]):
+            return None
+        self.pending[position] = False
+        self.remaining -= 1
+        start, end = self.bounds[position:position + 2].tolist()
+        return array('q', self.keys[start:end].tobytes()), array('q', self.rows[start:end].tobytes())
+
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in (self.subscriber_ids, self.bounds, self.keys, self.rows, self.pending))
+
+
+class DeliveredIssues(object):
+    """
+    The issues delivered to one subscriber, as a list-like view over a DeliveryLedger.
+
+    Until the subscriber is added to an agency, the view uses a ledger of its own. Once attached, the deliveries are
+    moved to the agency's ledger and Issue objects are resolved through the agency.
+    """
+
+    __slots__ = ('subscriber', '_ledger', '_resolve', '_issues')
+
+    def __init__(self, subscriber):
+        self.subscriber = subscriber
+        # Created on first use, most subscribers are attached to an agency before anything is delivered
+        self._ledger: Optional[DeliveryLedger] = None
+        self._resolve: Optional[Callable[[int, int], Optional[Issue]]] = None
+        # Issue objects of an unattached subscriber, so iteration still works
+        self._issues: Optional[Dict[Tuple[int, int], Issue]] = None
+
+    @property
+    def ledger(self) -> DeliveryLedger:
+        if self._ledger is None:
+            self._ledger = DeliveryLedger()
+        return self._ledger
+
+    def attach(self, ledger: DeliveryLedger, resolve: Callable[[int, int], Optional[Issue]]):
+        if self._ledger is not None:
+            subscriber_id = self.subscriber.subscriber_id
+            for paper_id, issue_id in self._ledger.deliveries_of(subscriber_id):
+                ledger.record(subscriber_id, paper_id, issue_id)
+        self._ledger = ledger
+        self._resolve = resolve
+        self._issues = None
+
+    def detach(self):
+        self._ledger = None
+        self._resolve = None
+
+    def append(self, issue: Issue):
+        paper_id = self._paper_id(issue)
+        self.ledger.record(self.subscriber.subscriber_id, paper_id, issue.issue_id)
+        if self._resolve is None:
+            if self._issues is None:
+                self._issues = {}
+            self._issues[(paper_id, issue.issue_id)] = issue
+
+    def remove(self, issue: Issue):
+        if issue not in self:
+            raise ValueError(f"Issue {issue.issue_id} was not delivered to this subscriber")
+        self.ledger.remove(self.subscriber.subscriber_id, issue.paper_id, issue.issue_id)
+
+    @staticmethod
+    def _paper_id(issue: Issue) -> int:
+        if issue.paper_id is None:
+            raise ValueError(f"Issue with ID {issue.issue_id} does not belong to a newspaper!")
+        return issue.paper_id
+
+    def _lookup(self, paper_id: int, issue_id: int) -> Optional[Issue]:
+        if self._resolve is not None:
+            return self._resolve(paper_id, issue_id)
+        return (self._issues or {}).get((paper_id, issue_id))
+
+    def __contains__(self, issue) -> bool:
+        paper_id = getattr(issue, 'paper_id', None)
+        if paper_id is None:
+            return False
+        return (self.ledger.delivered(self.subscriber.subscriber_id, paper_id, issue.issue_id)
+                and self._lookup(paper_id, issue.issue_id) is issue)
+
+    def __iter__(self) -> Iterator[Issue]:
+        for paper_id, issue_id in self.ledger.deliveries_of(self.subscriber.subscriber_id):
+            issue = self._lookup(paper_id, issue_id)
+            if issue is not None:
+                yield issue
+
+    def __len__(self) -> int:
+        return self.ledger.total(self.subscriber.subscriber_id)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (DeliveredIssues, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"DeliveredIssues({list(self)!r})"
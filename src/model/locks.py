@@ -0,0 +1,88 @@
+import threading
+
+
+class ReadWriteLock(object):
+    """
+    Many readers at a time, or one writer.
+
+    Writers are preferred: once a writer waits, new readers wait too, so a steady stream of reads can't starve the
+    writes. Both sides are reentrant and the writer may read as well. A reader can't become a writer, that would
+    deadlock with a second reader doing the same, so it raises instead.
+
+    Use the sides as context managers: `with lock.read:` and `with lock.write:`.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        # Per thread: how deep it is in read sections, and whether it counts as a reader
+        self._local = threading.local()
+        self.read = _Side(self.acquire_read, self.release_read)
+        self.write = _Side(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth == 0:
+            me = threading.get_ident()
+            with self._cond:
+                if self._writer == me:
+                    local.counted = False
+                else:
+                    while self._writer is not None or self._waiting_writers:
+                        self._cond.wait()
+                    self._readers += 1
+                    local.counted = True
+        local.depth = depth + 1
+
+    def release_read(self):
+        local = self._local
+        local.depth -= 1
+        if local.depth == 0 and local.counted:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, 'depth', 0):
+                raise RuntimeError("A read lock can't be upgraded to a write lock!")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class _Side(object):
+    # One side of a ReadWriteLock as a context manager
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
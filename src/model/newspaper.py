@@ -1,11 +1,14 @@
-from typing import List
-
-from flask_restx import Model
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional
 
+from .allocator import ISSUE, IdAllocator, IdService
 from .issue import Issue
+from .registry import Registry
 
 
 class Newspaper(object):
+    __slots__ = ('paper_id', 'name', 'frequency', 'price', 'issues', 'issue_ids', '_release_watchers', '_on_release',
+                 '_assign_watchers', '_on_assign')
 
     # CONSTRUCTOR
     def __init__(self, paper_id: int, name: str, frequency: int, price: float):
@@ -14,7 +17,63 @@ class Newspaper(object):
         self.frequency: int = frequency  # the issue frequency (in days)
         self.price: float = price  # the monthly price
         # This is expected to take a list of Issues as an argument.
-        # Each element is an instance of the 'Issue' class.
-        self.issues: List[Issue] = []
+        # Each element is an instance of the 'Issue' class, indexed by its issue_id.
+        self.issues: Registry[Issue] = Registry(attrgetter('issue_id'))
+        # Issue IDs are unique per newspaper
+        self.issue_ids = IdAllocator(*IdService.DEFAULT_RANGES[ISSUE])
+        self.issues.watch(self, self._issue_added, self._issue_removed)
+        # Owner -> callback, called with (newspaper, issue) whenever one of the issues is released
+        self._release_watchers: Dict[int, Callable[['Newspaper', Issue], None]] = {}
+        # Owner -> callback, called with (newspaper, issue) whenever the editor of one of the issues changes
+        self._assign_watchers: Dict[int, Callable[['Newspaper', Issue], None]] = {}
+        # Bound once and shared by all issues of the paper
+        self._on_release = self._issue_released
+        self._on_assign = self._issue_assigned
+
+    def watch_releases(self, owner, on_release: Callable[['Newspaper', Issue], None]):
+        self._release_watchers[id(owner)] = on_release
+
+    def unwatch_releases(self, owner):
+        self._release_watchers.pop(id(owner), None)
+
+    def watch_assignments(self, owner, on_assign: Callable[['Newspaper', Issue], None]):
+        self._assign_watchers[id(owner)] = on_assign
+
+    def unwatch_assignments(self, owner):
+        self._assign_watchers.pop(id(owner), None)
+
+    def get_issue(self, issue_id: int) -> Optional[Issue]:
+        return self.issues.get(issue_id)
+
+    def _issue_added(self, issue: Issue):
+        # Let the issue know which newspaper it belongs to
+        issue.paper_id = self.paper_id
+        issue.on_release = self._on_release
+        issue.on_assign = self._on_assign
+
+    def _issue_removed(self, issue: Issue):
+        issue.paper_id = None
+        issue.on_release = None
+        issue.on_assign = None
+
+    def _issue_released(self, issue: Issue):
+        for on_release in list(self._release_watchers.values()):
+            on_release(self, issue)
+
+    def _issue_assigned(self, issue: Issue):
+        for on_assign in list(self._assign_watchers.values()):
+            on_assign(self, issue)
+
+    def next_issue_id(self) -> int:
+        try:
+            return self.issue_ids.allocate(self.issues.has_key)
+        except ValueError:
+            raise ValueError(f"The newspaper with ID {self.paper_id} has no issue IDs left!") from None
+
+    def next_issue_ids(self, count: int) -> List[int]:
+        try:
+            return self.issue_ids.allocate_block(count, self.issues.has_key)
+        except ValueError:
+            raise ValueError(f"The newspaper with ID {self.paper_id} has not enough issue IDs left!") from None
 
 # TODO: Model ? -> JSON
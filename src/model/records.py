@@ -0,0 +1,54 @@
+from typing import Callable, Optional
+
+from .editor import Editor
+from .issue import Issue
+from .newspaper import Newspaper
+from .subscriber import Subscriber
+
+# Plain dicts of the entities, as they are written to disk. References to other entities are stored as IDs.
+
+
+def issue_record(issue: Issue) -> dict:
+    return {"issue_id": issue.issue_id, "release_date": issue.release_date, "number_of_pages": issue.number_of_pages,
+            "released": issue.released, "editor_id": issue.editor_id}
+
+
+def issue_from_record(record: dict) -> Issue:
+    return Issue(**record)
+
+
+def newspaper_record(paper: Newspaper) -> dict:
+    return {"paper_id": paper.paper_id, "name": paper.name, "frequency": paper.frequency, "price": paper.price,
+            "issues": [issue_record(issue) for issue in paper.issues]}
+
+
+def newspaper_from_record(record: dict) -> Newspaper:
+    paper = Newspaper(paper_id=record["paper_id"], name=record["name"], frequency=record["frequency"],
+                      price=record["price"])
+    paper.issues.extend(issue_from_record(issue) for issue in record.get("issues", ()))
+    return paper
+
+
+def editor_record(editor: Editor) -> dict:
+    return {"editor_id": editor.editor_id, "editor_name": editor.editor_name, "address": editor.address,
+            "newspapers": [paper.paper_id for paper in editor.newspapers],
+            "issues": [[issue.paper_id, issue.issue_id] for issue in editor.issues]}
+
+
+def editor_from_record(record: dict, get_newspaper: Callable[[int], Optional[Newspaper]],
+                       get_issue: Callable[[int, int], Optional[Issue]]) -> Editor:
+    editor = Editor(editor_id=record["editor_id"], editor_name=record["editor_name"], address=record["address"])
+    editor.newspapers = [get_newspaper(paper_id) for paper_id in record.get("newspapers", ())]
+    editor.issues = [get_issue(paper_id, issue_id) for paper_id, issue_id in record.get("issues", ())]
+    return editor
+
+
+def subscriber_record(sub: Subscriber) -> dict:
+    return {"subscriber_id": sub.subscriber_id, "name": sub.subscriber_name, "address": sub.subscriber_address,
+            "subscriptions": list(sub.subscriptions)}
+
+
+def subscriber_from_record(record: dict) -> Subscriber:
+    sub = Subscriber(subscriber_id=record["subscriber_id"], name=record["name"], address=record["address"])
+    sub.subscriptions.extend(record.get("subscriptions", ()))
+    return sub
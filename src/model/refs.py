@@ -0,0 +1,238 @@
+from array import array
+from typing import Callable, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .ledger import pack_key, unpack_key
+
+T = TypeVar('T')
+
+
+class IdList(object):
+    """
+    The IDs of related entities, e.g. the newspapers a subscriber subscribed to, in insertion order.
+
+    The IDs are kept in an array('q'), 8 bytes each, which is cheap for the short lists of millions of entities. Lookups
+    are linear in the length. Watchers are called with (owner, ID) on every change, so an owner can hand the same bound
+    methods to all lists instead of a closure per list.
+    """
+    __slots__ = ('owner', '_ids', '_watchers')
+
+    def __init__(self, owner, ids: Iterable[int] = ()):
+        self.owner = owner
+        self._ids = array('q')
+        # ((id(watcher), on_add, on_remove), ...)
+        self._watchers: Tuple[Tuple[int, Optional[Callable], Optional[Callable]], ...] = ()
+        self.extend(ids)
+
+    def watch(self, watcher, on_add: Optional[Callable[[object, int], None]] = None,
+              on_remove: Optional[Callable[[object, int], None]] = None):
+        self.unwatch(watcher)
+        self._watchers += ((id(watcher), on_add, on_remove),)
+
+    def unwatch(self, watcher):
+        self._watchers = tuple(entry for entry in self._watchers if entry[0] != id(watcher))
+
+    @property
+    def ids(self) -> array:
+        return self._ids
+
+    def keys(self) -> List[int]:
+        return self._ids.tolist()
+
+    def append(self, entity_id: int):
+        if entity_id in self._ids:
+            raise ValueError(f"An entry with ID {entity_id} already exists!")
+        self._ids.append(entity_id)
+        for _, on_add, _ in self._watchers:
+            if on_add is not None:
+                on_add(self.owner, entity_id)
+
+    def extend(self, entity_ids: Iterable[int]):
+        for entity_id in entity_ids:
+            self.append(entity_id)
+
+    def remove(self, entity_id: int):
+        try:
+            self._ids.remove(entity_id)
+        except (ValueError, TypeError):
+            raise ValueError(f"{entity_id!r} is not in the list") from None
+        for _, _, on_remove in self._watchers:
+            if on_remove is not None:
+                on_remove(self.owner, entity_id)
+
+    def __contains__(self, entity_id) -> bool:
+        try:
+            return entity_id in self._ids
+        except TypeError:
+            return False
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (IdList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"IdList({self._ids.tolist()!r})"
+
+
+class References(Generic[T]):
+    """
+    A list-like collection of entities which stores only their IDs, e.g. the issues of an editor.
+
+    Once attached to the agency (see Agency._editor_added), the IDs are resolved through it while iterating. Before
+    that, and for entities the agency can't find by their ID (like an issue of no newspaper), the objects themselves
+    are kept. Like an IdList, watchers are called with (owner, ID) whenever an ID is added or removed.
+    """
+    __slots__ = ('owner', '_key', '_ids', '_resolve', '_loose', '_watchers')
+
+    def __init__(self, owner, key: Callable[[T], Optional[int]], items: Iterable[T] = ()):
+        self.owner = owner
+        self._key = key
+        self._ids = array('q')
+        self._resolve: Optional[Callable[[int], Optional[T]]] = None
+        self._loose: Optional[List[T]] = None
+        self._watchers: Tuple[Tuple[int, Optional[Callable], Optional[Callable]], ...] = ()
+        self.extend(items)
+
+    def watch(self, watcher, on_add: Optional[Callable[[object, int], None]] = None,
+              on_remove: Optional[Callable[[object, int], None]] = None):
+        self.unwatch(watcher)
+        self._watchers += ((id(watcher), on_add, on_remove),)
+
+    def unwatch(self, watcher):
+        self._watchers = tuple(entry for entry in self._watchers if entry[0] != id(watcher))
+
+    def attach(self, resolve: Callable[[int], Optional[T]]):
+        loose = self._loose or ()
+        self._resolve = resolve
+        self._loose = None
+        self.extend(loose)
+
+    def detach(self):
+        # Keep the objects, the IDs mean nothing without the agency
+        items = list(self)
+        self.remove_ids(lambda key: True)
+        self._resolve = None
+        self._loose = None
+        self.extend(items)
+
+    @property
+    def ids(self) -> array:
+        # The IDs of the resolved entities, without the loose ones
+        return self._ids
+
+    def append(self, item: T):
+        key = self._key(item)
+        if self._resolve is not None and key is not None and self._resolve(key) is item:
+            self._ids.append(key)
+            self._added(key)
+        else:
+            if self._loose is None:
+                self._loose = []
+            self._loose.append(item)
+
+    def extend(self, items: Iterable[T]):
+        for item in items:
+            self.append(item)
+
+    def extend_ids(self, ids: Iterable[int]):
+        # Append IDs the caller resolved already, without checking them again
+        for key in ids:
+            self._ids.append(key)
+            self._added(key)
+
+    def replace(self, items: Iterable[T]):
+        items = list(items)
+        self.remove_ids(lambda key: True)
+        self._loose = None
+        self.extend(items)
+
+    def remove(self, item: T):
+        key = self._key(item)
+        if key is not None and self._resolve is not None and key in self._ids and self._resolve(key) is item:
+            self._ids.remove(key)
+            self._removed(key)
+        elif self._loose is not None and item in self._loose:
+            self._loose.remove(item)
+        else:
+            raise ValueError(f"{item!r} is not in the list")
+
+    def remove_ids(self, select: Callable[[int], bool]) -> int:
+        # Drop every ID select is true for in one pass, returns how many were dropped
+        kept = array('q')
+        dropped = array('q')
+        for key in self._ids:
+            (dropped if select(key) else kept).append(key)
+        self._ids = kept
+        for key in dropped:
+            self._removed(key)
+        return len(dropped)
+
+    def _added(self, key: int):
+        for _, on_add, _ in self._watchers:
+            if on_add is not None:
+                on_add(self.owner, key)
+
+    def _removed(self, key: int):
+        for _, _, on_remove in self._watchers:
+            if on_remove is not None:
+                on_remove(self.owner, key)
+
+    def __contains__(self, item) -> bool:
+        key = self._key(item)
+        if key is not None and self._resolve is not None and key in self._ids and self._resolve(key) is item:
+            return True
+        return self._loose is not None and item in self._loose
+
+    def __iter__(self) -> Iterator[T]:
+        if self._resolve is not None:
+            for key in self._ids:
+                item = self._resolve(key)
+                if item is not None:
+                    yield item
+        if self._loose is not None:
+            yield from self._loose
+
+    def __len__(self) -> int:
+        return len(self._ids) + (len(self._loose) if self._loose is not None else 0)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (References, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"References({list(self)!r})"
+
+
+def paper_key(paper) -> Optional[int]:
+    paper_id = getattr(paper, 'paper_id', None)
+    return paper_id if isinstance(paper_id, int) else None
+
+
+def issue_key(issue) -> Optional[int]:
+    # Issue IDs are unique per newspaper only, so the key packs both IDs into one integer
+    paper_id = getattr(issue, 'paper_id', None)
+    if paper_id is None:
+        return None
+    return pack_key(paper_id, issue.issue_id)
+
+
+# Resolving IDs through the agency
+def resolve_newspapers(agency, paper_ids: Iterable[int]) -> list:
+    return [paper for paper in map(agency.newspapers.get, paper_ids) if paper is not None]
+
+
+def resolve_issues(agency, keys: Iterable[int]) -> list:
+    # keys as made by issue_key
+    issues = (agency.get_issue(*unpack_key(key)) for key in keys)
+    return [issue for issue in issues if issue is not None]
+
+
+def resolve_subscribers(agency, subscriber_ids: Iterable[int]) -> list:
+    return [sub for sub in map(agency.subscribers.get, subscriber_ids) if sub is not None]
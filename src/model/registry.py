@@ -0,0 +1,247 @@
+import threading
+from itertools import islice
+from typing import Callable, Dict, Generic, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class Cursor(NamedTuple):
+    """Where a page ended: the key of its last entity, and that entity's rank as a fallback if it gets removed."""
+    key: Hashable
+    rank: int
+
+
+class Registry(Generic[T]):
+    """
+    An insertion-ordered collection of entities which keeps a dict index on their ID.
+
+    It behaves like the plain lists the Agency used before (append, extend, remove, len, in, iteration), but looking up
+    an entity by its ID, checking membership and removing an entity are all O(1).
+
+    Entities can also be loaded lazily (see extend_lazy): only their keys are registered, each entity is created by the
+    loader the first time it is looked up or iterated over.
+    """
+
+    def __init__(self, key: Callable[[T], Hashable], items: Iterable[T] = ()):
+        self.key = key
+        # A dict keeps the insertion order, so it is both the index and the ordered storage
+        self._items: Dict[Hashable, T] = {}
+        # Insertion rank of every key, and the keys by rank. Removed keys leave a hole in the order, so the ranks of
+        # the others stay put and paging can resume at a rank in O(1). None after a lazy load, until a rank is needed.
+        self._ranks: Optional[Dict[Hashable, int]] = {}
+        self._order: List[Hashable] = []
+        self._holes = 0
+        # Owner -> (on_add, on_remove) callbacks
+        self._watchers: Dict[object, Tuple[Optional[Callable[[T], None]], Optional[Callable[[T], None]]]] = {}
+        # Creates a lazily loaded entity from its key, None once all of them were created. Owner -> callback called
+        # with every entity the loader created.
+        self.loader: Optional[Callable[[Hashable], T]] = None
+        self._pending = 0
+        self._load_watchers: Dict[object, Callable[[T], None]] = {}
+        self._load_lock = threading.Lock()
+        self.extend(items)
+
+    def watch(self, owner, on_add: Optional[Callable[[T], None]] = None,
+              on_remove: Optional[Callable[[T], None]] = None):
+        # Let an owner (e.g. the Agency) keep its own indexes up to date, whoever changes the registry
+        self._watchers[id(owner)] = (on_add, on_remove)
+
+    def watch_loads(self, owner, on_load: Callable[[T], None]):
+        # Let an owner set up a lazily loaded entity once it is created, its indexes already include the entity
+        self._load_watchers[id(owner)] = on_load
+
+    def unwatch(self, owner):
+        self._watchers.pop(id(owner), None)
+        self._load_watchers.pop(id(owner), None)
+
+    def get(self, key: Hashable) -> Optional[T]:
+        try:
+            item = self._items.get(key)
+        except TypeError:
+            # Unhashable keys can never match an ID
+            return None
+        if item is _PENDING:
+            item = self._load(key)
+        return item
+
+    def has_key(self, key: Hashable) -> bool:
+        # Doesn't create a lazily loaded entity
+        try:
+            return key in self._items
+        except TypeError:
+            return False
+
+    def pending(self, key: Hashable) -> bool:
+        # Whether the entity was loaded lazily and hasn't been created yet
+        return self._items.get(key) is _PENDING
+
+    def rank(self, key: Hashable) -> int:
+        return self._rank_index()[key]
+
+    def keys(self) -> List[Hashable]:
+        return list(self._items.keys())
+
+    def append(self, item: T, notify: bool = True):
+        # Without notify the watchers are not called, the caller has to bring their indexes up to date
+        key = self.key(item)
+        if key in self._items:
+            raise ValueError(f"An entry with ID {key} already exists!")
+        self._items[key] = item
+        if self._ranks is not None:
+            self._ranks[key] = len(self._order)
+        self._order.append(key)
+        if notify:
+            for on_add, _ in list(self._watchers.values()):
+                if on_add is not None:
+                    on_add(item)
+
+    def extend(self, items: Iterable[T], notify: bool = True):
+        for item in items:
+            self.append(item, notify)
+
+    def extend_lazy(self, keys: List[Hashable], loader: Callable[[Hashable], T]):
+        # Register the entities with the given keys, loader(key) creates each of them on first use. The watchers are
+        # not called, the caller has to bring their indexes up to date. Only one loader can be pending at a time.
+        if not keys:
+            return
+        if self.loader is not None:
+            raise ValueError("The lazily loaded entries of the registry have not all been created yet!")
+        added = dict.fromkeys(keys, _PENDING)
+        if len(added) != len(keys) or not self._items.keys().isdisjoint(added):
+            raise ValueError("The keys of the entries have to be unique!")
+        if self._items:
+            self._items.update(added)
+        else:
+            # Usually the registry is empty (e.g. loading a snapshot), the new dict is used as it is
+            self._items = added
+        self._order.extend(keys)
+        self._ranks = None
+        self._pending = len(keys)
+        self.loader = loader
+
+    def _load(self, key: Hashable) -> T:
+        # Create a lazily loaded entity. Readers may look up the same entity concurrently, only one of them creates it.
+        with self._load_lock:
+            item = self._items[key]
+            if item is not _PENDING:
+                return item
+            item = self._items[key] = self.loader(key)
+            self._pending -= 1
+            if not self._pending:
+                self.loader = None
+            for on_load in list(self._load_watchers.values()):
+                on_load(item)
+            return item
+
+    def _loaded(self) -> Iterator[T]:
+        # All entities in their order, the lazily loaded ones are created on the way
+        for key, item in self._items.items():
+            yield self._load(key) if item is _PENDING else item
+
+    def remove(self, item: T):
+        key = self._key_of(item)
+        if key is None or not self._matches(key, item):
+            raise ValueError(f"{item!r} is not in the registry")
+        item = self._items.pop(key)
+        self._order[self._rank_index().pop(key)] = _MISSING
+        self._holes += 1
+        if self._holes > 1024 and self._holes * 2 > len(self._order):
+            self._compact()
+        self._notify_removed(item)
+
+    def _compact(self):
+        # Close the holes in the order, the relative order of the ranks is kept
+        self._order = list(self._items.keys())
+        self._ranks = {key: rank for rank, key in enumerate(self._order)}
+        self._holes = 0
+
+    def _rank_index(self) -> Dict[Hashable, int]:
+        ranks = self._ranks
+        if ranks is None:
+            ranks = self._ranks = {key: rank for rank, key in enumerate(self._order) if key is not _MISSING}
+        return ranks
+
+    def page(self, after: Optional[Cursor], limit: int) -> Tuple[List[T], Optional[Cursor]]:
+        # Up to limit entities following the cursor, and the cursor of the next page (None on the last page)
+        if after is None:
+            start = 0
+        else:
+            # Resume after the last entity of the previous page, or at its old rank if it was removed meanwhile
+            start = self._rank_index().get(after.key, after.rank) + 1
+        items = []
+        last_rank = None
+        for rank in range(max(start, 0), len(self._order)):
+            key = self._order[rank]
+            if key is _MISSING:
+                continue
+            if len(items) == limit:
+                last = self.key(items[-1])
+                return items, Cursor(last, last_rank)
+            items.append(self.get(key))
+            last_rank = rank
+        return items, None
+
+    def clear(self):
+        items = list(self._loaded()) if self._watchers else []
+        self._items.clear()
+        self._ranks = {}
+        self._order.clear()
+        self._holes = 0
+        self._pending = 0
+        self.loader = None
+        for item in items:
+            self._notify_removed(item)
+
+    def _notify_removed(self, item: T):
+        for _, on_remove in list(self._watchers.values()):
+            if on_remove is not None:
+                on_remove(item)
+
+    def _key_of(self, item) -> Optional[Hashable]:
+        try:
+            key = self.key(item)
+            hash(key)
+        except (AttributeError, TypeError):
+            return None
+        return key
+
+    def _matches(self, key: Hashable, item) -> bool:
+        stored = self._items.get(key, _MISSING)
+        if stored is _PENDING:
+            stored = self._load(key)
+        return stored is item or (stored is not _MISSING and stored == item)
+
+    def __contains__(self, item) -> bool:
+        key = self._key_of(item)
+        return key is not None and self._matches(key, item)
+
+    def __iter__(self) -> Iterator[T]:
+        return self._loaded() if self.loader is not None else iter(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __getitem__(self, position):
+        # Positional access is kept for compatibility with the old lists, it is O(position)
+        if isinstance(position, slice) or position < 0:
+            return list(self)[position]
+        try:
+            return next(islice(iter(self), position, None))
+        except StopIteration:
+            raise IndexError("registry index out of range") from None
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Registry, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Registry({list(self)!r})"
+
+
+_MISSING = object()
+# Marks the entities which were loaded lazily and have not been created yet
+_PENDING = object()
@@ -0,0 +1,61 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+class MissingBlock(NamedTuple):
+    """The missing deliveries of one newspaper: subscriber_ids[i] did not get issue_ids[i]."""
+    paper_id: int
+    subscriber_ids: np.ndarray
+    issue_ids: np.ndarray
+
+
+# Cells of the subscriber x issue matrix per block, bounds the memory of a paper with many readers and issues
+BLOCK_CELLS = 1 << 24
+
+
+def missing_block(paper) -> Optional[MissingBlock]:
+    """
+    Find every released issue of a newspaper which was not delivered to one of its subscribers.
+
+    The paper is a PaperVersion (see versions.py), so this needs no lock. A subscriber x released-issue boolean matrix
+    starts out all True and the deliveries are cleared from it in one vectorized step. The matrix is built for blocks
+    of subscribers of at most BLOCK_CELLS cells, so it takes 16 MB at most however large the paper is.
+    """
+    issues = paper.issue_ids
+    subscribers = paper.subscriber_ids
+    if not len(issues) or not len(subscribers):
+        return None
+
+    issue_order = np.argsort(issues)
+    sorted_issues = issues[issue_order]
+
+    delivered_to = paper.delivered_to
+    delivered_issues = paper.delivered_issues
+    if len(delivered_to):
+        # Map the delivered IDs to matrix positions, dropping unknown IDs, ordered by row for the blocks
+        sub_pos = np.searchsorted(subscribers, delivered_to).clip(max=len(subscribers) - 1)
+        issue_pos = np.searchsorted(sorted_issues, delivered_issues).clip(max=len(issues) - 1)
+        valid = (subscribers[sub_pos] == delivered_to) & (sorted_issues[issue_pos] == delivered_issues)
+        rows = sub_pos[valid]
+        row_order = np.argsort(rows)
+        rows = rows[row_order]
+        columns = issue_order[issue_pos[valid][row_order]]
+    else:
+        rows = columns = np.empty(0, dtype=np.int64)
+
+    block_rows = max(1, BLOCK_CELLS // len(issues))
+    missing_subs, missing_issues = [], []
+    for first in range(0, len(subscribers), block_rows):
+        last = min(first + block_rows, len(subscribers))
+        missing = np.ones((last - first, len(issues)), dtype=bool)
+        start, end = np.searchsorted(rows, (first, last))
+        missing[rows[start:end] - first, columns[start:end]] = False
+        sub_index, issue_index = np.nonzero(missing)
+        if len(sub_index):
+            missing_subs.append(subscribers[first + sub_index])
+            missing_issues.append(issues[issue_index])
+
+    if not missing_subs:
+        return None
+    return MissingBlock(paper.paper_id, np.concatenate(missing_subs), np.concatenate(missing_issues))
@@ -0,0 +1,255 @@
+import heapq
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .issue import Issue
+from .newspaper import Newspaper
+
+# Release dates are days (dd.mm.yyyy), optionally with a time of day
+RELEASE_DATE_FORMATS = ("%d.%m.%Y", "%d.%m.%Y %H:%M")
+
+
+@lru_cache(maxsize=4096)
+def parse_release_date(release_date: str) -> Optional[float]:
+    # The release date as a timestamp in local time, or None if it can't be parsed. Most issues share a handful of
+    # dates, so the results are cached.
+    if not isinstance(release_date, str):
+        return None
+    for date_format in RELEASE_DATE_FORMATS:
+        try:
+            return datetime.strptime(release_date.strip(), date_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class ReleaseScheduler(object):
+    """
+    Releases the issues of the agency once their release date has come.
+
+    The unreleased issues are kept in a heap ordered on their release time. A background thread sleeps until the
+    first of them is due, so nothing is polled, then releases everything that is due with one call to
+    Agency.release_issues: a burst of thousands of issues due at midnight costs one commit. If that call fails, the
+    issues are tried again after RETRY_DELAY seconds. The agency's watchers keep the heap up to date, entries of issues
+    which were released by hand or removed are dropped lazily. The release date of an issue is read once, when it is
+    added: nothing in the agency changes it later, and an issue whose date is set directly keeps its old entry.
+
+    With a job queue, the delivery of every released issue to the subscribers of its newspaper is enqueued as well.
+    """
+
+    # The wall clock may be set while sleeping, so a far away release time is checked again this often (in seconds)
+    MAX_WAIT = 60.0
+    # Lags of this many of the latest releases are kept for the percentiles
+    LAG_WINDOW = 10000
+    # Issues whose release failed are tried again after this many seconds
+    RETRY_DELAY = 5.0
+
+    def __init__(self, agency, jobs=None, clock: Callable[[], float] = time.time):
+        self.agency = agency
+        self.jobs = jobs
+        self.clock = clock
+        # (due, paper_id, issue_id), and per scheduled issue its due time (to spot the stale heap entries) and the
+        # time from which it is late: the due time, or when it was scheduled if it was overdue already
+        self._heap: List[Tuple[float, int, int]] = []
+        self._due: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        # Metrics
+        self.released = 0
+        self.skipped = 0
+        self.failed = 0
+        self.deliveries = 0
+        self.unparsable = 0
+        self.overdue = 0
+        self.wakeups = 0
+        self.largest_burst = 0
+        self.max_lag = 0.0
+        self._lag_total = 0.0
+        self._lags = deque(maxlen=self.LAG_WINDOW)
+        self.last_error: Optional[str] = None
+
+        # Follow the newspapers and their issues, from now on
+        with agency.lock.write:
+            agency.newspapers.watch(self, self._newspaper_added, self._newspaper_removed)
+            for paper in agency.newspapers:
+                self._newspaper_added(paper)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="release-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        with self.agency.lock.write:
+            self.agency.newspapers.unwatch(self)
+            for paper in self.agency.newspapers:
+                paper.issues.unwatch(self)
+                paper.unwatch_releases(self)
+
+    @property
+    def pending(self) -> int:
+        return len(self._due)
+
+    def next_due(self) -> Optional[float]:
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    # Keep the heap in sync with the agency
+    def _newspaper_added(self, paper: Newspaper):
+        paper.issues.watch(self, partial(self._issue_added, paper), partial(self._issue_removed, paper))
+        paper.watch_releases(self, self._issue_released)
+        for issue in paper.issues:
+            self._issue_added(paper, issue)
+
+    def _newspaper_removed(self, paper: Newspaper):
+        paper.issues.unwatch(self)
+        paper.unwatch_releases(self)
+        for issue in paper.issues:
+            self._issue_removed(paper, issue)
+
+    def _issue_added(self, paper: Newspaper, issue: Issue):
+        if issue.released:
+            return
+        due = parse_release_date(issue.release_date)
+        if due is None:
+            self.unparsable += 1
+            return
+        entry = (due, paper.paper_id, issue.issue_id)
+        now = self.clock()
+        if due < now:
+            self.overdue += 1
+        with self._cond:
+            self._due[entry[1:]] = (due, max(due, now))
+            heapq.heappush(self._heap, entry)
+            # Only a new first entry changes how long the thread has to sleep
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def _issue_removed(self, paper: Newspaper, issue: Issue):
+        # The heap entry stays, it is dropped once it reaches the top
+        with self._cond:
+            self._due.pop((paper.paper_id, issue.issue_id), None)
+
+    def _issue_released(self, paper: Newspaper, issue: Issue):
+        with self._cond:
+            self._due.pop((paper.paper_id, issue.issue_id), None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._due.get(heap[0][1:], (None,))[0] != heap[0][0]:
+            heapq.heappop(heap)
+
+    def _take_due(self, now: float) -> List[Tuple[Tuple[int, int], float]]:
+        # Pops the entries which are due, as (key, late_from) pairs. The caller holds the condition.
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            entry = heapq.heappop(heap)
+            key = entry[1:]
+            scheduled = self._due.get(key)
+            if scheduled is not None and scheduled[0] == entry[0]:
+                del self._due[key]
+                due.append((key, scheduled[1]))
+        return due
+
+    def _retry(self, due: List[Tuple[Tuple[int, int], float]], retry_at: float):
+        with self._cond:
+            for key, late_from in due:
+                # Unless the issue was added again meanwhile
+                if key not in self._due:
+                    self._due[key] = (retry_at, late_from)
+                    heapq.heappush(self._heap, (retry_at,) + key)
+
+    def run_due(self, now: float = None) -> int:
+        # Release every issue which is due at now (by default the current time). Returns how many were released.
+        with self._cond:
+            due = self._take_due(self.clock() if now is None else now)
+        if not due:
+            return 0
+        self.largest_burst = max(self.largest_burst, len(due))
+
+        try:
+            released = self.agency.release_issues([key for key, _ in due])
+        except Exception as err:
+            self.failed += len(due)
+            self.last_error = str(err)
+            # Nothing was released, the issues are scheduled again. They stay late from when they were due.
+            self._retry(due, (self.clock() if now is None else now) + self.RETRY_DELAY)
+            return 0
+        # How late the releases are
+        finished = self.clock()
+        with self._cond:
+            for _, late_from in due:
+                lag = max(finished - late_from, 0.0)
+                self._lags.append(lag)
+                self._lag_total += lag
+                self.max_lag = max(self.max_lag, lag)
+        self.released += len(released)
+        self.skipped += len(due) - len(released)
+
+        if self.jobs is not None:
+            for issue in released:
+                try:
+                    self.jobs.submit(issue.paper_id, issue.issue_id)
+                    self.deliveries += 1
+                except ValueError as err:
+                    # The job queue has been shut down
+                    self.last_error = str(err)
+        return len(released)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    self._drop_stale()
+                    if self._heap:
+                        delay = self._heap[0][0] - self.clock()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(min(delay, self.MAX_WAIT))
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+                self.wakeups += 1
+            self.run_due()
+
+    def metrics(self):
+        with self._cond:
+            lags = sorted(self._lags)
+        count = self.released + self.skipped
+
+        def percentile(fraction: float) -> Optional[float]:
+            return lags[min(int(fraction * len(lags)), len(lags) - 1)] if lags else None
+
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": self.pending,
+            "next_due": self.next_due(),
+            "released": self.released,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "deliveries": self.deliveries,
+            "unparsable": self.unparsable,
+            "overdue": self.overdue,
+            "wakeups": self.wakeups,
+            "largest_burst": self.largest_burst,
+            # Seconds between the release time (or the scheduling of an overdue issue) and the release
+            "lag": {
+                "mean": self._lag_total / count if count else None,
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": self.max_lag if count else None
+            },
+            "last_error": self.last_error
+        }
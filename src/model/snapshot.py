@@ -0,0 +1,520 @@
+import gc
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .editor import Editor
+from .issue import Issue
+from .ledger import _DELETED
+from .newspaper import Newspaper
+from .stats import NewspaperStats
+from .subscriber import Subscriber
+
+# A snapshot file starts with the magic bytes and the length of the manifest, a JSON object which tells where each
+# column is. The columns follow, each 8-byte aligned, so they can be used in place from a memory map.
+MAGIC = b"PBSNAP\x00\x01"
+VERSION = 1
+_HEADER = struct.Struct("<8sQ")
+_ALIGNMENT = 8
+# How a missing editor of an issue is stored
+_NO_EDITOR = -1
+
+
+class SnapshotInfo(NamedTuple):
+    """What load_snapshot() restored: the lsn of the last logged mutation the snapshot includes, and the counts."""
+    lsn: int
+    newspapers: int
+    editors: int
+    subscribers: int
+    deliveries: int
+    seconds: float
+
+
+class _Columns(object):
+    # The columns of a snapshot while it is captured. Strings are stored as offsets into one text blob plus a column of
+    # null flags.
+
+    def __init__(self):
+        self.columns: Dict[str, np.ndarray] = {}
+        self._texts: List[str] = []
+        self._length = 0
+
+    def add(self, name: str, values, dtype=np.int64):
+        self.columns[name] = np.asarray(values, dtype=dtype)
+
+    def add_strings(self, name: str, values: List[Optional[str]]):
+        texts = ['' if value is None else value for value in values]
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        offsets = np.empty(len(texts) + 1, dtype=np.int64)
+        offsets[0] = self._length
+        np.cumsum(lengths, out=offsets[1:])
+        offsets[1:] += self._length
+        self._length = int(offsets[-1])
+        self._texts.extend(texts)
+        self.columns[name + ".offsets"] = offsets
+        self.columns[name + ".nulls"] = np.fromiter((value is None for value in values), dtype=np.bool_,
+                                                    count=len(values))
+
+    def add_groups(self, name: str, groups: List[List[int]]):
+        # A list of ID lists, as a flat column and the start of every group
+        lengths = np.fromiter(map(len, groups), dtype=np.int64, count=len(groups))
+        starts = np.zeros(len(groups) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=starts[1:])
+        self.columns[name + ".starts"] = starts
+        self.columns[name] = np.fromiter((value for group in groups for value in group), dtype=np.int64,
+                                         count=int(starts[-1]))
+
+    def text(self) -> np.ndarray:
+        return np.frombuffer(''.join(self._texts).encode('utf-8'), dtype=np.uint8)
+
+
+def capture(agency) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Copy the state of the agency into columns, as of one point in time.
+
+    The subscribers are copied in chunks of SUBSCRIBER_CHUNK, each under the read lock, so writers and readers carry on
+    between the chunks. The subscribers which changed meanwhile are copied again at the end, under the read lock
+    together with everything else, and the copy is consistent as of then.
+
+    Returns the manifest (lsn and ID sequences) and the columns. Writing them to disk happens outside the lock.
+    """
+    # Like loading, the copy creates millions of objects which are no garbage
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with _capturing:
+            return _capture(agency)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _capture(agency) -> Tuple[dict, Dict[str, np.ndarray]]:
+    subscribers = agency.subscribers
+    changes = _SubscriberChanges()
+    with agency.lock.read:
+        keys = subscribers.keys()
+        loader = subscribers.loader
+        agency.subscriber_changes = changes
+    try:
+        # The subscribers of a loaded snapshot which were not used since are copied from its columns, without
+        # creating them. The columns never change, they are read without the lock.
+        pending = {row[0]: row for row in loader.rows()} if loader is not None else {}
+        rows = {}
+        for start in range(0, len(keys), SUBSCRIBER_CHUNK):
+            with agency.lock.read:
+                for key in keys[start:start + SUBSCRIBER_CHUNK]:
+                    row = _current_row(subscribers, key, pending)
+                    if row is not None:
+                        rows[key] = row
+        with agency.lock.read:
+            changes.apply(rows, lambda key: _current_row(subscribers, key, pending))
+            agency.subscriber_changes = None
+            manifest, columns = _capture_rest(agency)
+    finally:
+        agency.subscriber_changes = None
+
+    rows = list(rows.values())
+    columns.add("subscribers.id", [row[0] for row in rows])
+    columns.add_strings("subscribers.name", [row[1] for row in rows])
+    columns.add_strings("subscribers.address", [row[2] for row in rows])
+    columns.add_groups("subscribers.subscriptions", [row[3] for row in rows])
+    columns.columns["text"] = columns.text()
+    return manifest, columns.columns
+
+
+def _capture_rest(agency) -> Tuple[dict, _Columns]:
+    # Everything but the subscribers, under the read lock
+    columns = _Columns()
+    papers = list(agency.newspapers)
+    columns.add("papers.id", [paper.paper_id for paper in papers])
+    columns.add_strings("papers.name", [paper.name for paper in papers])
+    columns.add("papers.frequency", [paper.frequency for paper in papers])
+    columns.add("papers.price", [paper.price for paper in papers], np.float64)
+
+    # The issues of all papers in one table, paper by paper
+    issues = [list(paper.issues) for paper in papers]
+    columns.add_groups("papers.issues", [[issue.issue_id for issue in group] for group in issues])
+    issues = [issue for group in issues for issue in group]
+    columns.add_strings("issues.release_date", [issue.release_date for issue in issues])
+    columns.add("issues.number_of_pages", [issue.number_of_pages for issue in issues])
+    columns.add("issues.released", [issue.released for issue in issues], np.bool_)
+    columns.add("issues.editor_id", [_NO_EDITOR if issue.editor_id is None else issue.editor_id for issue in issues])
+
+    editors = list(agency.editors)
+    columns.add("editors.id", [editor.editor_id for editor in editors])
+    columns.add_strings("editors.name", [editor.editor_name for editor in editors])
+    columns.add_strings("editors.address", [editor.address for editor in editors])
+    columns.add_groups("editors.newspapers", [[paper.paper_id for paper in editor.newspapers] for editor in editors])
+    # Issues which belong to no newspaper can't be restored, the editor is stored without them
+    editor_issues = [[issue for issue in editor.issues if issue.paper_id is not None] for editor in editors]
+    columns.add_groups("editors.issue_papers", [[issue.paper_id for issue in issues] for issues in editor_issues])
+    columns.add_groups("editors.issues", [[issue.issue_id for issue in issues] for issues in editor_issues])
+
+    # Only the live rows of the ledger, in their order
+    ledger = agency.deliveries
+    subscriber_column = np.frombuffer(ledger.subscriber_ids, dtype=np.int64)
+    live = subscriber_column != _DELETED
+    columns.add("deliveries.subscriber_id", subscriber_column[live])
+    columns.add("deliveries.paper_id", np.frombuffer(ledger.paper_ids, dtype=np.int64)[live])
+    columns.add("deliveries.issue_id", np.frombuffer(ledger.issue_ids, dtype=np.int64)[live])
+    columns.add("deliveries.timestamp", np.frombuffer(ledger.timestamps, dtype=np.float64)[live], np.float64)
+
+    manifest = {"version": VERSION, "lsn": agency.wal.lsn if agency.wal is not None else 0, "ids": agency.ids.state()}
+    return manifest, columns
+
+
+# How many subscribers capture() copies per hold of the read lock
+SUBSCRIBER_CHUNK = 10000
+# One capture at a time, each tracks the changes of the subscribers on the agency
+_capturing = threading.Lock()
+
+
+class _SubscriberChanges(object):
+    """
+    The subscribers which changed while capture() copies them, noted by the agency under its write lock: the IDs of
+    the changed or removed ones, and the added ones in the order they were added.
+    """
+
+    def __init__(self):
+        self.changed = set()
+        self.added = []
+
+    def note(self, subscriber_id: int, added: bool = False):
+        self.changed.add(subscriber_id)
+        if added:
+            self.added.append(subscriber_id)
+
+    def apply(self, rows: dict, current):
+        # Bring the copied rows (ID -> row, in the order of the registry) up to date, current(ID) is the row now or None
+        added = set(self.added)
+        for key in self.changed:
+            if key in added:
+                # Added ones go to the end, also if they were removed and added again
+                rows.pop(key, None)
+                continue
+            row = current(key)
+            if row is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = row
+        # The last time a subscriber was added counts
+        for key in reversed(list(dict.fromkeys(reversed(self.added)))):
+            row = current(key)
+            if row is not None:
+                rows[key] = row
+
+
+def _current_row(subscribers, key, pending: dict) -> Optional[Tuple[int, Optional[str], Optional[str], List[int]]]:
+    # The row of a subscriber as it is now, None if it was removed
+    if subscribers.pending(key):
+        return pending[key]
+    sub = subscribers.get(key)
+    return None if sub is None else _subscriber_row(sub)
+
+
+def _subscriber_row(sub: Subscriber) -> Tuple[int, Optional[str], Optional[str], List[int]]:
+    return sub.subscriber_id, sub.subscriber_name, sub.subscriber_address, sub.subscriptions.keys()
+
+
+def write_snapshot(path: str, manifest: dict, columns: Dict[str, np.ndarray]):
+    # Written to a temporary file first and renamed, so a crash never leaves a half written snapshot behind
+    layout = {}
+    offset = 0
+    for name, column in columns.items():
+        layout[name] = [column.dtype.str, offset, len(column)]
+        offset += _aligned(column.nbytes)
+    header = json.dumps(dict(manifest, columns=layout)).encode('utf-8')
+    data_start = _aligned(_HEADER.size + len(header))
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as snapshot:
+        snapshot.write(_HEADER.pack(MAGIC, len(header)))
+        snapshot.write(header)
+        snapshot.write(b'\x00' * (data_start - _HEADER.size - len(header)))
+        for column in columns.values():
+            snapshot.write(column.tobytes())
+            snapshot.write(b'\x00' * (_aligned(column.nbytes) - column.nbytes))
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary, path)
+
+
+def save_snapshot(agency, path: str) -> int:
+    """Write a snapshot of the agency to path and return its lsn."""
+    manifest, columns = capture(agency)
+    write_snapshot(path, manifest, columns)
+    return manifest["lsn"]
+
+
+def _aligned(size: int) -> int:
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def read_snapshot(path: str) -> Tuple[dict, Dict[str, np.ndarray], mmap.mmap]:
+    # The manifest and the columns, as views on a read-only memory map of the file
+    with open(path, 'rb') as snapshot:
+        mapped = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped.size() < _HEADER.size:
+        raise ValueError(f"The snapshot {path} is truncated!")
+    magic, length = _HEADER.unpack_from(mapped)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a snapshot of this version!")
+    manifest = json.loads(mapped[_HEADER.size:_HEADER.size + length])
+    data_start = _aligned(_HEADER.size + length)
+    columns = {}
+    for name, (dtype, offset, count) in manifest.pop("columns").items():
+        dtype = np.dtype(dtype)
+        if data_start + offset + count * dtype.itemsize > mapped.size():
+            raise ValueError(f"The snapshot {path} is truncated!")
+        columns[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + offset)
+    return manifest, columns, mapped
+
+
+def _strings(columns: Dict[str, np.ndarray], name: str, text: str) -> List[Optional[str]]:
+    offsets = columns[name + ".offsets"].tolist()
+    values = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+    for position in np.flatnonzero(columns[name + ".nulls"]).tolist():
+        values[position] = None
+    return values
+
+
+def _groups(columns: Dict[str, np.ndarray], name: str) -> List[List[int]]:
+    starts = columns[name + ".starts"].tolist()
+    values = columns[name].tolist()
+    return [values[start:end] for start, end in zip(starts, starts[1:])]
+
+
+def load_snapshot(path: str, agency) -> SnapshotInfo:
+    """
+    Restore an empty agency from the snapshot at path.
+
+    The columns are read from a memory map and the indexes of the agency (subscriptions per paper, statistics, the
+    delivery ledger) are built in bulk instead of entity by entity. The subscribers are loaded lazily: each is created
+    from a copy of its columns the first time it is used, together with its backlog and its part of the ledger index.
+    """
+    start = time.perf_counter()
+    if agency.newspapers or agency.editors or agency.subscribers:
+        raise ValueError("A snapshot can only be loaded into an empty agency!")
+    manifest, columns, mapped = read_snapshot(path)
+    # Millions of objects are created and none of them is garbage, the cyclic collector would only walk them again and
+    # again
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with agency.lock.write:
+            text = columns["text"].tobytes().decode('utf-8')
+            # Positions of the ID sequences first, so the newspapers pick up their issue sequences
+            agency.ids.restore(manifest["ids"])
+
+            issue_ids = _groups(columns, "papers.issues")
+            release_dates = _strings(columns, "issues.release_date", text)
+            pages = columns["issues.number_of_pages"].tolist()
+            released = columns["issues.released"].tolist()
+            issue_editors = columns["issues.editor_id"].tolist()
+            papers = []
+            row = 0
+            for paper_id, name, frequency, price, ids in zip(columns["papers.id"].tolist(),
+                                                             _strings(columns, "papers.name", text),
+                                                             columns["papers.frequency"].tolist(),
+                                                             columns["papers.price"].tolist(), issue_ids):
+                paper = Newspaper(paper_id=paper_id, name=name, frequency=frequency, price=price)
+                paper.issues.extend(Issue(issue_id=issue_id, release_date=release_dates[row + n],
+                                          number_of_pages=pages[row + n], released=released[row + n],
+                                          editor_id=None if issue_editors[row + n] == _NO_EDITOR
+                                          else issue_editors[row + n])
+                                    for n, issue_id in enumerate(ids))
+                row += len(ids)
+                papers.append(paper)
+            agency.newspapers.extend(papers)
+
+            editors = []
+            for editor_id, name, address, paper_ids, issue_papers, ids in zip(
+                    columns["editors.id"].tolist(), _strings(columns, "editors.name", text),
+                    _strings(columns, "editors.address", text), _groups(columns, "editors.newspapers"),
+                    _groups(columns, "editors.issue_papers"), _groups(columns, "editors.issues")):
+                editor = Editor(editor_id=editor_id, editor_name=name, address=address)
+                editor.newspapers = [agency.get_newspaper(paper_id) for paper_id in paper_ids]
+                editor.issues = [agency.get_issue(paper_id, issue_id) for paper_id, issue_id in zip(issue_papers, ids)]
+                editors.append(editor)
+            agency.editors.extend(editors)
+
+            # Copies of the columns, the ledger keeps appending to them
+            agency.deliveries.load(*(array(typecode, columns[f"deliveries.{name}"].tobytes())
+                                     for typecode, name in (('q', 'subscriber_id'), ('q', 'paper_id'),
+                                                            ('q', 'issue_id'), ('d', 'timestamp'))))
+            subscribers = _load_subscribers(agency, columns, text)
+
+            # The registry watchers saw the newspapers and editors only, the storage engine gets the rest directly
+            storage = agency.storage
+            with storage.batch():
+                storage.adopt_subscribers(subscribers.rows())
+                ledger = agency.deliveries
+                storage.record_deliveries(zip(ledger.subscriber_ids, ledger.paper_ids, ledger.issue_ids,
+                                              ledger.timestamps))
+                storage.save_ids(agency.ids.state())
+                storage.save_lsn(manifest["lsn"])
+    finally:
+        if collecting:
+            gc.enable()
+        del columns
+        try:
+            mapped.close()
+        except BufferError:
+            # A traceback still refers to a column, the map is closed once that is gone
+            pass
+    return SnapshotInfo(manifest["lsn"], len(agency.newspapers), len(agency.editors), len(agency.subscribers),
+                        len(agency.deliveries), time.perf_counter() - start)
+
+
+class _SubscriberColumns(object):
+    """
+    The subscribers of a snapshot, kept as copies of their columns. Used as the loader of the agency's subscriber
+    registry: calling it with an ID creates that subscriber.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], text: str):
+        # Copies, the columns are views on the memory map which is closed after loading
+        self.ids = np.array(columns["subscribers.id"])
+        # Positions of the subscribers ordered by ID, for a binary search. Usually they are in order already.
+        self._by_id = None if np.all(self.ids[1:] > self.ids[:-1]) else np.argsort(self.ids, kind='stable')
+        self._sorted_ids = self.ids if self._by_id is None else self.ids[self._by_id]
+        self._columns = {name: np.array(column) for name, column in columns.items()
+                         if name.startswith("subscribers.") and name != "subscribers.id"}
+        self._text = text
+
+    def rows(self) -> Iterator[Tuple[int, Optional[str], Optional[str], List[int]]]:
+        # (subscriber_id, name, address, subscriptions) of all subscribers, in the order of the snapshot. Nothing is
+        # read before the first row is asked for.
+        yield from zip(self.ids.tolist(), _strings(self._columns, "subscribers.name", self._text),
+                       _strings(self._columns, "subscribers.address", self._text),
+                       _groups(self._columns, "subscribers.subscriptions"))
+
+    def __call__(self, subscriber_id: int) -> Subscriber:
+        position = int(self._sorted_ids.searchsorted(subscriber_id))
+        if self._by_id is not None:
+            position = int(self._by_id[position])
+        sub = Subscriber(subscriber_id=subscriber_id, name=self._string("subscribers.name", position),
+                         address=self._string("subscribers.address", position))
+        start, end = self._columns["subscribers.subscriptions.starts"][position:position + 2].tolist()
+        sub.subscriptions.extend(self._columns["subscribers.subscriptions"][start:end].tolist())
+        return sub
+
+    def _string(self, name: str, position: int) -> Optional[str]:
+        if self._columns[name + ".nulls"][position]:
+            return None
+        start, end = self._columns[name + ".offsets"][position:position + 2].tolist()
+        return self._text[start:end]
+
+
+class _Audiences(dict):
+    """
+    The reverse subscription index of the agency (paper_id -> IDs of its subscribers) after loading a snapshot.
+
+    A paper maps to an array of the IDs until it is first looked up, then to a set of them like in any agency.
+    """
+
+    def _built(self, paper_id: int, audience):
+        if isinstance(audience, np.ndarray):
+            audience = set(audience.tolist())
+            dict.__setitem__(self, paper_id, audience)
+        return audience
+
+    def get(self, paper_id: int, default=None):
+        return self._built(paper_id, dict.get(self, paper_id, default))
+
+    def setdefault(self, paper_id: int, default=None):
+        return self._built(paper_id, dict.setdefault(self, paper_id, default))
+
+    def __getitem__(self, paper_id: int):
+        return self._built(paper_id, dict.__getitem__(self, paper_id))
+
+    def values(self):
+        return [self[paper_id] for paper_id in self]
+
+    def items(self):
+        return [(paper_id, self[paper_id]) for paper_id in self]
+
+
+def _load_subscribers(agency, columns: Dict[str, np.ndarray], text: str) -> _SubscriberColumns:
+    # The subscribers are registered by their IDs only and created on first use, without the per-subscriber callbacks
+    # of the agency which would update the indexes one subscription at a time. The indexes are built from the columns.
+    subscribers = _SubscriberColumns(columns, text)
+    subscriber_ids = subscribers.ids
+    agency.subscribers.extend_lazy(subscriber_ids.tolist(), subscribers)
+
+    # The subscribers of every paper, grouped by paper ID
+    starts = columns["subscribers.subscriptions.starts"]
+    papers = columns["subscribers.subscriptions"]
+    owners = np.repeat(subscriber_ids, np.diff(starts))
+    order = np.argsort(papers, kind='stable')
+    grouped = papers[order]
+    bounds = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]]) if len(grouped) else np.empty(0, np.int64)
+    paper_ids = grouped[bounds].tolist()
+    agency.paper_subscribers = _Audiences(zip(paper_ids, np.split(owners[order], bounds[1:])))
+    audience_sizes = dict(zip(paper_ids, np.diff(np.r_[bounds, len(grouped)]).tolist()))
+    for paper in agency.newspapers:
+        agency.paper_stats[paper.paper_id] = NewspaperStats(paper.price, audience_sizes.get(paper.paper_id, 0))
+
+    # The indexes were built without the hooks, which mark the changed papers for the versions
+    agency.versions.invalidate()
+    return subscribers
+
+
+class Snapshotter(object):
+    """
+    Snapshots the agency every interval seconds in a background thread, if it changed since the last snapshot.
+
+    The subscribers are copied a chunk at a time (see capture), so writers and readers wait for one chunk or the final
+    copy of the rest at most. Once a snapshot is on disk, the records of the write-ahead log it includes are dropped.
+    """
+
+    def __init__(self, agency, path: str, interval: float):
+        self.agency = agency
+        self.path = path
+        self.interval = interval
+        self.snapshots = 0
+        self.last_error: Optional[BaseException] = None
+        # The first snapshot is always taken if there is none yet
+        self._mutations = agency.mutations if os.path.exists(path) else None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshotter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def snapshot(self) -> bool:
+        # Take a snapshot now, if anything changed. Returns whether one was taken.
+        mutations = self.agency.mutations
+        if mutations == self._mutations:
+            return False
+        lsn = save_snapshot(self.agency, self.path)
+        wal = self.agency.wal
+        if wal is not None:
+            # A database which commits in batches may not have the newest records yet, they are needed on a restart
+            # from the database
+            stored = self.agency.storage.applied_lsn()
+            wal.truncate(lsn if stored is None else min(lsn, stored))
+        self._mutations = mutations
+        self.snapshots += 1
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception as err:
+                # Try again at the next interval, the log still has everything
+                self.last_error = err
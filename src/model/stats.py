@@ -0,0 +1,30 @@
+class NewspaperStats(object):
+    """Running subscriber and revenue counters of a newspaper, changed in place instead of being recomputed."""
+
+    def __init__(self, price: float, number_of_subscribers: int = 0):
+        self.price = price
+        self.number_of_subscribers = number_of_subscribers
+        self.monthly_revenue = number_of_subscribers * price
+
+    def add_subscriber(self):
+        self.number_of_subscribers += 1
+        self._update_revenue()
+
+    def remove_subscriber(self):
+        self.number_of_subscribers -= 1
+        self._update_revenue()
+
+    def set_price(self, price: float):
+        self.price = price
+        self._update_revenue()
+
+    def _update_revenue(self):
+        # Multiply instead of adding the price up, so no rounding errors pile up over time
+        self.monthly_revenue = self.number_of_subscribers * self.price
+
+    def as_dict(self):
+        return {
+            "number_of_subscribers": self.number_of_subscribers,
+            "monthly_revenue": self.monthly_revenue,
+            'annual_revenue': self.monthly_revenue * 12
+        }
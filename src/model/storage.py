@@ -0,0 +1,387 @@
+import sqlite3
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .editor import Editor
+from .issue import Issue
+from .ledger import unpack_key
+from .newspaper import Newspaper
+from .subscriber import Subscriber
+
+
+class MemoryStorage(object):
+    """
+    Where the agency keeps its entities: the storage engine interface, and the default in-memory engine.
+
+    The agency always works on its in-memory registries and indexes. An engine is attached to them by open(), follows
+    adding and removing entities through the registry watchers, and is told about changed fields by the agency. The
+    in-memory engine has nothing to add, the registries are the storage.
+    """
+
+    def open(self, agency):
+        # Load the stored entities into the (empty) agency and start following it
+        pass
+
+    def save_newspaper(self, paper: Newspaper):
+        pass
+
+    def save_issue(self, issue: Issue):
+        pass
+
+    def save_editor(self, editor: Editor):
+        pass
+
+    def save_subscriber(self, sub: Subscriber):
+        pass
+
+    def adopt_subscribers(self, rows: Iterable[Tuple[int, Optional[str], Optional[str], List[int]]]):
+        # (subscriber_id, name, address, subscriptions) of subscribers which were added lazily without calling the
+        # registry watchers (e.g. by a snapshot): store them. Their subscriptions are followed once they are loaded.
+        pass
+
+    def record_deliveries(self, rows: Iterable[Tuple[int, int, int, float]]):
+        # New (subscriber_id, paper_id, issue_id, timestamp) rows of the delivery ledger
+        pass
+
+    def save_ids(self, positions: Dict[str, int]):
+        # Positions of ID sequences, so IDs are not handed out twice after a restart
+        pass
+
+    def save_lsn(self, lsn: int):
+        # The lsn of the last logged mutation, stored together with its changes
+        pass
+
+    def applied_lsn(self) -> Optional[int]:
+        # The lsn of the last logged mutation whose changes are committed, None if the engine keeps nothing. Replaying
+        # the write-ahead log starts after it.
+        return None
+
+    def commit(self):
+        # Called after every mutation of the agency
+        pass
+
+    @contextmanager
+    def batch(self):
+        # Group the mutations in the block into one transaction
+        yield
+
+    def close(self):
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS newspapers (paper_id INTEGER NOT NULL UNIQUE, name TEXT, frequency INTEGER, price REAL);
+CREATE TABLE IF NOT EXISTS issues (paper_id INTEGER NOT NULL, issue_id INTEGER NOT NULL, release_date TEXT,
+                                   number_of_pages INTEGER, released INTEGER NOT NULL, editor_id INTEGER,
+                                   UNIQUE (paper_id, issue_id));
+CREATE TABLE IF NOT EXISTS editors (editor_id INTEGER NOT NULL UNIQUE, editor_name TEXT, address TEXT);
+CREATE TABLE IF NOT EXISTS editor_newspapers (editor_id INTEGER NOT NULL, paper_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS editor_newspapers_by_editor ON editor_newspapers (editor_id);
+CREATE INDEX IF NOT EXISTS editor_newspapers_by_paper ON editor_newspapers (paper_id);
+CREATE TABLE IF NOT EXISTS editor_issues (editor_id INTEGER NOT NULL, paper_id INTEGER NOT NULL,
+                                          issue_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS editor_issues_by_editor ON editor_issues (editor_id);
+CREATE INDEX IF NOT EXISTS editor_issues_by_issue ON editor_issues (paper_id, issue_id);
+CREATE TABLE IF NOT EXISTS subscribers (subscriber_id INTEGER NOT NULL UNIQUE, name TEXT, address TEXT);
+CREATE TABLE IF NOT EXISTS subscriptions (subscriber_id INTEGER NOT NULL, paper_id INTEGER NOT NULL,
+                                          UNIQUE (subscriber_id, paper_id));
+CREATE INDEX IF NOT EXISTS subscriptions_by_paper ON subscriptions (paper_id);
+CREATE TABLE IF NOT EXISTS deliveries (subscriber_id INTEGER NOT NULL, paper_id INTEGER NOT NULL,
+                                       issue_id INTEGER NOT NULL, timestamp REAL NOT NULL,
+                                       UNIQUE (subscriber_id, paper_id, issue_id));
+CREATE INDEX IF NOT EXISTS deliveries_by_issue ON deliveries (paper_id, issue_id);
+CREATE TABLE IF NOT EXISTS id_sequences (name TEXT PRIMARY KEY, next_id INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS log_position (id INTEGER PRIMARY KEY CHECK (id = 0), lsn INTEGER NOT NULL);
+"""
+
+# The statements are kept as constants, so sqlite3 prepares each of them once and reuses it from its statement cache
+_SAVE_NEWSPAPER = ("INSERT INTO newspapers (paper_id, name, frequency, price) VALUES (?, ?, ?, ?) "
+                   "ON CONFLICT (paper_id) DO UPDATE SET name = excluded.name, frequency = excluded.frequency, "
+                   "price = excluded.price")
+_SAVE_ISSUE = ("INSERT INTO issues (paper_id, issue_id, release_date, number_of_pages, released, editor_id) "
+               "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (paper_id, issue_id) DO UPDATE SET "
+               "release_date = excluded.release_date, number_of_pages = excluded.number_of_pages, "
+               "released = excluded.released, editor_id = excluded.editor_id")
+_SAVE_EDITOR = ("INSERT INTO editors (editor_id, editor_name, address) VALUES (?, ?, ?) "
+                "ON CONFLICT (editor_id) DO UPDATE SET editor_name = excluded.editor_name, address = excluded.address")
+_SAVE_SUBSCRIBER = ("INSERT INTO subscribers (subscriber_id, name, address) VALUES (?, ?, ?) "
+                    "ON CONFLICT (subscriber_id) DO UPDATE SET name = excluded.name, address = excluded.address")
+_SAVE_SUBSCRIPTION = "INSERT OR IGNORE INTO subscriptions (subscriber_id, paper_id) VALUES (?, ?)"
+_SAVE_DELIVERY = "INSERT OR IGNORE INTO deliveries (subscriber_id, paper_id, issue_id, timestamp) VALUES (?, ?, ?, ?)"
+_SAVE_IDS = ("INSERT INTO id_sequences (name, next_id) VALUES (?, ?) "
+             "ON CONFLICT (name) DO UPDATE SET next_id = max(next_id, excluded.next_id)")
+_SAVE_LSN = "INSERT INTO log_position (id, lsn) VALUES (0, ?) ON CONFLICT (id) DO UPDATE SET lsn = excluded.lsn"
+_DELETE = {
+    "newspaper": ["DELETE FROM newspapers WHERE paper_id = ?",
+                  "DELETE FROM issues WHERE paper_id = ?",
+                  "DELETE FROM editor_newspapers WHERE paper_id = ?",
+                  "DELETE FROM editor_issues WHERE paper_id = ?",
+                  "DELETE FROM subscriptions WHERE paper_id = ?",
+                  "DELETE FROM deliveries WHERE paper_id = ?"],
+    "editor": ["DELETE FROM editors WHERE editor_id = ?",
+               "DELETE FROM editor_newspapers WHERE editor_id = ?",
+               "DELETE FROM editor_issues WHERE editor_id = ?"],
+    "subscriber": ["DELETE FROM subscribers WHERE subscriber_id = ?",
+                   "DELETE FROM subscriptions WHERE subscriber_id = ?",
+                   "DELETE FROM deliveries WHERE subscriber_id = ?"],
+}
+_DELETE_ISSUE = ["DELETE FROM issues WHERE paper_id = ? AND issue_id = ?",
+                 "DELETE FROM editor_issues WHERE paper_id = ? AND issue_id = ?"]
+_DELETE_SUBSCRIPTION = "DELETE FROM subscriptions WHERE subscriber_id = ? AND paper_id = ?"
+_SAVE_EDITOR_NEWSPAPER = "INSERT INTO editor_newspapers (editor_id, paper_id) VALUES (?, ?)"
+_SAVE_EDITOR_ISSUE = "INSERT INTO editor_issues (editor_id, paper_id, issue_id) VALUES (?, ?, ?)"
+# The links are lists, so only one row goes if an entity is linked twice
+_DELETE_EDITOR_NEWSPAPER = ("DELETE FROM editor_newspapers WHERE rowid = (SELECT rowid FROM editor_newspapers "
+                            "WHERE editor_id = ? AND paper_id = ? ORDER BY rowid LIMIT 1)")
+_DELETE_EDITOR_ISSUE = ("DELETE FROM editor_issues WHERE rowid = (SELECT rowid FROM editor_issues "
+                        "WHERE editor_id = ? AND paper_id = ? AND issue_id = ? ORDER BY rowid LIMIT 1)")
+
+
+class SqliteStorage(MemoryStorage):
+    """
+    Keeps the entities of the agency in an SQLite database as well, so they survive a restart.
+
+    Every mutation of the agency is written with upserts and deletes in the database's WAL mode. Consecutive
+    mutations share a transaction: it is committed after every batch_size mutations, at the end of a batch() block,
+    and on close(). Other processes can read the database while the agency runs.
+
+    The state still has to fit into memory. Opening the database loads every row (all newspapers, issues, editors,
+    subscribers and deliveries) into the agency, which then needs as much RAM as an agency built by hand, and opening
+    takes time linear in the rows. Nothing is loaded on demand later, reads are served from the agency's own indexes.
+    For a fast start from a large state, see the snapshots in snapshot.py.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1):
+        if batch_size < 1:
+            raise ValueError("The batch size has to be at least 1!")
+        self.path = path
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                                           cached_statements=256)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        # In WAL mode a commit is safe against crashes of the process without an fsync, only the last transactions
+        # before a power loss can be lost
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._in_transaction = False
+        self._uncommitted = 0
+        self._batches = 0
+        # The lsn of the last logged mutation written, and of the last one committed
+        self._lsn = self._committed_lsn = 0
+
+    def _execute(self, statement: str, parameters=()):
+        with self._lock:
+            self._begin()
+            self._connection.execute(statement, parameters)
+
+    def _execute_many(self, statement: str, rows: Iterable):
+        with self._lock:
+            self._begin()
+            self._connection.executemany(statement, rows)
+
+    def _begin(self):
+        if not self._in_transaction:
+            self._connection.execute("BEGIN")
+            self._in_transaction = True
+
+    # Loading
+    def open(self, agency):
+        connection = self._connection
+        papers = {}
+        for paper_id, name, frequency, price in connection.execute(
+                "SELECT paper_id, name, frequency, price FROM newspapers ORDER BY rowid"):
+            papers[paper_id] = Newspaper(paper_id=paper_id, name=name, frequency=frequency, price=price)
+        for paper_id, issue_id, release_date, pages, released, editor_id in connection.execute(
+                "SELECT paper_id, issue_id, release_date, number_of_pages, released, editor_id FROM issues "
+                "ORDER BY rowid"):
+            papers[paper_id].issues.append(Issue(issue_id=issue_id, release_date=release_date, number_of_pages=pages,
+                                                 released=bool(released), editor_id=editor_id))
+        agency.newspapers.extend(papers.values())
+
+        editors = {}
+        for editor_id, name, address in connection.execute(
+                "SELECT editor_id, editor_name, address FROM editors ORDER BY rowid"):
+            editors[editor_id] = Editor(editor_id=editor_id, editor_name=name, address=address)
+        for editor_id, paper_id in connection.execute(
+                "SELECT editor_id, paper_id FROM editor_newspapers ORDER BY rowid"):
+            editors[editor_id].newspapers.append(papers[paper_id])
+        for editor_id, paper_id, issue_id in connection.execute(
+                "SELECT editor_id, paper_id, issue_id FROM editor_issues ORDER BY rowid"):
+            editors[editor_id].issues.append(papers[paper_id].get_issue(issue_id))
+        agency.editors.extend(editors.values())
+
+        # The ledger first, so the backlogs of the subscribers know what was delivered
+        columns = (array('q'), array('q'), array('q'), array('d'))
+        for row in connection.execute(
+                "SELECT subscriber_id, paper_id, issue_id, timestamp FROM deliveries ORDER BY rowid"):
+            for column, value in zip(columns, row):
+                column.append(value)
+        agency.deliveries.load(*columns)
+
+        subscribers = {}
+        for subscriber_id, name, address in connection.execute(
+                "SELECT subscriber_id, name, address FROM subscribers ORDER BY rowid"):
+            subscribers[subscriber_id] = Subscriber(subscriber_id=subscriber_id, name=name, address=address)
+        for subscriber_id, paper_id in connection.execute(
+                "SELECT subscriber_id, paper_id FROM subscriptions ORDER BY rowid"):
+            subscribers[subscriber_id].subscriptions.append(paper_id)
+        agency.subscribers.extend(subscribers.values())
+
+        agency.ids.restore(dict(connection.execute("SELECT name, next_id FROM id_sequences")))
+        for lsn, in connection.execute("SELECT lsn FROM log_position"):
+            self._lsn = self._committed_lsn = lsn
+
+        # From now on, follow every entity added to or removed from the agency
+        agency.newspapers.watch(self, self._newspaper_added, self._newspaper_removed)
+        agency.editors.watch(self, self._editor_added, self._editor_removed)
+        agency.subscribers.watch(self, self._subscriber_added, self._subscriber_removed)
+        agency.subscribers.watch_loads(self, self._watch_subscriptions)
+        for paper in agency.newspapers:
+            self._watch_issues(paper)
+        for editor in agency.editors:
+            self._watch_links(editor)
+        for sub in agency.subscribers:
+            self._watch_subscriptions(sub)
+
+    # Following the registries
+    def _newspaper_added(self, paper: Newspaper):
+        self.save_newspaper(paper)
+        for issue in paper.issues:
+            self._issue_added(paper, issue)
+        self._watch_issues(paper)
+
+    def _watch_issues(self, paper: Newspaper):
+        paper.issues.watch(self, partial(self._issue_added, paper), partial(self._issue_removed, paper))
+
+    def _newspaper_removed(self, paper: Newspaper):
+        paper.issues.unwatch(self)
+        for statement in _DELETE["newspaper"]:
+            self._execute(statement, (paper.paper_id,))
+
+    def _issue_added(self, paper: Newspaper, issue: Issue):
+        self._execute(_SAVE_ISSUE, (paper.paper_id, issue.issue_id, issue.release_date, issue.number_of_pages,
+                                    issue.released, issue.editor_id))
+
+    def _issue_removed(self, paper: Newspaper, issue: Issue):
+        for statement in _DELETE_ISSUE:
+            self._execute(statement, (paper.paper_id, issue.issue_id))
+
+    def _editor_added(self, editor: Editor):
+        self.save_editor(editor)
+        self._execute_many(_SAVE_EDITOR_NEWSPAPER, ((editor.editor_id, paper_id) for paper_id in editor.newspapers.ids))
+        self._execute_many(_SAVE_EDITOR_ISSUE, ((editor.editor_id, *unpack_key(key)) for key in editor.issues.ids))
+        self._watch_links(editor)
+
+    def _watch_links(self, editor: Editor):
+        # Every linked newspaper and issue is a row of its own, so a change costs one row, not the editor's whole list
+        editor.newspapers.watch(self, self._editor_paper_added, self._editor_paper_removed)
+        editor.issues.watch(self, self._editor_issue_added, self._editor_issue_removed)
+
+    def _editor_removed(self, editor: Editor):
+        editor.newspapers.unwatch(self)
+        editor.issues.unwatch(self)
+        for statement in _DELETE["editor"]:
+            self._execute(statement, (editor.editor_id,))
+
+    def _editor_paper_added(self, editor: Editor, paper_id: int):
+        self._execute(_SAVE_EDITOR_NEWSPAPER, (editor.editor_id, paper_id))
+
+    def _editor_paper_removed(self, editor: Editor, paper_id: int):
+        self._execute(_DELETE_EDITOR_NEWSPAPER, (editor.editor_id, paper_id))
+
+    def _editor_issue_added(self, editor: Editor, key: int):
+        self._execute(_SAVE_EDITOR_ISSUE, (editor.editor_id, *unpack_key(key)))
+
+    def _editor_issue_removed(self, editor: Editor, key: int):
+        self._execute(_DELETE_EDITOR_ISSUE, (editor.editor_id, *unpack_key(key)))
+
+    def _subscriber_added(self, sub: Subscriber):
+        self.save_subscriber(sub)
+        self._execute_many(_SAVE_SUBSCRIPTION, ((sub.subscriber_id, paper_id) for paper_id in sub.subscriptions))
+        self._watch_subscriptions(sub)
+
+    def _watch_subscriptions(self, sub: Subscriber):
+        sub.subscriptions.watch(self, self._subscribed, self._unsubscribed)
+
+    def _subscriber_removed(self, sub: Subscriber):
+        sub.subscriptions.unwatch(self)
+        for statement in _DELETE["subscriber"]:
+            self._execute(statement, (sub.subscriber_id,))
+
+    def _subscribed(self, sub: Subscriber, paper_id: int):
+        self._execute(_SAVE_SUBSCRIPTION, (sub.subscriber_id, paper_id))
+
+    def _unsubscribed(self, sub: Subscriber, paper_id: int):
+        self._execute(_DELETE_SUBSCRIPTION, (sub.subscriber_id, paper_id))
+
+    # Changed fields
+    def save_newspaper(self, paper: Newspaper):
+        self._execute(_SAVE_NEWSPAPER, (paper.paper_id, paper.name, paper.frequency, paper.price))
+
+    def save_issue(self, issue: Issue):
+        if issue.paper_id is not None:
+            self._execute(_SAVE_ISSUE, (issue.paper_id, issue.issue_id, issue.release_date, issue.number_of_pages,
+                                        issue.released, issue.editor_id))
+
+    def save_editor(self, editor: Editor):
+        # The links to newspapers and issues follow the editor's references (see _watch_links)
+        self._execute(_SAVE_EDITOR, (editor.editor_id, editor.editor_name, editor.address))
+
+    def save_subscriber(self, sub: Subscriber):
+        self._execute(_SAVE_SUBSCRIBER, (sub.subscriber_id, sub.subscriber_name, sub.subscriber_address))
+
+    def adopt_subscribers(self, rows: Iterable[Tuple[int, Optional[str], Optional[str], List[int]]]):
+        rows = list(rows)
+        self._execute_many(_SAVE_SUBSCRIBER, (row[:3] for row in rows))
+        self._execute_many(_SAVE_SUBSCRIPTION, ((row[0], paper_id) for row in rows for paper_id in row[3]))
+
+    def record_deliveries(self, rows: Iterable[Tuple[int, int, int, float]]):
+        self._execute_many(_SAVE_DELIVERY, rows)
+
+    def save_ids(self, positions: Dict[str, int]):
+        self._execute_many(_SAVE_IDS, positions.items())
+
+    def save_lsn(self, lsn: int):
+        with self._lock:
+            self._execute(_SAVE_LSN, (lsn,))
+            self._lsn = lsn
+
+    def applied_lsn(self) -> Optional[int]:
+        return self._committed_lsn
+
+    # Transactions
+    def commit(self):
+        with self._lock:
+            self._uncommitted += 1
+            if not self._batches and self._uncommitted >= self.batch_size:
+                self._commit()
+
+    def _commit(self):
+        if self._in_transaction:
+            self._connection.execute("COMMIT")
+            self._in_transaction = False
+            self._committed_lsn = self._lsn
+        self._uncommitted = 0
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batches += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batches -= 1
+                if not self._batches:
+                    self._commit()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._commit()
+                self._connection.close()
+                self._connection = None
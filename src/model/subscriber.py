@@ -1,13 +1,15 @@
-from typing import List
-
-from .newspaper import Newspaper
-from .issue import Issue
+from .ledger import DeliveredIssues
+from .refs import IdList
 
 
 class Subscriber:
+    __slots__ = ('subscriber_id', 'subscriber_name', 'subscriber_address', 'subscriptions', 'delivered_issues')
+
     def __init__(self, subscriber_id: int, name: str, address: str):
         self.subscriber_id = subscriber_id
         self.subscriber_name = name
         self.subscriber_address = address
-        self.subscriptions: List[int] = []
-        self.delivered_issues: List[Issue] = []
+        # The IDs of the subscribed newspapers, in subscription order
+        self.subscriptions: IdList = IdList(self)
+        # A view on the delivery ledger, which stores IDs instead of Issue objects
+        self.delivered_issues: DeliveredIssues = DeliveredIssues(self)
@@ -0,0 +1,115 @@
+import threading
+import weakref
+from typing import Dict, Iterator, NamedTuple, Optional, Set
+
+import numpy as np
+
+from .ledger import _DELETED
+from .report import MissingBlock, missing_block
+
+
+class PaperVersion(NamedTuple):
+    """The state of one newspaper at one point in time. The arrays are copies and never change."""
+    paper_id: int
+    name: str
+    frequency: int
+    price: float
+    # Released issues in the order of the newspaper
+    issue_ids: np.ndarray
+    # Sorted IDs of the subscribers
+    subscriber_ids: np.ndarray
+    # The deliveries of the paper: delivered_to[i] got delivered_issues[i]
+    delivered_to: np.ndarray
+    delivered_issues: np.ndarray
+
+
+class AgencyVersion(object):
+    """
+    A consistent, read-only view of the newspapers of the agency, as pinned by Agency.pin().
+
+    It can be read as long as needed without any lock, writers carry on meanwhile. A version is kept alive by whoever
+    holds it and reclaimed once nobody does. It is meant for reads across all newspapers, like the missing-delivery
+    report: the stats of a single newspaper or subscriber are read from the agency's counters under its read lock.
+    """
+
+    def __init__(self, number: int, papers: Dict[int, PaperVersion]):
+        # The number of mutations of the agency included in this version
+        self.number = number
+        self.papers = papers
+
+    def missing_report(self) -> Iterator[MissingBlock]:
+        # Every released issue not delivered to a subscriber of its paper, one block per newspaper
+        for paper in self.papers.values():
+            block = missing_block(paper)
+            if block is not None:
+                yield block
+
+
+class Versions(object):
+    """
+    Copy-on-write versions of the agency's newspapers.
+
+    Writers only mark the papers they change as dirty. pin() builds a new version when anything changed since the last
+    one, under the read lock of the agency: the dirty papers are copied anew, all others are shared with the previous
+    version. Building is linear in the subscribers and deliveries of the dirty papers only.
+    """
+
+    def __init__(self, agency):
+        self.agency = agency
+        self._dirty: Set[int] = set()
+        self._current: Optional[AgencyVersion] = None
+        # Readers pin concurrently, only one of them builds a version
+        self._lock = threading.Lock()
+        # The versions still held by someone
+        self._live = weakref.WeakSet()
+        # Statistics: versions built, and papers copied to build them
+        self.built = 0
+        self.copied = 0
+
+    def touch(self, paper_id: int):
+        # Called by writers, under the write lock of the agency
+        self._dirty.add(paper_id)
+
+    def invalidate(self):
+        # Rebuild every paper on the next pin, e.g. after the indexes were loaded in bulk
+        self._current = None
+
+    @property
+    def live(self) -> int:
+        return len(self._live)
+
+    def pin(self) -> AgencyVersion:
+        with self.agency.lock.read, self._lock:
+            current = self._current
+            if current is not None and not self._dirty:
+                return current
+            previous = {} if current is None else current.papers
+            papers = {}
+            for paper in self.agency.newspapers:
+                kept = previous.get(paper.paper_id)
+                if kept is None or paper.paper_id in self._dirty:
+                    kept = self._copy(paper)
+                    self.copied += 1
+                papers[paper.paper_id] = kept
+            self._dirty.clear()
+            self._current = AgencyVersion(self.agency.mutations, papers)
+            self._live.add(self._current)
+            self.built += 1
+            return self._current
+
+    def _copy(self, paper) -> PaperVersion:
+        agency = self.agency
+        released = agency.released_issues.get(paper.paper_id, ())
+        issue_ids = np.array(sorted(released, key=paper.issues.rank), dtype=np.int64)
+        audience = agency.paper_subscribers.get(paper.paper_id, ())
+        subscriber_ids = np.fromiter(audience, dtype=np.int64, count=len(audience))
+        subscriber_ids.sort()
+
+        ledger = agency.deliveries
+        rows = np.frombuffer(ledger.rows_of(paper.paper_id), dtype=np.int64)
+        # Fancy indexing copies, the views on the ledger columns don't outlive the read lock
+        delivered_to = np.frombuffer(ledger.subscriber_ids, dtype=np.int64)[rows]
+        delivered_issues = np.frombuffer(ledger.issue_ids, dtype=np.int64)[rows]
+        live = delivered_to != _DELETED
+        return PaperVersion(paper.paper_id, paper.name, paper.frequency, paper.price, issue_ids, subscriber_ids,
+                            delivered_to[live], delivered_issues[live])
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+from typing import Iterator, Optional
+
+
+class WriteAheadLog(object):
+    """
+    An append-only log of the mutations of the agency, one JSON record per line.
+
+    append() returns once the record is on disk. Records of concurrent callers are written together: whoever finds no
+    write in progress becomes the leader, writes everything queued so far and syncs it with one fsync, while the others
+    wait for that commit (group commit). So under load an fsync is shared by many operations.
+
+    Every record gets a log sequence number (lsn), counting on from the last_lsn of the existing log. A snapshot stores
+    the lsn it includes, truncate() then drops the records it covers.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, last_lsn: int = 0):
+        self.path = path
+        self.fsync = fsync
+        _truncate_torn_tail(path)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._cond = threading.Condition()
+        self._queue = []
+        # The lsn of the last record queued and committed, a record's lsn is also its ticket to wait for
+        self._queued = last_lsn
+        self._committed = last_lsn
+        self._writing = False
+        self._error: Optional[BaseException] = None
+        # Statistics: records and commits (fsyncs) since the log was opened
+        self.records = 0
+        self.commits = 0
+
+    def append(self, record: dict):
+        self.wait(self.enqueue(record))
+
+    @property
+    def lsn(self) -> int:
+        # The lsn of the last record queued
+        return self._queued
+
+    def enqueue(self, record: dict) -> int:
+        # Queue a record and return its lsn, which is the ticket to wait for
+        with self._cond:
+            if self._file is None:
+                raise ValueError("The write-ahead log has been closed!")
+            self._queued += 1
+            self._queue.append(json.dumps(dict(record, lsn=self._queued), separators=(',', ':')) + '\n')
+            return self._queued
+
+    def wait(self, ticket: int):
+        # Block until the record with the ticket is on disk, writing it (and everything before) if nobody else does
+        with self._cond:
+            while self._committed < ticket:
+                if self._error is not None:
+                    raise IOError(f"The write-ahead log {self.path} failed: {self._error}")
+                if self._writing:
+                    self._cond.wait()
+                    continue
+                self._commit()
+
+    def _commit(self):
+        # Called with the condition held, it is released while writing
+        self._writing = True
+        lines, self._queue = self._queue, []
+        last = self._queued
+        self._cond.release()
+        try:
+            self._file.write(''.join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except BaseException as err:
+            self._error = err
+            raise
+        finally:
+            self._cond.acquire()
+            self._writing = False
+            if self._error is None:
+                self._committed = last
+                self.records += len(lines)
+                self.commits += 1
+            self._cond.notify_all()
+
+    def truncate(self, lsn: int):
+        # Drop the records up to lsn, e.g. once a snapshot includes them. The log is rewritten and swapped in
+        # atomically, appends wait meanwhile.
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            if self._file is None:
+                return
+            self._file.flush()
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as kept:
+                for position, line in enumerate(_lines(self.path), 1):
+                    if json.loads(line).get('lsn', position) > lsn:
+                        kept.write(line)
+                kept.flush()
+                os.fsync(kept.fileno())
+            self._file.close()
+            os.replace(temporary, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            if self._file is None:
+                return
+            if self._queue:
+                self._commit()
+            self._file.close()
+            self._file = None
+
+
+def _truncate_torn_tail(path: str):
+    # Cut off a partly written last record, so the next one starts on a line of its own
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as log:
+        size = log.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(end - 4096, 0)
+            log.seek(start)
+            newline = log.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end != size:
+            log.truncate(end)
+
+
+def _lines(path: str) -> Iterator[str]:
+    # The complete lines of a log, a torn last line is left out
+    with open(path, 'r', encoding='utf-8') as log:
+        for line in log:
+            if line.endswith('\n'):
+                yield line
+
+
+def read_log(path: str) -> Iterator[dict]:
+    # The records of a log, each with its lsn. A torn last line (a crash while writing it) is skipped, it was never
+    # committed. Records of logs written before lsns were added are numbered by their position.
+    if not os.path.exists(path):
+        return
+    pending = None
+    for number, line in enumerate(_lines(path), 1):
+        if pending is not None:
+            raise ValueError(f"The write-ahead log {path} is corrupt at line {pending}!")
+        try:
+            record = json.loads(line)
+        except ValueError:
+            pending = number
+            continue
+        record.setdefault('lsn', number)
+        yield record
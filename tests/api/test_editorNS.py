@@ -1,5 +1,10 @@
+import base64
+import json
+
 # import the fixtures (this is necessary!)
 from ..fixtures import app, client, agency
+from ...src.model.editor import Editor
+from ...src.model.newspaper import Newspaper
 
 
 def test_get_editor_should_list_all_editors(client, agency):
@@ -141,6 +146,37 @@ def test_delete_editor(client, agency):
     assert "was not found" in delete_response.get_data(as_text=True)
 
 
+def test_delete_editor_reports_the_transferred_issues(client, agency):
+    # Two new newspapers, the first has another editor and the second has none
+    paper, other = [Newspaper(paper_id=paper_id, name="Daily", frequency=1, price=1.0)
+                    for paper_id in agency.new_paper_ids(2)]
+    agency.add_newspapers([paper, other])
+    leaving, staying = [Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                        for editor_id in agency.new_editor_ids(2)]
+    agency.add_editors([leaving, staying])
+    agency.add_newspaper_to_editor(paper.paper_id, leaving.editor_id)
+    agency.add_newspaper_to_editor(paper.paper_id, staying.editor_id)
+    kept = agency.add_issue_to_newspaper(paper.paper_id, {"release_date": "14.04.2024", "number_of_pages": 10})
+    orphaned = agency.add_issue_to_newspaper(other.paper_id, {"release_date": "14.04.2024", "number_of_pages": 10})
+    agency.specify_editor(paper.paper_id, kept.issue_id, leaving.editor_id)
+    agency.specify_editor(other.paper_id, orphaned.issue_id, leaving.editor_id)
+    mutations = agency.mutations
+
+    delete_response = client.delete(f"/editor/{leaving.editor_id}")
+
+    assert delete_response.status_code == 200
+    parsed = delete_response.get_json()
+    assert parsed["message"] == f"Editor with ID {leaving.editor_id} was removed"
+    assert sorted(parsed["transferred"], key=lambda item: item["paper_id"]) == sorted(
+        [{"paper_id": paper.paper_id, "issue_id": kept.issue_id, "editor_id": staying.editor_id},
+         {"paper_id": other.paper_id, "issue_id": orphaned.issue_id, "editor_id": None}],
+        key=lambda item: item["paper_id"])
+    assert agency.get_editor(leaving.editor_id) is None
+    assert kept.editor_id == staying.editor_id and orphaned.editor_id is None
+    # The transfer and the removal are one mutation
+    assert agency.mutations == mutations + 1
+
+
 def test_assign_newspaper_to_editor(client, agency):
     # Add the editor
     new_editor = client.post('/editor/',
@@ -204,3 +240,45 @@ def test_list_all_editor_issues(client, agency):
     assert response.status_code == 200
 
 
+
+
+def test_add_editors_bulk(client, agency):
+    editors_count_before = len(agency.editors)
+    response = client.post("/editor/bulk",
+                           json=[{"editor_name": "Ana", "address": "San Francisco"},
+                                 {"editor_name": "Carla"}])
+    assert response.status_code == 200
+
+    parsed = response.get_json()
+    assert parsed["created"] == 1
+    assert parsed["invalid"] == 1
+    assert parsed["results"][0]["editor"]["editor_name"] == "Ana"
+    assert len(agency.editors) == editors_count_before + 1
+
+
+def test_get_editors_in_pages(client, agency):
+    seen = []
+    cursor = None
+    while True:
+        query = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get('/editor/', query_string=query)
+        assert response.status_code == 200
+        parsed = response.get_json()
+        assert len(parsed["editor"]) <= 2
+        seen.extend(editor["editor_id"] for editor in parsed["editor"])
+        cursor = parsed["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [editor.editor_id for editor in agency.editors]
+
+
+def test_get_editors_with_invalid_page_arguments(client, agency):
+    assert client.get('/editor/', query_string={"cursor": "not a cursor"}).status_code == 400
+    # well-formed cursors with keys or ranks of the wrong type
+    for key, rank in (([1], 0), ({"a": 1}, 0), (10000, True), (10000, 1.5)):
+        cursor = base64.urlsafe_b64encode(json.dumps([key, rank]).encode()).decode()
+        response = client.get('/editor/', query_string={"cursor": cursor})
+        assert response.status_code == 400
+        assert response.get_json()["message"] == "Invalid cursor"
+    assert client.get('/editor/', query_string={"limit": 0}).status_code == 400
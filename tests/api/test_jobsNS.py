@@ -0,0 +1,70 @@
+# import the fixtures (this is necessary!)
+from ..fixtures import app, client, agency
+from ...src.app import create_app
+from ...src.model.jobs import JobQueue
+
+
+def test_fanout_job(client, agency):
+    paper_id = client.post("/newspaper/", json={"name": "Simpsons Comic",
+                                                 "frequency": 7,
+                                                 "price": 3.14}).get_json()["newspaper"]["paper_id"]
+    issue_id = client.post(f"/newspaper/{paper_id}/issue", json={"release_date": "14.04.2024",
+                                                                 "number_of_pages": 10}).get_json()["issue"]["issue_id"]
+    client.post(f"/newspaper/{paper_id}/issue/{issue_id}/release")
+    subscriber_id = client.post("/subscriber/", json={"subscriber_name": "Gabriela",
+                                                      "subscriber_address": "San Francisco"}
+                                ).get_json()["subscriber"]["subscriber_id"]
+    client.post(f"/subscriber/{subscriber_id}/subscribe", json={"paper_id": paper_id})
+
+    response = client.post("/jobs/fanout", json={"paper_id": paper_id, "issue_id": issue_id})
+    assert response.status_code == 200
+    job_id = response.get_json()["job_id"]
+
+    JobQueue.get_instance().join()
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    parsed = response.get_json()
+    assert parsed["status"] == "finished"
+    assert parsed["delivered"] == 1
+
+    # Try for a non-existing job
+    response = client.get("/jobs/0")
+    assert response.status_code == 404
+
+
+def test_fanout_job_rejects_a_bad_chunk_size(client, agency):
+    response = client.post("/jobs/fanout", json={"paper_id": 100, "issue_id": 1, "chunk_size": -1})
+    assert response.status_code == 400
+    assert "at least 1" in response.get_json()["message"]
+
+
+def test_delivery_job(client, agency):
+    response = client.post("/jobs/delivery", json={"paper_id": 100, "issue_id": 1, "subscriber_id": 1})
+    assert response.status_code == 200
+    job_id = response.get_json()["job_id"]
+
+    JobQueue.get_instance().join()
+    parsed = client.get(f"/jobs/{job_id}").get_json()
+    assert parsed["status"] == "failed"
+    assert parsed["errors"] == ["An issue with ID 1 doesn't exist!"]
+
+
+def test_release_scheduler_metrics(agency):
+    app = create_app(auto_release=True)
+    client = app.test_client()
+    paper_id = client.post("/newspaper/", json={"name": "Simpsons Comic",
+                                                 "frequency": 7,
+                                                 "price": 3.14}).get_json()["newspaper"]["paper_id"]
+    client.post(f"/newspaper/{paper_id}/issue", json={"release_date": "14.04.2099", "number_of_pages": 10})
+
+    response = client.get("/jobs/releases")
+    assert response.status_code == 200
+    parsed = response.get_json()
+    assert parsed["running"] is True
+    assert parsed["pending"] >= 1
+    app.config['RELEASE_SCHEDULER'].stop()
+
+
+def test_release_scheduler_metrics_when_disabled(client, agency):
+    response = client.get("/jobs/releases")
+    assert response.status_code == 404
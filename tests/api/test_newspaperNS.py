@@ -1,3 +1,5 @@
+import json
+
 # import the fixtures (this is necessary!)
 from ..fixtures import app, client, agency
 
@@ -456,3 +458,181 @@ def test_newspaper_statistics(client, agency):
     no_newspaper = client.get("/newspaper/11111/stats")
     no_newspaper_response = no_newspaper.get_json()
     assert "A newspaper with ID 11111 doesn't exist!" in no_newspaper_response["error"]
+
+
+def test_deliver_issue_to_all(client, agency):
+    # Create a newspaper
+    new_paper_response = client.post("/newspaper/",
+                                     json={
+                                         "name": "Simpsons Comic",
+                                         "frequency": 7,
+                                         "price": 3.14
+                                     })
+    paper_id = new_paper_response.get_json()["newspaper"]['paper_id']
+
+    new_issue_response = client.post(f"/newspaper/{paper_id}/issue",
+                                     json={
+                                         "release_date": "14.04.2024",
+                                         "number_of_pages": 10,
+                                         "released": False
+                                     })
+    issue_id = new_issue_response.get_json()["issue"]['issue_id']
+
+    # Not released yet
+    response = client.post(f"/newspaper/{paper_id}/issue/{issue_id}/deliver/all", json={})
+    assert "has not been released yet" in response.get_json()["error"]
+
+    client.post(f"/newspaper/{paper_id}/issue/{issue_id}/release")
+
+    # Create three subscribers, two of them subscribe to the newspaper
+    subscriber_ids = []
+    for name in ("Gabriela", "Carla", "Ana"):
+        new_subscriber_response = client.post("/subscriber/",
+                                              json={
+                                                  "subscriber_name": name,
+                                                  "subscriber_address": "San Francisco"
+                                              })
+        subscriber_ids.append(new_subscriber_response.get_json()["subscriber"]['subscriber_id'])
+    for subscriber_id in subscriber_ids[:2]:
+        client.post(f"/subscriber/{subscriber_id}/subscribe", json={"paper_id": paper_id})
+
+    # Deliver to all subscribers
+    response = client.post(f"/newspaper/{paper_id}/issue/{issue_id}/deliver/all", json={"batch_size": 1})
+    assert response.status_code == 200
+    parsed = response.get_json()
+    assert parsed["delivered"] == 2
+    assert len(parsed["batches"]) == 2
+
+    # Deliver to a list of subscribers, the first one already got the issue
+    response = client.post(f"/newspaper/{paper_id}/issue/{issue_id}/deliver/all",
+                           json={"subscriber_ids": [subscriber_ids[0], subscriber_ids[2], 1]})
+    parsed = response.get_json()
+    assert parsed["delivered"] == 1
+    assert parsed["already_delivered"] == 1
+    assert parsed["unknown_subscribers"] == 1
+    assert agency.deliveries.delivered(subscriber_ids[2], paper_id, issue_id)
+
+
+def test_add_newspapers_bulk(client, agency):
+    paper_count_before = len(agency.newspapers)
+    response = client.post("/newspaper/bulk",
+                           json=[{"name": "Simpsons Comic", "frequency": 7, "price": 3.14},
+                                 {"name": "No price", "frequency": 7},
+                                 {"name": "Daily Pulse", "frequency": 1, "price": 1.5}])
+    assert response.status_code == 200
+
+    parsed = response.get_json()
+    assert parsed["created"] == 2
+    assert parsed["invalid"] == 1
+    assert parsed["results"][0]["newspaper"]["name"] == "Simpsons Comic"
+    assert parsed["results"][1]["status"] == "invalid"
+    assert "price" in parsed["results"][1]["error"]
+    assert parsed["results"][2]["newspaper"]["name"] == "Daily Pulse"
+    assert len(agency.newspapers) == paper_count_before + 2
+
+    # Not an array
+    response = client.post("/newspaper/bulk", json={"name": "Simpsons Comic"})
+    assert response.status_code == 400
+
+
+def test_add_issues_bulk(client, agency):
+    response = client.post("/newspaper/100/issue/bulk",
+                           json=[{"release_date": "14.04.2024", "number_of_pages": 10},
+                                 {"release_date": "21.04.2024", "number_of_pages": 12}])
+    assert response.status_code == 200
+
+    parsed = response.get_json()
+    assert parsed["created"] == 2
+    issue_ids = [result["issue"]["issue_id"] for result in parsed["results"]]
+    assert len(set(issue_ids)) == 2
+    assert all(not result["issue"]["released"] for result in parsed["results"])
+    assert len(agency.get_issues(100)) == 2
+
+    # Try for a non-existing newspaper
+    response = client.post("/newspaper/9999/issue/bulk", json=[])
+    assert response.status_code == 404
+
+
+def test_get_issues_in_pages(client, agency):
+    paper = client.post("/newspaper/",
+                        json={"name": "Simpsons Comic", "frequency": 7, "price": 3.14}).get_json()["newspaper"]
+    for pages in range(1, 4):
+        client.post(f"/newspaper/{paper['paper_id']}/issue",
+                    json={"release_date": "14.04.2024", "number_of_pages": pages, "released": False})
+
+    response = client.get(f"/newspaper/{paper['paper_id']}/issue", query_string={"limit": 2})
+    assert response.status_code == 200
+    parsed = response.get_json()
+    assert [issue["number_of_pages"] for issue in parsed["issue"]] == [1, 2]
+
+    response = client.get(f"/newspaper/{paper['paper_id']}/issue",
+                          query_string={"limit": 2, "cursor": parsed["next_cursor"]})
+    parsed = response.get_json()
+    assert [issue["number_of_pages"] for issue in parsed["issue"]] == [3]
+    assert parsed["next_cursor"] is None
+
+    # unknown newspapers are still reported
+    response = client.get("/newspaper/9999/issue", query_string={"limit": 2})
+    assert response.status_code == 404
+
+
+def test_unassigned_issues_and_auto_assign(client, agency):
+    paper = client.post("/newspaper/",
+                        json={"name": "Simpsons Comic", "frequency": 7, "price": 3.14}).get_json()["newspaper"]
+    for pages in range(1, 4):
+        client.post(f"/newspaper/{paper['paper_id']}/issue",
+                    json={"release_date": "14.04.2024", "number_of_pages": pages, "released": False})
+
+    response = client.get("/newspaper/unassigned")
+    assert response.status_code == 200
+    unassigned = [issue for issue in response.get_json()["issue"] if issue["paper_id"] == paper["paper_id"]]
+    assert [issue["number_of_pages"] for issue in unassigned] == [1, 2, 3]
+
+    response = client.get("/newspaper/unassigned", query_string={"limit": 1})
+    parsed = response.get_json()
+    assert len(parsed["issue"]) == 1 and parsed["next_cursor"] is not None
+
+    editor = client.post("/editor/", json={"editor_name": "Ana", "address": "Vienna"}).get_json()["editor"]
+    agency.add_newspaper_to_editor(paper["paper_id"], editor["editor_id"])
+    response = client.post("/newspaper/unassigned/assign", json={"paper_id": paper["paper_id"]})
+    assert response.status_code == 200
+    parsed = response.get_json()
+    assert len(parsed["assigned"]) == 3
+    assert {item["editor_id"] for item in parsed["assigned"]} == {editor["editor_id"]}
+    assert parsed["unassigned"] == len(agency.orphans)
+
+    response = client.post("/newspaper/unassigned/assign", json={"paper_id": 9999})
+    assert response.status_code == 404
+
+
+def test_stream_issues_as_ndjson(client, agency):
+    paper = client.post("/newspaper/",
+                        json={"name": "Simpsons Comic", "frequency": 7, "price": 3.14}).get_json()["newspaper"]
+    for pages in range(1, 4):
+        client.post(f"/newspaper/{paper['paper_id']}/issue",
+                    json={"release_date": "14.04.2024", "number_of_pages": pages, "released": False})
+
+    response = client.get(f"/newspaper/{paper['paper_id']}/issue", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["number_of_pages"] for line in lines] == [1, 2, 3]
+
+    response = client.get("/newspaper/9999/issue", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 404
+
+
+def test_add_newspaper_ids_are_sequential(client, agency):
+    paper_ids = [client.post("/newspaper/", json={"name": f"Paper {number}", "frequency": 7, "price": 1.0})
+                 .get_json()["newspaper"]["paper_id"] for number in range(3)]
+    assert paper_ids == sorted(set(paper_ids))
+    # only IDs which were taken already are skipped
+    assert all(agency.get_newspaper(paper_id) is not None for paper_id in range(paper_ids[0], paper_ids[-1] + 1))
+
+
+def test_add_newspaper_when_ids_are_exhausted(client, agency):
+    agency.ids.sequence("newspaper").high = agency.ids.sequence("newspaper").next_id - 1
+
+    response = client.post("/newspaper/", json={"name": "One too many", "frequency": 7, "price": 1.0})
+
+    assert response.status_code == 400
@@ -0,0 +1,174 @@
+import pytest
+
+from ...src.app import create_app, parse_id_ranges
+from ...src.model.agency import Agency
+from ...src.model.snapshot import Snapshotter
+
+
+def test_app_replays_its_write_ahead_log(tmp_path):
+    path = str(tmp_path / "agency.wal")
+    Agency.singleton_instance = None
+    client = create_app(wal_path=path).test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    sub = client.post("/subscriber/", json={"subscriber_name": "Max", "subscriber_address": "Vienna"}) \
+        .get_json()["subscriber"]
+    client.post(f"/subscriber/{sub['subscriber_id']}/subscribe", json={"paper_id": paper["paper_id"]})
+    Agency.get_instance().close_log()
+
+    # restart
+    Agency.singleton_instance = None
+    app = create_app(wal_path=path)
+    client = app.test_client()
+
+    assert app.config["WAL_REPLAY"]["operations"] == 3
+    assert client.get(f"/newspaper/{paper['paper_id']}").get_json()["newspaper"] == paper
+    stats = client.get(f"/subscriber/{sub['subscriber_id']}/stats").get_json()
+    assert stats["number_of_subscriptions"] == 1
+    Agency.get_instance().close_log()
+    Agency.singleton_instance = None
+
+
+def test_app_starts_from_snapshot_and_log_tail(tmp_path):
+    wal_path = str(tmp_path / "agency.wal")
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    Agency.singleton_instance = None
+    app = create_app(wal_path=wal_path, snapshot_path=snapshot_path, snapshot_interval=0)
+    client = app.test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    Snapshotter(Agency.get_instance(), snapshot_path, interval=0).snapshot()
+    client.post("/subscriber/", json={"subscriber_name": "Max", "subscriber_address": "Vienna"})
+    Agency.get_instance().close_log()
+
+    # restart
+    Agency.singleton_instance = None
+    app = create_app(wal_path=wal_path, snapshot_path=snapshot_path, snapshot_interval=0)
+    client = app.test_client()
+
+    assert app.config["SNAPSHOT_LOAD"]["newspapers"] == 1
+    assert app.config["WAL_REPLAY"]["operations"] == 1
+    assert client.get(f"/newspaper/{paper['paper_id']}").get_json()["newspaper"] == paper
+    assert len(client.get("/subscriber/").get_json()["subscriber"]) == 1
+    Agency.get_instance().close_log()
+    Agency.singleton_instance = None
+
+
+def test_app_keeps_its_data_in_a_database(tmp_path):
+    path = str(tmp_path / "agency.db")
+    Agency.singleton_instance = None
+    client = create_app(database_path=path).test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    Agency.get_instance().close()
+
+    # restart
+    Agency.singleton_instance = None
+    client = create_app(database_path=path).test_client()
+
+    assert client.get(f"/newspaper/{paper['paper_id']}").get_json()["newspaper"] == paper
+    Agency.get_instance().close()
+    Agency.singleton_instance = None
+
+
+def test_snapshot_is_written_into_an_empty_database(tmp_path):
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    Agency.singleton_instance = None
+    client = create_app(snapshot_path=snapshot_path, snapshot_interval=0).test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    issue = client.post(f"/newspaper/{paper['paper_id']}/issue",
+                        json={"release_date": "14.04.2024", "number_of_pages": 10}).get_json()["issue"]
+    client.post(f"/newspaper/{paper['paper_id']}/issue/{issue['issue_id']}/release")
+    sub = client.post("/subscriber/", json={"subscriber_name": "Max", "subscriber_address": "Vienna"}) \
+        .get_json()["subscriber"]
+    client.post(f"/subscriber/{sub['subscriber_id']}/subscribe", json={"paper_id": paper["paper_id"]})
+    client.post(f"/newspaper/{paper['paper_id']}/issue/{issue['issue_id']}/deliver/all")
+    Snapshotter(Agency.get_instance(), snapshot_path, interval=0).snapshot()
+
+    # The database is filled from the snapshot
+    database_path = str(tmp_path / "agency.db")
+    Agency.singleton_instance = None
+    create_app(database_path=database_path, snapshot_path=snapshot_path, snapshot_interval=0)
+    Agency.get_instance().close()
+
+    # restart from the database alone
+    Agency.singleton_instance = None
+    client = create_app(database_path=database_path).test_client()
+
+    assert len(client.get("/subscriber/").get_json()["subscriber"]) == 1
+    stats = client.get(f"/subscriber/{sub['subscriber_id']}/stats").get_json()
+    assert stats["number_of_subscriptions"] == 1
+    assert len(Agency.get_instance().deliveries) == 1
+    assert Agency.get_instance().new_subscriber_id() != sub["subscriber_id"]
+    Agency.get_instance().close()
+    Agency.singleton_instance = None
+
+
+def test_app_id_ranges_can_be_configured(tmp_path):
+    assert parse_id_ranges("newspaper=1-2, subscriber=100000-") == {"newspaper": (1, 2), "subscriber": (100000, None)}
+    with pytest.raises(ValueError, match="Invalid ID range"):
+        parse_id_ranges("papers=1-2")
+
+    path = str(tmp_path / "agency.db")
+    Agency.singleton_instance = None
+    client = create_app(database_path=path, id_ranges=parse_id_ranges("newspaper=1-2")).test_client()
+    for number in range(2):
+        response = client.post("/newspaper/", json={"name": f"Paper {number}", "frequency": 1, "price": 1.0})
+        assert response.status_code == 200
+    response = client.post("/newspaper/", json={"name": "One too many", "frequency": 1, "price": 1.0})
+    assert response.status_code == 400
+    Agency.get_instance().close()
+    Agency.singleton_instance = None
+
+
+def test_app_restarts_from_database_and_log(tmp_path):
+    database_path = str(tmp_path / "agency.db")
+    wal_path = str(tmp_path / "agency.wal")
+    Agency.singleton_instance = None
+    client = create_app(database_path=database_path, wal_path=wal_path).test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    Agency.get_instance().close()
+
+    # The database has everything, nothing of the log is replayed on top of it
+    for restart in range(2):
+        Agency.singleton_instance = None
+        app = create_app(database_path=database_path, wal_path=wal_path)
+        client = app.test_client()
+        assert app.config["WAL_REPLAY"]["operations"] == 0
+        client.post("/subscriber/", json={"subscriber_name": f"Max {restart}", "subscriber_address": "Vienna"})
+        Agency.get_instance().close()
+
+    Agency.singleton_instance = None
+    client = create_app(database_path=database_path, wal_path=wal_path).test_client()
+    assert client.get(f"/newspaper/{paper['paper_id']}").get_json()["newspaper"] == paper
+    assert len(client.get("/subscriber/").get_json()["subscriber"]) == 2
+    Agency.get_instance().close()
+    Agency.singleton_instance = None
+
+
+def test_app_restarts_from_database_snapshot_and_log(tmp_path):
+    database_path = str(tmp_path / "agency.db")
+    wal_path = str(tmp_path / "agency.wal")
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    Agency.singleton_instance = None
+    client = create_app(wal_path=wal_path, snapshot_path=snapshot_path, snapshot_interval=0).test_client()
+    paper = client.post("/newspaper/", json={"name": "Heute", "frequency": 1, "price": 1.12}).get_json()["newspaper"]
+    Snapshotter(Agency.get_instance(), snapshot_path, interval=0).snapshot()
+    client.post("/subscriber/", json={"subscriber_name": "Max", "subscriber_address": "Vienna"})
+    Agency.get_instance().close()
+
+    # The first start fills the database from the snapshot and the log tail, the next ones skip both
+    for restart in range(2):
+        Agency.singleton_instance = None
+        app = create_app(database_path=database_path, wal_path=wal_path, snapshot_path=snapshot_path,
+                         snapshot_interval=0)
+        client = app.test_client()
+        assert app.config["WAL_REPLAY"]["operations"] == (1 if restart == 0 else 0)
+        Snapshotter(Agency.get_instance(), snapshot_path, interval=0).snapshot()
+        client.post("/subscriber/", json={"subscriber_name": f"Max {restart}", "subscriber_address": "Vienna"})
+        Agency.get_instance().close()
+
+    Agency.singleton_instance = None
+    client = create_app(database_path=database_path, wal_path=wal_path, snapshot_path=snapshot_path,
+                        snapshot_interval=0).test_client()
+    assert client.get(f"/newspaper/{paper['paper_id']}").get_json()["newspaper"] == paper
+    assert len(client.get("/subscriber/").get_json()["subscriber"]) == 3
+    Agency.get_instance().close()
+    Agency.singleton_instance = None
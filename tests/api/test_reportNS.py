@@ -0,0 +1,34 @@
+# import the fixtures (this is necessary!)
+from ..fixtures import app, client, agency
+from ...src.model.subscriber import Subscriber
+
+
+def test_missing_report(client, agency):
+    paper = agency.get_newspaper(100)
+    issue1 = agency.add_issue_to_newspaper(paper.paper_id, {"release_date": "14.04.2024", "number_of_pages": 10})
+    issue2 = agency.add_issue_to_newspaper(paper.paper_id, {"release_date": "21.04.2024", "number_of_pages": 12})
+    # Not released, so never missing
+    agency.add_issue_to_newspaper(paper.paper_id, {"release_date": "28.04.2024", "number_of_pages": 12})
+    agency.release_issue(paper.paper_id, issue1.issue_id)
+    agency.release_issue(paper.paper_id, issue2.issue_id)
+
+    for subscriber_id in (100001, 100002):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id, name="Gabriela", address="San Francisco"))
+        agency.subscribe(paper.paper_id, subscriber_id)
+    agency.deliver_issue(paper.paper_id, issue1.issue_id, 100001)
+
+    response = client.get("/report/missing")
+    assert response.status_code == 200
+
+    parsed = response.get_json()
+    assert parsed == [
+        {"subscriber_id": 100001, "newspaper_id": 100, "issue_id": issue2.issue_id},
+        {"subscriber_id": 100002, "newspaper_id": 100, "issue_id": issue1.issue_id},
+        {"subscriber_id": 100002, "newspaper_id": 100, "issue_id": issue2.issue_id},
+    ]
+
+
+def test_missing_report_empty(client, agency):
+    response = client.get("/report/missing")
+    assert response.status_code == 200
+    assert response.get_json() == []
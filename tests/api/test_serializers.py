@@ -0,0 +1,110 @@
+import json
+
+import pytest
+from flask_restx import marshal
+
+from ..fixtures import app, client, agency
+from ...src.api.editorNS import editor_model
+from ...src.api.newspaperNS import issue_model, paper_model
+from ...src.api.serializers import orjson, serializer_for
+from ...src.api.subscriberNS import subscriber_model
+from ...src.app import create_app
+from ...src.model.editor import Editor
+from ...src.model.issue import Issue
+from ...src.model.newspaper import Newspaper
+from ...src.model.subscriber import Subscriber
+
+
+def entities():
+    issue = Issue(issue_id=1000, release_date="14.04.2024", number_of_pages=10)
+    # an issue without editor and with missing values
+    blank = Issue(issue_id=1001, release_date=None, number_of_pages=None)
+    blank.released = None
+    return [
+        (paper_model, Newspaper(paper_id=1, name="The New York Times", frequency=7, price=13.14)),
+        (paper_model, Newspaper(paper_id=2, name="Heute", frequency=1, price=0)),
+        (issue_model, issue),
+        (issue_model, blank),
+        (editor_model, Editor(editor_id=10000, editor_name="Ana", address="San Francisco")),
+        (subscriber_model, Subscriber(subscriber_id=100000, name="Max", address="Vienna")),
+        (subscriber_model, {"subscriber_id": 100001, "subscriber_name": "Eva"}),
+    ]
+
+
+@pytest.mark.parametrize("model, entity", entities())
+def test_serializer_is_byte_compatible_with_marshal(model, entity):
+    serializer = serializer_for(model)
+    expected = marshal(entity, model, envelope="envelope")
+
+    assert json.dumps(serializer.envelope(entity, "envelope")) == json.dumps(expected)
+    assert json.dumps(serializer.envelope([entity, entity], "envelope")) == \
+        json.dumps(marshal([entity, entity], model, envelope="envelope"))
+
+
+def test_serialized_responses_match_marshal(client, agency):
+    response = client.get('/newspaper/')
+    expected = marshal(list(agency.newspapers), paper_model, envelope='newspapers')
+    assert response.get_data(as_text=True) == json.dumps(expected) + "\n"
+
+    paper = agency.newspapers[0]
+    response = client.get(f'/newspaper/{paper.paper_id}')
+    assert response.get_data(as_text=True) == json.dumps(marshal(paper, paper_model, envelope='newspaper')) + "\n"
+
+    # field masks are still applied
+    response = client.get(f'/newspaper/{paper.paper_id}', headers={"X-Fields": "name"})
+    assert response.get_json() == {"newspaper": {"name": paper.name}}
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_fast_json_encoder(agency):
+    client = create_app(fast_json=True).test_client()
+
+    response = client.get('/newspaper/')
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.get_json() == marshal(list(agency.newspapers), paper_model, envelope='newspapers')
+
+
+def test_issue_listing_joins_cached_fragments(client, agency):
+    paper = agency.newspapers[0]
+    for pages in range(1, 4):
+        client.post(f"/newspaper/{paper.paper_id}/issue",
+                    json={"release_date": "14.04.2024", "number_of_pages": pages, "released": False})
+    issues = list(paper.issues)
+
+    response = client.get(f"/newspaper/{paper.paper_id}/issue")
+    assert response.get_data(as_text=True) == json.dumps(marshal(issues, issue_model, envelope="issue")) + "\n"
+    assert all(issue.fragment is not None for issue in issues)
+
+    # pages carry the cursor behind the joined fragments
+    response = client.get(f"/newspaper/{paper.paper_id}/issue", query_string={"limit": 2})
+    parsed = response.get_json()
+    assert parsed["issue"] == marshal(issues[:2], issue_model)
+    assert parsed["next_cursor"] is not None
+    assert response.get_data(as_text=True) == json.dumps(
+        {"issue": marshal(issues[:2], issue_model), "next_cursor": parsed["next_cursor"]}) + "\n"
+
+
+def test_issue_fragment_is_invalidated_on_changes(client, agency):
+    paper = agency.newspapers[0]
+    client.post(f"/newspaper/{paper.paper_id}/issue",
+                json={"release_date": "14.04.2024", "number_of_pages": 10, "released": False})
+    issue = list(paper.issues)[-1]
+    editor = Editor(editor_id=10000, editor_name="Ana", address="San Francisco")
+    agency.add_editor(editor)
+
+    def listed():
+        response = client.get(f"/newspaper/{paper.paper_id}/issue")
+        return {item["issue_id"]: item for item in response.get_json()["issue"]}[issue.issue_id]
+
+    assert not listed()["released"]
+
+    client.post(f"/newspaper/{paper.paper_id}/issue/{issue.issue_id}/release")
+    assert listed()["released"]
+
+    issue.set_editor(editor.editor_id)
+    assert listed()["editor_id"] == editor.editor_id
+
+    issue.number_of_pages = 12
+    assert listed()["number_of_pages"] == 12
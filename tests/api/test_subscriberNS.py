@@ -1,3 +1,5 @@
+import json
+
 # import the fixtures (this is necessary!)
 from ..fixtures import app, client, agency
 
@@ -219,3 +221,35 @@ def test_subscriber_missing_issues(client, agency):
     response = client.get('/subscriber/1/missingissues')
     assert "A subscriber with ID 1 doesn't exist!" in response.get_data(as_text=True)
 
+
+
+def test_add_subscribers_bulk(client, agency):
+    sub_count_before = len(agency.subscribers)
+    response = client.post("/subscriber/bulk",
+                           json=[{"subscriber_name": "Gabriela", "subscriber_address": "San Francisco"},
+                                 {"subscriber_name": "Carla", "subscriber_address": "Vienna"}])
+    assert response.status_code == 200
+
+    parsed = response.get_json()
+    assert parsed["created"] == 2
+    subscriber_ids = [result["subscriber"]["subscriber_id"] for result in parsed["results"]]
+    assert all(agency.get_subscriber(subscriber_id) is not None for subscriber_id in subscriber_ids)
+    assert len(agency.subscribers) == sub_count_before + 2
+
+
+def test_stream_subscribers_as_ndjson(client, agency, monkeypatch):
+    from ...src.api import streaming
+    # use small chunks, so the stream spans several pages
+    monkeypatch.setattr(streaming, "STREAM_CHUNK_SIZE", 2)
+
+    response = client.get('/subscriber/', headers={"Accept": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    subscriber_ids = [json.loads(line)["subscriber_id"] for line in lines]
+    assert subscriber_ids == [subscriber.subscriber_id for subscriber in agency.subscribers]
+
+    # a plain request still gets the JSON listing
+    response = client.get('/subscriber/')
+    assert response.mimetype == "application/json"
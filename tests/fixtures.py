@@ -3,6 +3,7 @@ import pytest
 
 from ..src.app import create_app
 from ..src.model.agency import Agency
+from ..src.model.storage import MemoryStorage, SqliteStorage
 from .testdata import populate
 
 
@@ -27,3 +28,10 @@ def agency(app):
     populate(agency)
     yield agency
 
+
+# Every storage engine, for the tests which have to pass on all of them
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    engine = MemoryStorage() if request.param == "memory" else SqliteStorage(str(tmp_path / "agency.db"))
+    yield engine
+    engine.close()
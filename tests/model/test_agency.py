@@ -4,7 +4,19 @@ from ...src.model.newspaper import Newspaper
 from ...src.model.issue import Issue
 from ...src.model.editor import Editor
 from ...src.model.subscriber import Subscriber
-from ..fixtures import app, client, agency
+from ...src.model.agency import Agency
+from ...src.model.cascade import CascadeReport
+from ..fixtures import app, client, storage
+from ..testdata import populate
+
+
+# The whole suite runs against every storage engine
+@pytest.fixture()
+def agency(app, storage):
+    Agency.singleton_instance = Agency(storage=storage)
+    agency = Agency.get_instance()
+    populate(agency)
+    yield agency
 
 
 # Tests for newspaper
@@ -134,6 +146,49 @@ def test_remove_newspaper(agency):
     assert len(new_paper.issues) == 0
 
 
+def test_remove_newspaper_reports_the_cascade(agency):
+    daily = Newspaper(paper_id=998, name="Daily", frequency=1, price=1)
+    weekly = Newspaper(paper_id=999, name="Weekly", frequency=7, price=2)
+    agency.add_newspapers([daily, weekly])
+    daily_issues = agency.add_issues_to_newspaper(daily.paper_id, [{"release_date": "14.04.2024",
+                                                                    "number_of_pages": 10}] * 3)
+    weekly_issue = agency.add_issue_to_newspaper(weekly.paper_id, {"release_date": "14.04.2024",
+                                                                   "number_of_pages": 20})
+    ana = Editor(editor_id=10000, editor_name="Ana", address="Vienna")
+    bob = Editor(editor_id=10001, editor_name="Bob", address="Graz")
+    agency.add_editors([ana, bob])
+    agency.specify_editor(daily.paper_id, daily_issues[0].issue_id, ana.editor_id)
+    agency.specify_editor(daily.paper_id, daily_issues[1].issue_id, ana.editor_id)
+    agency.specify_editor(weekly.paper_id, weekly_issue.issue_id, ana.editor_id)
+    # Bob holds an issue of the daily without editing the paper itself
+    bob.issues.append(daily_issues[2])
+    assert agency.paper_editors[daily.paper_id] == {ana.editor_id}
+    assert agency.issue_editors[daily.paper_id] == {ana.editor_id: 2, bob.editor_id: 1}
+
+    agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                            for sub_id in (100001, 100002)])
+    for sub_id in (100001, 100002):
+        agency.subscribe(daily.paper_id, sub_id)
+    agency.subscribe(weekly.paper_id, 100001)
+    agency.release_issue(daily.paper_id, daily_issues[0].issue_id)
+    agency.deliver_issue_to_all(daily.paper_id, daily_issues[0].issue_id)
+    agency.release_issue(weekly.paper_id, weekly_issue.issue_id)
+    agency.deliver_issue(weekly.paper_id, weekly_issue.issue_id, 100001)
+
+    report = agency.remove_newspaper(daily)
+    assert report == CascadeReport(paper_id=daily.paper_id, editors=2, editor_issues=3, subscriptions=2,
+                                   deliveries=2, issues=3)
+
+    # The weekly is untouched
+    assert ana.newspapers == [weekly] and ana.issues == [weekly_issue]
+    assert bob.issues == []
+    assert daily.paper_id not in agency.paper_editors and daily.paper_id not in agency.issue_editors
+    assert agency.paper_editors[weekly.paper_id] == {ana.editor_id}
+    assert agency.issue_editors[weekly.paper_id] == {ana.editor_id: 1}
+    assert list(agency.get_subscriber(100001).subscriptions) == [weekly.paper_id]
+    assert agency.deliveries.count(100001, weekly.paper_id) == 1
+
+
 def test_get_newspaper_stats(agency):
     new_paper = Newspaper(paper_id=999,
                           name="Simpsons Comic",
@@ -525,6 +580,89 @@ def test_transfer_issues_no_other_editor(agency):
     assert new_issue.editor_id is None
 
 
+def test_transfer_issues_balances_the_load(agency):
+    paper = Newspaper(paper_id=999, name="Daily", frequency=1, price=1)
+    agency.add_newspaper(paper)
+    issues = agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                              "number_of_pages": 10}] * 12)
+    senior, busy, idle = (Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                          for editor_id in (10000, 10001, 10002))
+    agency.add_editors([senior, busy, idle])
+    for issue in issues[:10]:
+        agency.specify_editor(paper.paper_id, issue.issue_id, senior.editor_id)
+    for issue in issues[10:]:
+        agency.specify_editor(paper.paper_id, issue.issue_id, busy.editor_id)
+    agency.add_newspaper_to_editor(paper.paper_id, idle.editor_id)
+
+    transferred = agency.transfer_issues(senior)
+
+    # The idle editor catches up first, then they take turns
+    assert len(transferred) == 10
+    assert list(transferred.values()).count(idle.editor_id) == 6
+    assert list(transferred.values()).count(busy.editor_id) == 4
+    assert len(busy.issues) == len(idle.issues) == 6
+    for (paper_id, issue_id), editor_id in transferred.items():
+        issue = agency.get_issue(paper_id, issue_id)
+        assert issue.editor_id == editor_id
+        assert issue in agency.get_editor(editor_id).issues
+    # The issues left the senior editor
+    assert senior.issues == []
+    assert agency.issue_editors[paper.paper_id] == {busy.editor_id: 6, idle.editor_id: 6}
+
+
+def test_unassigned_issues_are_indexed(agency):
+    paper = Newspaper(paper_id=999, name="Daily", frequency=1, price=1)
+    agency.add_newspaper(paper)
+    issues = agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                              "number_of_pages": 10}] * 3)
+    editor = Editor(editor_id=10000, editor_name="Ana", address="Vienna")
+    agency.add_editor(editor)
+    assert all(issue in agency.unassigned_issues() for issue in issues)
+
+    agency.specify_editor(paper.paper_id, issues[0].issue_id, editor.editor_id)
+    assert issues[0] not in agency.unassigned_issues()
+    # The transfer leaves issues without a colleague unassigned
+    agency.transfer_issues(editor)
+    assert issues[0] in agency.unassigned_issues()
+
+    page, cursor = agency.unassigned_issues_page(None, 1)
+    assert len(page) == 1 and cursor is not None
+
+    agency.remove_newspaper(paper)
+    assert not any(issue in agency.unassigned_issues() for issue in issues)
+
+
+def test_auto_assign_issues(agency):
+    paper, empty = (Newspaper(paper_id=paper_id, name="Daily", frequency=1, price=1) for paper_id in (999, 998))
+    agency.add_newspapers([paper, empty])
+    issues = agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "14.04.2024",
+                                                              "number_of_pages": 10}] * 6)
+    stranded = agency.add_issue_to_newspaper(empty.paper_id, {"release_date": "14.04.2024", "number_of_pages": 10})
+    busy, idle = (Editor(editor_id=editor_id, editor_name="Ana", address="Vienna") for editor_id in (10000, 10001))
+    agency.add_editors([busy, idle])
+    agency.specify_editor(paper.paper_id, issues[0].issue_id, busy.editor_id)
+    agency.specify_editor(paper.paper_id, issues[1].issue_id, busy.editor_id)
+    agency.add_newspaper_to_editor(paper.paper_id, idle.editor_id)
+
+    assigned = agency.auto_assign_issues(paper.paper_id)
+
+    # The idle editor catches up first, then they take turns
+    assert len(assigned) == 4
+    assert list(assigned.values()).count(idle.editor_id) == 3
+    assert len(busy.issues) == 3 and len(idle.issues) == 3
+    for (paper_id, issue_id), editor_id in assigned.items():
+        issue = agency.get_issue(paper_id, issue_id)
+        assert issue.editor_id == editor_id
+        assert issue in agency.get_editor(editor_id).issues
+    assert not any(issue in agency.unassigned_issues() for issue in issues)
+    # Without editors, the issue stays unassigned
+    assert agency.auto_assign_issues(empty.paper_id) == {}
+    assert stranded in agency.unassigned_issues()
+
+    with pytest.raises(ValueError):
+        agency.auto_assign_issues(12345)
+
+
 def test_editor_issues(agency):
     new_editor = Editor(editor_id=10000,
                         editor_name="Ana",
@@ -710,3 +848,228 @@ def test_missing_issues(agency):
     # Not delivered yet
     missing = agency.missing_issues(new_subscriber.subscriber_id)
     assert len(missing) == 1
+
+
+def test_add_issue_skips_taken_ids(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    # An issue added with an explicit ID
+    new_paper.issues.append(Issue(issue_id=1000,
+                                  release_date="14.04.2024",
+                                  number_of_pages=10))
+
+    issue_data = {"release_date": "14.04.2024",
+                  "number_of_pages": 10}
+    new_issue = agency.add_issue_to_newspaper(new_paper.paper_id, issue_data)
+    assert new_issue.issue_id != 1000
+    assert agency.get_issue(new_paper.paper_id, new_issue.issue_id) is new_issue
+
+
+def test_add_issue_goes_past_9999(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    new_paper.issue_ids.advance(9999)
+    subscriber = Subscriber(subscriber_id=agency.new_subscriber_id(), name="Reader", address="Vienna")
+    agency.add_subscriber(subscriber)
+    agency.subscribe(new_paper.paper_id, subscriber.subscriber_id)
+
+    issue_data = {"release_date": "14.04.2024",
+                  "number_of_pages": 10}
+    issues = agency.add_issues_to_newspaper(new_paper.paper_id, [issue_data] * 2)
+    assert [issue.issue_id for issue in issues] == [9999, 10000]
+    agency.release_issue(new_paper.paper_id, 10000)
+    agency.deliver_issue(new_paper.paper_id, 10000, subscriber.subscriber_id)
+    assert agency.get_issue(new_paper.paper_id, 10000) is issues[1]
+    assert agency.deliveries.issue_ids_for(subscriber.subscriber_id, new_paper.paper_id) == {10000}
+    assert agency.missing_issues(subscriber.subscriber_id) == []
+
+
+def test_add_issue_when_ids_are_exhausted_should_raise_error(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    # Shrink the ID space to a single ID
+    new_paper.issue_ids.high = new_paper.issue_ids.low
+
+    issue_data = {"release_date": "14.04.2024",
+                  "number_of_pages": 10}
+    agency.add_issue_to_newspaper(new_paper.paper_id, dict(issue_data))
+    with pytest.raises(ValueError,
+                       match="The newspaper with ID 999 has no issue IDs left!"):
+        agency.add_issue_to_newspaper(new_paper.paper_id, dict(issue_data))
+
+
+def test_newspaper_stats_follow_subscriber_changes(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    new_subscriber = Subscriber(subscriber_id=100001,
+                                name="Gabriela",
+                                address="San Francisco")
+    agency.add_subscriber(new_subscriber)
+    agency.subscribe(new_paper.paper_id, new_subscriber.subscriber_id)
+    assert agency.get_newspaper_stats(new_paper.paper_id)["number_of_subscribers"] == 1
+
+    # Removing the subscriber stops the subscription
+    agency.remove_subscriber(new_subscriber)
+    assert agency.get_newspaper_stats(new_paper.paper_id)["number_of_subscribers"] == 0
+    assert agency.subscribers_of(new_paper.paper_id) == []
+
+
+def test_remove_newspaper_clears_subscriber_index(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    new_subscriber = Subscriber(subscriber_id=100001,
+                                name="Gabriela",
+                                address="San Francisco")
+    agency.add_subscriber(new_subscriber)
+    agency.subscribe(new_paper.paper_id, new_subscriber.subscriber_id)
+
+    agency.remove_newspaper(new_paper)
+    assert new_paper.paper_id not in agency.paper_subscribers
+    assert len(new_subscriber.subscriptions) == 0
+
+
+def test_newspaper_stats_follow_price_updates(agency):
+    agency.verify_stats = True
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    for subscriber_id in (100001, 100002):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id,
+                                         name="Gabriela",
+                                         address="San Francisco"))
+        agency.subscribe(new_paper.paper_id, subscriber_id)
+
+    assert agency.update_newspaper(new_paper, price=2.5)
+    statistics = agency.get_newspaper_stats(new_paper.paper_id)
+    assert statistics["number_of_subscribers"] == 2
+    assert statistics["monthly_revenue"] == 5
+    assert statistics["annual_revenue"] == 60
+
+    # Nothing to update
+    assert not agency.update_newspaper(new_paper)
+
+
+def test_newspaper_stats_verification_detects_stale_counters(agency):
+    agency.verify_stats = True
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    new_subscriber = Subscriber(subscriber_id=100001,
+                                name="Gabriela",
+                                address="San Francisco")
+    agency.add_subscriber(new_subscriber)
+    agency.subscribe(new_paper.paper_id, new_subscriber.subscriber_id)
+
+    # Bypass the agency when changing the price
+    new_paper.price = 3
+    with pytest.raises(RuntimeError,
+                       match="Stats of newspaper 999 are out of sync"):
+        agency.get_newspaper_stats(new_paper.paper_id)
+
+
+def recompute_missing_issue_ids(agency, subscriber):
+    # The missing issues, computed from scratch
+    missing = []
+    for paper_id in subscriber.subscriptions:
+        newspaper = agency.get_newspaper(paper_id)
+        for issue in newspaper.issues:
+            if issue.released and issue not in subscriber.delivered_issues:
+                missing.append((paper_id, issue.issue_id))
+    return missing
+
+
+def test_missing_issues_backlog_matches_recomputation(agency):
+    import random
+    rng = random.Random(7)
+    papers = [Newspaper(paper_id=paper_id, name="Paper", frequency=1, price=1) for paper_id in (901, 902, 903)]
+    for paper in papers:
+        agency.add_newspaper(paper)
+    subscribers = [Subscriber(subscriber_id=subscriber_id, name="Reader", address="Vienna")
+                   for subscriber_id in range(100001, 100011)]
+    for subscriber in subscribers:
+        agency.add_subscriber(subscriber)
+
+    issues = []
+    for step in range(400):
+        action = rng.random()
+        paper = rng.choice(papers)
+        subscriber = rng.choice(subscribers)
+        if action < 0.2:
+            issues.append(agency.add_issue_to_newspaper(paper.paper_id, {"release_date": "14.04.2024",
+                                                                         "number_of_pages": 10}))
+        elif action < 0.4 and issues:
+            issue = rng.choice(issues)
+            if not issue.released:
+                agency.release_issue(issue.paper_id, issue.issue_id)
+        elif action < 0.6:
+            agency.subscribe(paper.paper_id, subscriber.subscriber_id)
+        elif action < 0.9 and issues:
+            issue = rng.choice(issues)
+            if issue.released:
+                agency.deliver_issue(issue.paper_id, issue.issue_id, subscriber.subscriber_id)
+        elif paper.paper_id in subscriber.subscriptions:
+            subscriber.subscriptions.remove(paper.paper_id)
+
+        for checked in subscribers:
+            missing = agency.missing_issues(checked.subscriber_id)
+            assert [(item["newspaper_id"], item["issue_id"]) for item in missing] == \
+                recompute_missing_issue_ids(agency, checked)
+
+    # The agency-wide report agrees with the backlogs
+    report = {(subscriber_id, block.paper_id, issue_id)
+              for block in agency.missing_report()
+              for subscriber_id, issue_id in zip(block.subscriber_ids.tolist(), block.issue_ids.tolist())}
+    assert report == {(subscriber.subscriber_id, paper_id, issue_id)
+                      for subscriber in subscribers
+                      for paper_id, issue_id in recompute_missing_issue_ids(agency, subscriber)}
+
+
+def test_deliver_issue_to_all(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    issue_data = {"release_date": "14.04.2024",
+                  "number_of_pages": 10}
+    new_issue = agency.add_issue_to_newspaper(new_paper.paper_id, issue_data)
+    for subscriber_id in (100001, 100002, 100003):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id,
+                                         name="Gabriela",
+                                         address="San Francisco"))
+        agency.subscribe(new_paper.paper_id, subscriber_id)
+
+    with pytest.raises(ValueError,
+                       match=f"Issue with ID {new_issue.issue_id} has not been released yet!"):
+        agency.deliver_issue_to_all(new_paper.paper_id, new_issue.issue_id)
+
+    agency.release_issue(new_paper.paper_id, new_issue.issue_id)
+    agency.deliver_issue(new_paper.paper_id, new_issue.issue_id, 100002)
+
+    result = agency.deliver_issue_to_all(new_paper.paper_id, new_issue.issue_id, batch_size=2)
+    assert result["delivered"] == 2
+    assert result["already_delivered"] == 1
+    assert result["batches"] == [{"delivered": 1, "already_delivered": 1, "unknown_subscribers": 0},
+                                 {"delivered": 1, "already_delivered": 0, "unknown_subscribers": 0}]
+    for subscriber_id in (100001, 100002, 100003):
+        assert new_issue in agency.get_subscriber(subscriber_id).delivered_issues
+        assert agency.missing_issues(subscriber_id) == []
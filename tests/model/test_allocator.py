@@ -0,0 +1,67 @@
+import pytest
+
+from ...src.model.allocator import EDITOR, ISSUE, NEWSPAPER, IdAllocator, IdService
+
+
+def test_allocator_skips_taken_ids():
+    allocator = IdAllocator(1, 5)
+    taken = {1, 3}
+    assert [allocator.allocate(taken.__contains__) for _ in range(3)] == [2, 4, 5]
+    with pytest.raises(ValueError, match="No free IDs left between 1 and 5!"):
+        allocator.allocate(taken.__contains__)
+
+
+def test_allocator_block_is_all_or_nothing():
+    allocator = IdAllocator(1, 5)
+    assert allocator.allocate_block(2, lambda _: False) == [1, 2]
+    with pytest.raises(ValueError, match="Not enough free IDs left between 1 and 5!"):
+        allocator.allocate_block(4, lambda _: False)
+    assert allocator.allocate_block(3, lambda _: False) == [3, 4, 5]
+
+
+def test_service_ranges_can_be_configured():
+    ids = IdService({NEWSPAPER: (1, None)})
+    newspaper_ids = ids.reserve(NEWSPAPER, 5000, lambda _: False)
+    assert newspaper_ids[0] == 1 and newspaper_ids[-1] == 5000
+    # the other kinds keep their default ranges
+    assert ids.next_id(EDITOR, lambda _: False) == 10000
+
+
+def test_service_ranges_are_open_ended_by_default():
+    ids = IdService()
+    assert ids.reserve(NEWSPAPER, 5000, lambda _: False)[-1] == 5000
+    # issue IDs are packed into 32 bits, they keep their limit
+    assert ids.ranges[ISSUE] == (1000, 2 ** 32 - 1)
+
+
+def test_service_ranges_can_be_changed_later():
+    ids = IdService()
+    ids.reserve(NEWSPAPER, 10, lambda _: False)
+    ids.configure({NEWSPAPER: (5, 12)})
+    assert ids.reserve(NEWSPAPER, 2, lambda _: False) == [11, 12]
+    with pytest.raises(ValueError):
+        ids.next_id(NEWSPAPER, lambda _: False)
+    ids.configure({EDITOR: (50000, None)})
+    assert ids.next_id(EDITOR, lambda _: False) == 50000
+
+
+def test_service_restores_its_state():
+    ids = IdService()
+    ids.reserve(NEWSPAPER, 10, lambda _: False)
+    issue_ids = IdAllocator(0, 0)
+    ids.attach(issue_ids, ISSUE, 1)
+    issue_ids.allocate(lambda _: False)
+    state = ids.state()
+    assert state == {NEWSPAPER: 11, f"{ISSUE}:1": 1001}
+
+    restored = IdService()
+    restored.restore(state)
+    assert restored.next_id(NEWSPAPER, lambda _: False) == 11
+    # sequences created later continue where they were
+    issue_ids = IdAllocator(1000, 9999)
+    restored.attach(issue_ids, ISSUE, 1)
+    assert issue_ids.allocate(lambda _: False) == 1001
+
+    # restoring an older state never hands out IDs twice
+    restored.restore({NEWSPAPER: 3})
+    assert restored.next_id(NEWSPAPER, lambda _: False) == 12
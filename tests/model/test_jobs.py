@@ -0,0 +1,88 @@
+import pytest
+
+from ...src.model.jobs import JobQueue, FINISHED, FAILED
+from ...src.model.newspaper import Newspaper
+from ...src.model.subscriber import Subscriber
+from ..fixtures import app, client, agency
+
+
+@pytest.fixture()
+def released_issue(agency):
+    new_paper = Newspaper(paper_id=999,
+                          name="Simpsons Comic",
+                          frequency=7,
+                          price=1)
+    agency.add_newspaper(new_paper)
+    issue = agency.add_issue_to_newspaper(new_paper.paper_id, {"release_date": "14.04.2024",
+                                                                "number_of_pages": 10})
+    agency.release_issue(new_paper.paper_id, issue.issue_id)
+    for subscriber_id in range(100001, 100011):
+        agency.add_subscriber(Subscriber(subscriber_id=subscriber_id, name="Gabriela", address="San Francisco"))
+        agency.subscribe(new_paper.paper_id, subscriber_id)
+    yield issue
+
+
+@pytest.fixture()
+def job_queue(agency):
+    # Makes job queues on the agency, their workers are stopped after the test even if it fails
+    queues = []
+
+    def make(**options):
+        queues.append(JobQueue(lambda: agency, **options))
+        return queues[-1]
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+
+def test_fanout_job_delivers_in_chunks(agency, released_issue, job_queue):
+    jobs = job_queue(workers=2)
+    job = jobs.submit(999, released_issue.issue_id, chunk_size=3)
+    jobs.join()
+
+    assert job.status == FINISHED
+    assert job.total == 10
+    assert job.processed == 10
+    assert job.delivered == 10
+    assert agency.missing_issues(100001) == []
+
+
+def test_failed_job_reports_error(agency, released_issue, job_queue):
+    jobs = job_queue(workers=1)
+    job = jobs.submit(999, 1, subscriber_ids=[100001])
+    jobs.join()
+
+    assert job.status == FAILED
+    assert job.errors == ["An issue with ID 1 doesn't exist!"]
+
+
+def test_chunk_size_has_to_be_positive(agency, released_issue, job_queue):
+    jobs = job_queue(workers=1)
+    for chunk_size in (0, -1):
+        with pytest.raises(ValueError, match="at least 1"):
+            jobs.submit(999, released_issue.issue_id, chunk_size=chunk_size)
+    assert jobs.all_jobs() == []
+
+
+def test_old_jobs_are_evicted(agency, released_issue, job_queue):
+    jobs = job_queue(workers=1, max_jobs=3)
+    submitted = []
+    for subscriber_id in range(100001, 100006):
+        submitted.append(jobs.submit(999, released_issue.issue_id, subscriber_ids=[subscriber_id]))
+        jobs.join()
+
+    assert [job.job_id for job in jobs.all_jobs()] == [job.job_id for job in submitted[-3:]]
+    assert jobs.get_job(submitted[0].job_id) is None
+
+
+def test_shutdown_drains_the_queue(agency, released_issue, job_queue):
+    jobs = job_queue(workers=1)
+    submitted = [jobs.submit(999, released_issue.issue_id, subscriber_ids=[subscriber_id])
+                 for subscriber_id in range(100001, 100011)]
+    jobs.shutdown(wait=True)
+
+    assert all(job.status == FINISHED for job in submitted)
+    with pytest.raises(ValueError,
+                       match="The job queue has been shut down!"):
+        jobs.submit(999, released_issue.issue_id)
@@ -0,0 +1,74 @@
+from ...src.model.ledger import DeliveryLedger
+
+
+def test_record_skips_duplicate_deliveries():
+    ledger = DeliveryLedger()
+    assert ledger.record(100001, 999, 1000)
+    assert not ledger.record(100001, 999, 1000)
+    assert ledger.record(100002, 999, 1000)
+    assert len(ledger) == 2
+
+
+def test_delivered_and_count():
+    ledger = DeliveryLedger()
+    ledger.record(100001, 999, 1000)
+    ledger.record(100001, 999, 1001)
+    ledger.record(100001, 998, 1000)
+
+    assert ledger.delivered(100001, 999, 1001)
+    assert not ledger.delivered(100001, 998, 1001)
+    assert not ledger.delivered(100002, 999, 1000)
+    assert ledger.count(100001, 999) == 2
+    assert ledger.count(100001, 998) == 1
+    assert ledger.issue_ids_for(100001, 999) == {1000, 1001}
+
+
+def test_remove_paper_and_subscriber():
+    ledger = DeliveryLedger()
+    ledger.record(100001, 999, 1000)
+    ledger.record(100001, 998, 1000)
+    ledger.record(100002, 999, 1000)
+
+    assert ledger.remove_paper(999) == 2
+    assert not ledger.delivered(100001, 999, 1000)
+    assert ledger.delivered(100001, 998, 1000)
+    assert ledger.count(100002, 999) == 0
+
+    assert ledger.remove_subscriber(100001) == 1
+    assert len(ledger) == 0
+
+
+def test_compact_keeps_live_rows():
+    ledger = DeliveryLedger()
+    for subscriber_id in range(3000):
+        ledger.record(subscriber_id, 999 if subscriber_id % 2 else 998, 1000)
+    # Removing most rows triggers the compaction
+    ledger.remove_paper(999)
+    for subscriber_id in range(0, 2000, 2):
+        ledger.remove_subscriber(subscriber_id)
+
+    assert len(ledger.subscriber_ids) < 3000
+    assert len(ledger) == 500
+    assert ledger.subscribers_of(998) == set(range(2000, 3000, 2))
+
+
+def test_loaded_rows_are_indexed_on_first_use():
+    ledger = DeliveryLedger()
+    for subscriber_id in range(3000):
+        ledger.record(subscriber_id, 999 if subscriber_id % 2 else 998, 1000)
+        ledger.record(subscriber_id, 998, 1001)
+    loaded = DeliveryLedger()
+    loaded.load(ledger.subscriber_ids, ledger.paper_ids, ledger.issue_ids, ledger.timestamps)
+
+    assert loaded.count(1, 998) == 1 and loaded.count(2, 998) == 2
+    # The rows of subscribers without an index move on compaction
+    loaded.remove_paper(999)
+    for subscriber_id in range(0, 2000, 2):
+        loaded.remove_subscriber(subscriber_id)
+    assert len(loaded.subscriber_ids) < 6000
+    assert loaded.record(2999, 999, 1000)
+    assert list(loaded.deliveries_of(2999)) == [(998, 1001), (999, 1000)]
+    assert loaded.issue_ids_for(2500, 998) == {1000, 1001}
+    assert not loaded.remove_subscriber(0) and loaded.remove(2998, 998, 1001)
+    assert len(loaded) == 2500
+    assert loaded.subscribers_of(998) == set(range(1, 3000, 2)) | set(range(2000, 3000, 2))
@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from ...src.model.agency import Agency
+from ...src.model.issue import Issue
+from ...src.model.locks import ReadWriteLock
+from ...src.model.newspaper import Newspaper
+from ...src.model.subscriber import Subscriber
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read:
+            # Only passes if all three readers hold the lock at the same time
+            inside.wait()
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert not inside.broken
+
+
+def test_writer_waits_for_readers_and_blocks_new_ones():
+    lock = ReadWriteLock()
+    events = []
+    writer_waiting = threading.Event()
+
+    lock.acquire_read()
+
+    def write():
+        writer_waiting.set()
+        with lock.write:
+            events.append("write")
+
+    def read():
+        with lock.read:
+            events.append("read")
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer_waiting.wait()
+    while not lock._waiting_writers:
+        pass
+    # A new reader queues behind the waiting writer
+    reader = threading.Thread(target=read)
+    reader.start()
+    assert events == []
+    lock.release_read()
+    writer.join()
+    reader.join()
+    assert events == ["write", "read"]
+
+
+def test_lock_is_reentrant():
+    lock = ReadWriteLock()
+    with lock.write:
+        with lock.write:
+            # The writer may read
+            with lock.read:
+                pass
+    with lock.read:
+        with lock.read:
+            pass
+    # Everything was released
+    with lock.write:
+        pass
+
+
+def test_read_lock_is_not_upgraded():
+    lock = ReadWriteLock()
+    with lock.read:
+        with pytest.raises(RuntimeError, match="can't be upgraded"):
+            lock.acquire_write()
+
+
+def test_stats_stay_consistent_under_concurrent_writes():
+    agency = Agency(verify_stats=True)
+    paper = Newspaper(paper_id=1, name="Heute", frequency=1, price=2.0)
+    paper.issues.append(Issue(issue_id=1000, release_date="14.04.2024", number_of_pages=8, released=True))
+    agency.add_newspaper(paper)
+    errors = []
+    done = threading.Event()
+
+    def churn(first_id):
+        for sub_id in range(first_id, first_id + 300):
+            sub = Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+            agency.add_subscriber(sub)
+            agency.subscribe(1, sub_id)
+            agency.remove_subscriber(sub)
+
+    def read():
+        # verify_stats recomputes the stats by walking all subscribers, and raises if they differ
+        while not done.is_set():
+            try:
+                agency.get_newspaper_stats(1)
+                list(agency.missing_report())
+            except Exception as err:
+                errors.append(err)
+                return
+
+    writers = [threading.Thread(target=churn, args=(100000 + n * 1000,)) for n in range(2)]
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    for thread in writers + readers:
+        thread.start()
+    for writer in writers:
+        writer.join()
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert agency.get_newspaper_stats(1)["number_of_subscribers"] == 0
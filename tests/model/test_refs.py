@@ -0,0 +1,83 @@
+import pytest
+
+from ...src.model.agency import Agency
+from ...src.model.editor import Editor
+from ...src.model.issue import Issue
+from ...src.model.ledger import pack_key
+from ...src.model.newspaper import Newspaper
+from ...src.model.refs import IdList, resolve_issues, resolve_newspapers, resolve_subscribers
+from ...src.model.subscriber import Subscriber
+
+
+def test_models_have_no_instance_dict():
+    entities = [Issue(issue_id=1000, release_date="14.04.2024", number_of_pages=10),
+                Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0),
+                Editor(editor_id=1, editor_name="Ana", address="Vienna"),
+                Subscriber(subscriber_id=1, name="Reader", address="Vienna")]
+    for entity in entities:
+        assert not hasattr(entity, '__dict__')
+        with pytest.raises(AttributeError):
+            entity.unknown = 1
+
+
+def test_id_list_calls_watchers_with_owner():
+    calls = []
+    ids = IdList("owner", [1, 2])
+    ids.watch(calls, lambda owner, entity_id: calls.append(("add", owner, entity_id)),
+              lambda owner, entity_id: calls.append(("remove", owner, entity_id)))
+    ids.append(3)
+    ids.remove(1)
+    assert calls == [("add", "owner", 3), ("remove", "owner", 1)]
+    assert ids == [2, 3]
+    assert 2 in ids and 1 not in ids and "x" not in ids
+
+    with pytest.raises(ValueError):
+        ids.append(2)
+    with pytest.raises(ValueError):
+        ids.remove(1)
+
+    ids.unwatch(calls)
+    ids.append(4)
+    assert len(calls) == 2
+
+
+def test_editor_stores_ids_and_resolves_through_the_agency():
+    agency = Agency()
+    paper = Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0)
+    agency.add_newspaper(paper)
+    issue = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    # An issue of no newspaper can't be found by its ID, the editor keeps the object
+    loose = Issue(issue_id=5000, release_date="14.04.2024", number_of_pages=10)
+
+    editor = Editor(editor_id=1, editor_name="Ana", address="Vienna")
+    editor.newspapers.append(paper)
+    editor.issues.append(issue)
+    agency.add_editor(editor)
+    editor.issues.append(loose)
+
+    assert list(editor.newspapers.ids) == [1]
+    assert list(editor.issues.ids) == [pack_key(1, issue.issue_id)]
+    assert editor.issues == [issue, loose]
+    assert issue in editor.issues and loose in editor.issues
+
+    editor.issues.remove(issue)
+    assert issue not in editor.issues
+    editor.issues = [issue]
+    assert editor.issues == [issue]
+
+    # Once removed from the agency, the editor keeps the objects
+    agency.remove_editor(editor)
+    assert editor.newspapers == [paper]
+    assert editor.issues == [issue]
+
+
+def test_resolve_helpers():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    issue = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    agency.add_subscriber(Subscriber(subscriber_id=7, name="Reader", address="Vienna"))
+
+    # Unknown IDs are left out
+    assert resolve_newspapers(agency, [1, 2]) == [agency.get_newspaper(1)]
+    assert resolve_issues(agency, [pack_key(1, issue.issue_id), pack_key(2, 1000)]) == [issue]
+    assert resolve_subscribers(agency, [7, 8]) == [agency.get_subscriber(7)]
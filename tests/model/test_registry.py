@@ -0,0 +1,89 @@
+from operator import attrgetter
+
+import pytest
+
+from ...src.model.newspaper import Newspaper
+from ...src.model.registry import Registry
+
+
+def make_paper(paper_id):
+    return Newspaper(paper_id=paper_id, name=f"Paper {paper_id}", frequency=7, price=1.0)
+
+
+def test_registry_keeps_insertion_order():
+    papers = [make_paper(paper_id) for paper_id in (5, 1, 3)]
+    registry = Registry(attrgetter('paper_id'), papers)
+    assert list(registry) == papers
+    assert registry[1] == papers[1]
+    assert registry == papers
+
+
+def test_registry_lookup_and_remove():
+    paper1 = make_paper(1)
+    paper2 = make_paper(2)
+    registry = Registry(attrgetter('paper_id'), [paper1, paper2])
+
+    assert registry.get(2) is paper2
+    assert registry.get(3) is None
+    assert paper1 in registry
+
+    registry.remove(paper1)
+    assert paper1 not in registry
+    assert registry.get(1) is None
+    assert len(registry) == 1
+
+    with pytest.raises(ValueError):
+        registry.remove(paper1)
+
+
+def test_registry_rejects_duplicate_ids():
+    registry = Registry(attrgetter('paper_id'), [make_paper(1)])
+    with pytest.raises(ValueError,
+                       match="An entry with ID 1 already exists!"):
+        registry.append(make_paper(1))
+
+
+def test_registry_other_object_with_same_id_is_not_contained():
+    registry = Registry(attrgetter('paper_id'), [make_paper(1)])
+    assert make_paper(1) not in registry
+
+
+def test_registry_page_is_stable_across_removals():
+    papers = [make_paper(paper_id) for paper_id in range(1, 11)]
+    registry = Registry(attrgetter('paper_id'), papers)
+
+    first, cursor = registry.page(None, 4)
+    assert [paper.paper_id for paper in first] == [1, 2, 3, 4]
+
+    # removing the last entity of the page and one of the next page must not skip or repeat anything
+    registry.remove(papers[3])
+    registry.remove(papers[5])
+    registry.append(make_paper(11))
+    second, cursor = registry.page(cursor, 4)
+    assert [paper.paper_id for paper in second] == [5, 7, 8, 9]
+
+    last, cursor = registry.page(cursor, 4)
+    assert [paper.paper_id for paper in last] == [10, 11]
+    assert cursor is None
+
+
+def test_registry_creates_lazy_entries_on_first_use():
+    loaded = []
+    registry = Registry(attrgetter('paper_id'), [make_paper(1)])
+    registry.watch_loads(registry, loaded.append)
+    registry.extend_lazy([4, 2, 3], make_paper)
+
+    assert len(registry) == 4 and registry.has_key(2) and registry.pending(2)
+    assert registry.keys() == [1, 4, 2, 3]
+    paper = registry.get(2)
+    assert paper.paper_id == 2 and registry.get(2) is paper
+    assert loaded == [paper] and not registry.pending(2)
+
+    registry.remove(registry.get(4))
+    page, cursor = registry.page(None, 2)
+    assert [paper.paper_id for paper in page] == [1, 2]
+    assert [paper.paper_id for paper in registry.page(cursor, 2)[0]] == [3]
+    assert registry.loader is None and [paper.paper_id for paper in loaded] == [2, 4, 3]
+
+    with pytest.raises(ValueError, match="unique"):
+        registry.extend_lazy([5, 1], make_paper)
@@ -0,0 +1,127 @@
+import time
+
+from ...src.model.agency import Agency
+from ...src.model.jobs import JobQueue, FINISHED
+from ...src.model.newspaper import Newspaper
+from ...src.model.scheduler import ReleaseScheduler, parse_release_date
+from ...src.model.subscriber import Subscriber
+
+
+class FakeClock(object):
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_release_date():
+    assert parse_release_date("14.04.2024") == parse_release_date("14.04.2024 00:00")
+    assert parse_release_date("14.04.2024 12:30") - parse_release_date("14.04.2024") == 12.5 * 3600
+    assert parse_release_date("2024-04-14") is None
+    assert parse_release_date(None) is None
+
+
+def test_releases_the_issues_which_are_due():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    early, late, removed = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 10},
+                                                              {"release_date": "15.04.2024", "number_of_pages": 10},
+                                                              {"release_date": "14.04.2024", "number_of_pages": 10}])
+    clock = FakeClock(parse_release_date("13.04.2024"))
+    scheduler = ReleaseScheduler(agency, clock=clock)
+    assert scheduler.pending == 3
+    assert scheduler.next_due() == parse_release_date("14.04.2024")
+
+    # Nothing is due yet, removed issues are dropped
+    assert scheduler.run_due() == 0
+    agency.get_newspaper(1).issues.remove(removed)
+    clock.now = parse_release_date("14.04.2024") + 5
+    assert scheduler.run_due() == 1
+    assert early.released and not late.released
+
+    # Issues released by hand or added later are followed too
+    agency.release_issue(1, late.issue_id)
+    added = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    assert scheduler.pending == 1
+    assert scheduler.run_due() == 1
+    assert added.released
+
+    metrics = scheduler.metrics()
+    assert metrics["released"] == 2 and metrics["pending"] == 0
+    assert metrics["overdue"] == 1
+    assert metrics["lag"]["max"] == 5
+    scheduler.stop()
+
+
+def test_issues_are_released_again_after_a_failure():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    first, second = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 10}] * 2)
+    due = parse_release_date("14.04.2024")
+    clock = FakeClock(due - 60)
+    scheduler = ReleaseScheduler(agency, clock=clock)
+    clock.now = due + 1
+
+    release_issues = agency.release_issues
+
+    def fail_once(keys):
+        agency.release_issues = release_issues
+        raise OSError("disk full")
+
+    agency.release_issues = fail_once
+    assert scheduler.run_due() == 0
+    metrics = scheduler.metrics()
+    assert (metrics["failed"], metrics["last_error"], metrics["pending"]) == (2, "disk full", 2)
+    assert not first.released and not second.released
+
+    # Tried again after the delay, the lag counts from the release date
+    assert scheduler.next_due() == due + 1 + ReleaseScheduler.RETRY_DELAY
+    assert scheduler.run_due() == 0
+    clock.now = scheduler.next_due()
+    assert scheduler.run_due() == 2
+    assert first.released and second.released
+    metrics = scheduler.metrics()
+    assert (metrics["released"], metrics["pending"]) == (2, 0)
+    assert metrics["lag"]["max"] == 1 + ReleaseScheduler.RETRY_DELAY
+    scheduler.stop()
+
+def test_thread_wakes_up_for_the_next_release():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    issues = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2099", "number_of_pages": 10}] * 2)
+    scheduler = ReleaseScheduler(agency)
+    scheduler.start()
+
+    # An issue due already moves to the top of the heap and wakes the thread
+    due = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    deadline = time.time() + 5
+    while not due.released and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+
+    assert due.released
+    assert not any(issue.released for issue in issues)
+    assert scheduler.metrics()["running"] is False
+    # Once stopped, the scheduler no longer follows the agency
+    agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    assert scheduler.pending == 2
+
+
+def test_delivers_the_released_issues():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    agency.add_subscriber(Subscriber(subscriber_id=7, name="Reader", address="Vienna"))
+    agency.subscribe(1, 7)
+    issue = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    jobs = JobQueue(lambda: agency, workers=1)
+    scheduler = ReleaseScheduler(agency, jobs=jobs)
+
+    assert scheduler.run_due() == 1
+    jobs.join()
+    assert [job.status for job in jobs.all_jobs()] == [FINISHED]
+    assert agency.missing_issues(7) == []
+    assert issue.released
+    assert scheduler.metrics()["deliveries"] == 1
+    scheduler.stop()
+    jobs.shutdown()
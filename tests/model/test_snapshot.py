@@ -0,0 +1,232 @@
+import pytest
+
+from ...src.model import snapshot as snapshots
+from ...src.model.agency import Agency
+from ...src.model.editor import Editor
+from ...src.model.issue import Issue
+from ...src.model.newspaper import Newspaper
+from ...src.model.snapshot import Snapshotter, load_snapshot, save_snapshot
+from ...src.model.subscriber import Subscriber
+from .test_wal import populate, snapshot
+
+
+def test_agency_is_restored_from_a_snapshot(tmp_path):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    # Values the API never sends, but the model allows
+    agency.add_subscriber(Subscriber(subscriber_id=agency.new_subscriber_id(), name="Zoë Ünal", address=None))
+    save_snapshot(agency, path)
+
+    restored = Agency()
+    info = load_snapshot(path, restored)
+
+    assert snapshot(restored) == snapshot(agency)
+    assert (info.newspapers, info.editors, info.subscribers) == (2, 1, 5)
+    assert info.deliveries == len(agency.deliveries)
+    assert restored.new_paper_id() == agency.new_paper_id()
+    assert restored.new_subscriber_id() == agency.new_subscriber_id()
+
+
+def test_restored_agency_keeps_its_indexes_up_to_date(tmp_path):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    save_snapshot(agency, path)
+    restored = Agency()
+    load_snapshot(path, restored)
+
+    # The same changes on both agencies have the same effect
+    for target in (agency, restored):
+        paper = target.newspapers[0]
+        sub = target.subscribers[2]
+        target.subscribe(target.newspapers[1].paper_id, sub.subscriber_id)
+        sub.subscriptions.remove(paper.paper_id)
+        issue = target.add_issue_to_newspaper(paper.paper_id, {"release_date": "20.04.2024", "number_of_pages": 4})
+        target.release_issue(paper.paper_id, issue.issue_id)
+        target.deliver_issue_to_all(paper.paper_id, issue.issue_id)
+        target.remove_subscriber(target.subscribers[0])
+    assert snapshot(restored) == snapshot(agency)
+
+
+def test_snapshot_and_log_tail_restore_the_agency(tmp_path):
+    wal_path = str(tmp_path / "agency.wal")
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    agency.open_log(wal_path, fsync=False)
+    populate(agency)
+    snapshotter = Snapshotter(agency, snapshot_path, interval=0)
+    assert snapshotter.snapshot()
+    # Nothing changed since
+    assert not snapshotter.snapshot()
+    paper = agency.newspapers[0]
+    agency.update_newspaper(paper, name="Renamed")
+    agency.add_issues_to_newspaper(paper.paper_id, [{"release_date": "21.04.2024", "number_of_pages": 12}])
+    agency.close_log()
+
+    restored = Agency()
+    info = load_snapshot(snapshot_path, restored)
+    replayed, _ = restored.open_log(wal_path, after_lsn=info.lsn)
+    restored.close_log()
+
+    # The log was cut down to the mutations after the snapshot
+    assert replayed == 2
+    assert snapshot(restored) == snapshot(agency)
+
+
+def test_snapshot_needs_an_empty_agency(tmp_path):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    paper = Newspaper(paper_id=1, name="Heute", frequency=1, price=1.5)
+    paper.issues.append(Issue(issue_id=1000, release_date="14.04.2024", number_of_pages=3))
+    agency.add_newspaper(paper)
+    save_snapshot(agency, path)
+
+    with pytest.raises(ValueError, match="empty agency"):
+        load_snapshot(path, agency)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "agency.snapshot"
+    path.write_bytes(b'{"op":"a","args":{}}\n' * 4)
+
+    with pytest.raises(ValueError, match="not a snapshot"):
+        load_snapshot(str(path), Agency())
+
+
+def test_auto_assignment_is_replayed_as_it_happened(tmp_path):
+    wal_path = str(tmp_path / "agency.wal")
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    agency.open_log(wal_path, fsync=False)
+    agency.add_newspaper(Newspaper(paper_id=1, name="Heute", frequency=1, price=1.5))
+    issues = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 3}] * 3)
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna")
+                        for editor_id in (10000, 10001, 10002)])
+    # The first issue becomes unassigned again last, a snapshot doesn't keep that order
+    agency.specify_editor(1, issues[0].issue_id, 10000)
+    agency.transfer_issues(agency.get_editor(10000))
+    agency.remove_editor(agency.get_editor(10000))
+    agency.add_newspaper_to_editor(1, 10001)
+    agency.add_newspaper_to_editor(1, 10002)
+    Snapshotter(agency, snapshot_path, interval=0).snapshot()
+    assigned = agency.auto_assign_issues()
+    agency.close_log()
+
+    restored = Agency()
+    info = load_snapshot(snapshot_path, restored)
+    restored.open_log(wal_path, after_lsn=info.lsn)
+    restored.close_log()
+
+    assert {(1, issue.issue_id): issue.editor_id for issue in restored.get_newspaper(1).issues} == assigned
+    assert snapshot(restored) == snapshot(agency)
+
+
+def test_subscribers_are_created_on_first_use(tmp_path):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    save_snapshot(agency, path)
+    restored = Agency()
+    load_snapshot(path, restored)
+    sub_ids = [sub.subscriber_id for sub in agency.subscribers]
+    assert all(restored.subscribers.pending(sub_id) for sub_id in sub_ids)
+    assert restored.subscribers.keys() == sub_ids
+
+    # Changes which don't look up the subscribers leave them pending, their backlogs are built once they are used
+    for target in (agency, restored):
+        paper, other = target.newspapers
+        issue = target.add_issue_to_newspaper(paper.paper_id, {"release_date": "20.04.2024", "number_of_pages": 4})
+        target.release_issue(paper.paper_id, issue.issue_id)
+        target.release_issue(paper.paper_id, paper.issues[2].issue_id)
+        target.deliver_issue(paper.paper_id, issue.issue_id, sub_ids[2])
+        target.remove_newspaper(other)
+    assert restored.subscribers.pending(sub_ids[0])
+    assert not restored.subscribers.pending(sub_ids[2])
+    assert restored.missing_issues(sub_ids[0]) == agency.missing_issues(sub_ids[0])
+
+    # A snapshot copies the pending subscribers from the loaded columns
+    save_snapshot(restored, path)
+    reloaded = Agency()
+    load_snapshot(path, reloaded)
+    assert snapshot(reloaded) == snapshot(restored) == snapshot(agency)
+
+
+class _ChangesBetweenLocks(object):
+    # Stands in for the read side of the agency's lock and runs the next change after each outermost read section
+
+    def __init__(self, read, changes):
+        self.read = read
+        self.changes = changes
+        self.depth = 0
+
+    def __enter__(self):
+        self.depth += 1
+        return self.read.__enter__()
+
+    def __exit__(self, *exc):
+        self.read.__exit__(*exc)
+        self.depth -= 1
+        if not self.depth and self.changes:
+            self.depth = 1
+            try:
+                self.changes.pop(0)()
+            finally:
+                self.depth = 0
+
+
+def test_subscribers_changed_during_a_capture_are_copied_again(tmp_path, monkeypatch):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    save_snapshot(agency, path)
+    # Pending subscribers of a loaded snapshot as well as created ones
+    restored = Agency()
+    load_snapshot(path, restored)
+    first, second, third, fourth = restored.subscribers.keys()
+    restored.get_subscriber(first)
+    paper_id = restored.newspapers[1].paper_id
+    new_id = restored.new_subscriber_id()
+
+    def change_copied():
+        restored.update_subscriber(restored.get_subscriber(first), name="Renamed")
+        restored.add_subscriber(Subscriber(subscriber_id=new_id, name="New", address="Graz"))
+
+    def add_again():
+        # Added again, it goes to the end
+        restored.remove_subscriber(restored.get_subscriber(second))
+        restored.add_subscriber(Subscriber(subscriber_id=second, name="Back", address="Linz"))
+
+    # One change after the lock is released before each chunk of one subscriber is copied
+    changes = [
+        lambda: restored.remove_subscriber(restored.get_subscriber(fourth)),
+        change_copied,
+        add_again,
+        lambda: restored.subscribe(paper_id, third),
+    ]
+    monkeypatch.setattr(snapshots, "SUBSCRIBER_CHUNK", 1)
+    monkeypatch.setattr(restored.lock, "read", _ChangesBetweenLocks(restored.lock.read, changes))
+    save_snapshot(restored, path)
+    assert not changes
+    monkeypatch.undo()
+
+    reloaded = Agency()
+    load_snapshot(path, reloaded)
+    assert reloaded.subscribers.keys() == restored.subscribers.keys() == [first, third, new_id, second]
+    assert snapshot(reloaded) == snapshot(restored)
+    assert restored.subscriber_changes is None
+
+
+def test_issues_without_a_newspaper_are_left_out(tmp_path):
+    path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    editor = agency.editors[0]
+    editor.issues.append(Issue(issue_id=1000, release_date="14.04.2024", number_of_pages=3))
+    save_snapshot(agency, path)
+
+    restored = Agency()
+    load_snapshot(path, restored)
+
+    assert [issue.issue_id for issue in restored.get_editor(editor.editor_id).issues] == \
+        [issue.issue_id for issue in editor.issues if issue.paper_id is not None]
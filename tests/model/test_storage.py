@@ -0,0 +1,108 @@
+import sqlite3
+
+import pytest
+
+from ...src.model.agency import Agency
+from ...src.model.editor import Editor
+from ...src.model.newspaper import Newspaper
+from ...src.model.snapshot import load_snapshot, save_snapshot
+from ...src.model.storage import SqliteStorage
+from ...src.model.subscriber import Subscriber
+from .test_wal import populate, snapshot
+
+
+def test_agency_is_restored_from_sqlite(tmp_path):
+    path = str(tmp_path / "agency.db")
+    agency = Agency(storage=SqliteStorage(path))
+    populate(agency)
+    agency.close()
+
+    restored = Agency(storage=SqliteStorage(path))
+    assert snapshot(restored) == snapshot(agency)
+    # IDs of removed entities are not handed out again
+    assert restored.new_paper_id() == agency.new_paper_id()
+    restored.close()
+
+
+def test_changes_to_registries_are_stored(tmp_path):
+    path = str(tmp_path / "agency.db")
+    agency = Agency(storage=SqliteStorage(path))
+    paper = Newspaper(paper_id=1, name="Heute", frequency=1, price=1.5)
+    agency.newspapers.append(paper)
+    sub = Subscriber(subscriber_id=100000, name="Max", address="Vienna")
+    agency.subscribers.append(sub)
+    sub.subscriptions.append(paper.paper_id)
+    agency.close()
+
+    restored = Agency(storage=SqliteStorage(path))
+    assert restored.get_newspaper_stats(1)["number_of_subscribers"] == 1
+    restored.close()
+
+
+def test_lazily_loaded_subscribers_are_stored(tmp_path):
+    snapshot_path = str(tmp_path / "agency.snapshot")
+    agency = Agency()
+    populate(agency)
+    save_snapshot(agency, snapshot_path)
+    path = str(tmp_path / "agency.db")
+    loaded = Agency(storage=SqliteStorage(path))
+    load_snapshot(snapshot_path, loaded)
+
+    # The subscriptions of a subscriber are followed once it is created
+    for target in (agency, loaded):
+        sub = target.subscribers[2]
+        target.subscribe(target.newspapers[1].paper_id, sub.subscriber_id)
+        sub.subscriptions.remove(target.newspapers[0].paper_id)
+    loaded.close()
+
+    restored = Agency(storage=SqliteStorage(path))
+    assert snapshot(restored) == snapshot(agency)
+    restored.close()
+
+
+def test_editor_links_are_stored_row_by_row(tmp_path):
+    path = str(tmp_path / "agency.db")
+    agency = Agency(storage=SqliteStorage(path))
+    agency.add_newspaper(Newspaper(paper_id=1, name="Heute", frequency=1, price=1.5))
+    issues = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 3}] * 3)
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Ana", address="Vienna") for editor_id in (1, 2)])
+    for issue in issues:
+        agency.specify_editor(1, issue.issue_id, 1)
+    agency.add_newspaper_to_editor(1, 2)
+    # The issue still names the editor, so it is transferred as well
+    agency.get_editor(1).issues.remove(issues[1])
+    agency.transfer_issues(agency.get_editor(1))
+    agency.close()
+
+    reader = sqlite3.connect(path)
+    assert reader.execute("SELECT editor_id, issue_id FROM editor_issues ORDER BY rowid").fetchall() == \
+        [(2, issue.issue_id) for issue in issues]
+    assert reader.execute("SELECT editor_id, paper_id FROM editor_newspapers ORDER BY rowid").fetchall() == \
+        [(1, 1), (2, 1)]
+    reader.close()
+    restored = Agency(storage=SqliteStorage(path))
+    assert snapshot(restored) == snapshot(agency)
+    restored.close()
+
+
+def test_batched_mutations_are_committed_together(tmp_path):
+    path = str(tmp_path / "agency.db")
+    storage = SqliteStorage(path, batch_size=1000)
+    agency = Agency(storage=storage)
+    reader = sqlite3.connect(path)
+
+    agency.add_newspaper(Newspaper(paper_id=1, name="Heute", frequency=1, price=1.5))
+    # Not committed yet, other connections don't see it
+    assert reader.execute("SELECT count(*) FROM newspapers").fetchone() == (0,)
+    with storage.batch():
+        for sub_id in agency.new_subscriber_ids(3):
+            agency.add_subscriber(Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna"))
+    assert reader.execute("SELECT count(*) FROM subscribers").fetchone() == (3,)
+    assert reader.execute("SELECT count(*) FROM newspapers").fetchone() == (1,)
+    reader.close()
+    agency.close()
+
+
+def test_batch_size_has_to_be_positive(tmp_path):
+    with pytest.raises(ValueError, match="at least 1"):
+        SqliteStorage(str(tmp_path / "agency.db"), batch_size=0)
@@ -0,0 +1,112 @@
+import threading
+
+from ...src.model import report
+from ...src.model.agency import Agency
+from ...src.model.newspaper import Newspaper
+from ...src.model.subscriber import Subscriber
+from .test_wal import populate
+
+
+def report_of(version):
+    return {(block.paper_id, sub_id, issue_id)
+            for block in version.missing_report()
+            for sub_id, issue_id in zip(block.subscriber_ids.tolist(), block.issue_ids.tolist())}
+
+
+def test_pinned_version_does_not_change():
+    agency = Agency()
+    populate(agency)
+    paper = agency.newspapers[0]
+    version = agency.pin()
+    subscriber_ids = version.papers[paper.paper_id].subscriber_ids.tolist()
+    report = report_of(version)
+    assert len(subscriber_ids) == agency.get_newspaper_stats(paper.paper_id)["number_of_subscribers"]
+    assert report
+
+    # A cascade and more deliveries after the pin are not seen by it
+    agency.remove_newspaper(paper)
+    agency.deliver_issue_to_all(agency.newspapers[0].paper_id, agency.newspapers[0].issues[0].issue_id)
+    assert version.papers[paper.paper_id].subscriber_ids.tolist() == subscriber_ids
+    assert report_of(version) == report
+
+    # A new pin sees them
+    latest = agency.pin()
+    assert paper.paper_id not in latest.papers
+    # It agrees with the backlogs, which are kept up to date on every change
+    assert report_of(latest) == {(paper_id, sub_id, issue_id)
+                                 for sub_id, backlog in agency.backlogs.items()
+                                 for paper_id, issue_ids in backlog.items()
+                                 for issue_id in issue_ids}
+    assert latest.number > version.number
+
+
+def test_unchanged_papers_are_shared():
+    agency = Agency()
+    populate(agency)
+    first, second = agency.newspapers[0], agency.newspapers[1]
+    version = agency.pin()
+    # Nothing changed, so the same version is handed out again
+    assert agency.pin() is version
+
+    agency.update_newspaper(first, price=9.0)
+    latest = agency.pin()
+    assert latest is not version
+    assert latest.papers[first.paper_id].price == 9.0
+    assert version.papers[first.paper_id].price == 3.5
+    assert latest.papers[second.paper_id] is version.papers[second.paper_id]
+
+
+def test_old_versions_are_reclaimed():
+    agency = Agency()
+    populate(agency)
+    version = agency.pin()
+    agency.update_newspaper(agency.newspapers[0], name="Renamed")
+    agency.pin()
+    assert agency.versions.live == 2
+
+    # Only the latest version is kept by the agency
+    del version
+    assert agency.versions.live == 1
+
+
+def test_reading_a_pinned_version_does_not_block_writers():
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                            for sub_id in range(10, 20)])
+    issue = agency.add_issue_to_newspaper(1, {"release_date": "14.04.2024", "number_of_pages": 10})
+    for sub_id in range(10, 20):
+        agency.subscribe(1, sub_id)
+    agency.release_issue(1, issue.issue_id)
+
+    report = agency.missing_report()
+    first = next(report)
+    # The report is half read, a writer in another thread still gets through
+    writer = threading.Thread(target=agency.deliver_issue_to_all, args=(1, issue.issue_id))
+    writer.start()
+    writer.join(timeout=5)
+    assert not writer.is_alive()
+    assert first.subscriber_ids.tolist() == list(range(10, 20))
+    assert list(report) == []
+    assert list(agency.missing_report()) == []
+
+
+def test_missing_report_in_small_blocks(monkeypatch):
+    agency = Agency()
+    agency.add_newspaper(Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0))
+    issues = agency.add_issues_to_newspaper(1, [{"release_date": "14.04.2024", "number_of_pages": 4}] * 3)
+    for issue in issues:
+        agency.release_issue(1, issue.issue_id)
+    agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                            for sub_id in range(100000, 100010)])
+    for sub in agency.subscribers:
+        agency.subscribe(1, sub.subscriber_id)
+    agency.deliver_issue_to_all(1, issues[1].issue_id, subscriber_ids=list(range(100000, 100010, 3)))
+    expected = report_of(agency.pin())
+
+    # Blocks of one and of two subscribers, the second one splits the rows unevenly
+    for cells in (1, 6):
+        monkeypatch.setattr(report, "BLOCK_CELLS", cells)
+        agency.versions.invalidate()
+        assert report_of(agency.pin()) == expected
+    assert len(expected) == 10 * 3 - 4
@@ -0,0 +1,157 @@
+import threading
+
+import pytest
+
+from ...src.model.agency import Agency
+from ...src.model.editor import Editor
+from ...src.model.newspaper import Newspaper
+from ...src.model.subscriber import Subscriber
+from ...src.model.wal import WriteAheadLog, read_log
+
+
+def test_concurrent_appends_share_commits(tmp_path):
+    path = str(tmp_path / "agency.wal")
+    wal = WriteAheadLog(path)
+
+    def append_many(worker):
+        for number in range(200):
+            wal.append({"op": "test", "args": {"worker": worker, "number": number}})
+
+    threads = [threading.Thread(target=append_many, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wal.close()
+
+    records = list(read_log(path))
+    assert len(records) == wal.records == 1600
+    assert wal.commits <= wal.records
+    # the records of each writer are in order
+    for worker in range(8):
+        assert [r["args"]["number"] for r in records if r["args"]["worker"] == worker] == list(range(200))
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    path = tmp_path / "agency.wal"
+    path.write_text('{"op":"a","args":{}}\n{"op":"b","ar')
+
+    assert [record["op"] for record in read_log(str(path))] == ["a"]
+
+    wal = WriteAheadLog(str(path))
+    wal.append({"op": "c", "args": {}})
+    wal.close()
+    assert [record["op"] for record in read_log(str(path))] == ["a", "c"]
+
+
+def test_corrupt_log_is_reported(tmp_path):
+    path = tmp_path / "agency.wal"
+    path.write_text('{"op":"a","args":{}}\nnot json\n{"op":"b","args":{}}\n')
+
+    with pytest.raises(ValueError, match="corrupt at line 2"):
+        list(read_log(str(path)))
+
+
+def snapshot(agency: Agency):
+    # Everything a restart has to bring back
+    return {
+        "newspapers": [(p.paper_id, p.name, p.frequency, p.price,
+                        [(i.issue_id, i.release_date, i.number_of_pages, i.released, i.editor_id) for i in p.issues])
+                       for p in agency.newspapers],
+        "editors": [(e.editor_id, e.editor_name, e.address, [p.paper_id for p in e.newspapers],
+                     [i.issue_id for i in e.issues]) for e in agency.editors],
+        "subscribers": [(s.subscriber_id, s.subscriber_name, s.subscriber_address, list(s.subscriptions),
+                         sorted(agency.deliveries.deliveries_of(s.subscriber_id))) for s in agency.subscribers],
+        "stats": {paper.paper_id: agency.get_newspaper_stats(paper.paper_id) for paper in agency.newspapers},
+        "missing": {s.subscriber_id: agency.missing_issues(s.subscriber_id) for s in agency.subscribers},
+        "ids": agency.ids.state(),
+    }
+
+
+def populate(agency: Agency):
+    # One of every logged mutation
+    papers = [Newspaper(paper_id=agency.new_paper_id(), name=f"Paper {n}", frequency=7, price=2.5) for n in range(3)]
+    agency.add_newspapers(papers[:2])
+    agency.add_newspaper(papers[2])
+    agency.update_newspaper(papers[0], price=3.5)
+    issues = agency.add_issues_to_newspaper(papers[0].paper_id, [{"release_date": "14.04.2024",
+                                                                   "number_of_pages": 10}] * 3)
+    single = agency.add_issue_to_newspaper(papers[1].paper_id, {"release_date": "15.04.2024", "number_of_pages": 8})
+    agency.add_editor(Editor(editor_id=agency.new_editor_id(), editor_name="Ana", address="Vienna"))
+    agency.add_editors([Editor(editor_id=editor_id, editor_name="Bob", address="Graz")
+                        for editor_id in agency.new_editor_ids(1)])
+    ana, bob = list(agency.editors)
+    agency.update_editor(bob, address="Linz")
+    agency.specify_editor(papers[0].paper_id, issues[0].issue_id, ana.editor_id)
+    agency.specify_editor(papers[0].paper_id, issues[1].issue_id, ana.editor_id)
+    agency.add_newspaper_to_editor(papers[0].paper_id, bob.editor_id)
+    agency.add_subscribers([Subscriber(subscriber_id=sub_id, name="Reader", address="Vienna")
+                            for sub_id in agency.new_subscriber_ids(5)])
+    subs = list(agency.subscribers)
+    agency.update_subscriber(subs[0], name="First reader")
+    for sub in subs:
+        agency.subscribe(papers[0].paper_id, sub.subscriber_id)
+    agency.subscribe(papers[1].paper_id, subs[1].subscriber_id)
+    agency.release_issue(papers[0].paper_id, issues[0].issue_id)
+    agency.release_issue(papers[0].paper_id, issues[1].issue_id)
+    agency.release_issue(papers[1].paper_id, single.issue_id)
+    agency.deliver_issue(papers[0].paper_id, issues[0].issue_id, subs[0].subscriber_id)
+    agency.deliver_issue_to_all(papers[0].paper_id, issues[1].issue_id)
+    agency.deliver_issue_to_all(papers[1].paper_id, single.issue_id, subscriber_ids=[subs[1].subscriber_id])
+    agency.transfer_issues(ana)
+    agency.remove_editor(ana)
+    agency.remove_subscriber(subs[4])
+    agency.remove_newspaper(papers[2])
+
+
+def test_agency_is_restored_from_its_log(tmp_path):
+    path = str(tmp_path / "agency.wal")
+    agency = Agency()
+    agency.open_log(path)
+    populate(agency)
+    agency.close_log()
+    expected = snapshot(agency)
+
+    restored = Agency()
+    replayed, _ = restored.open_log(path)
+    restored.close_log()
+
+    assert replayed == len(list(read_log(path)))
+    assert snapshot(restored) == expected
+    # IDs of removed entities are not handed out again
+    assert restored.new_paper_id() == agency.new_paper_id()
+
+
+def test_empty_batches_are_not_logged(tmp_path):
+    path = str(tmp_path / "agency.wal")
+    agency = Agency()
+    agency.open_log(path)
+    agency.add_newspapers([Newspaper(paper_id=1, name="Daily", frequency=1, price=1.0)])
+    lsn = agency.wal.lsn
+
+    agency.add_newspapers([])
+    agency.add_editors([])
+    agency.add_subscribers([])
+    assert agency.add_issues_to_newspaper(1, []) == []
+    # The newspaper is still checked
+    with pytest.raises(ValueError, match="A newspaper with ID 2 doesn't exist!"):
+        agency.add_issues_to_newspaper(2, [])
+    agency.close_log()
+
+    assert [record["lsn"] for record in read_log(path)] == [lsn]
+
+
+def test_truncate_keeps_the_records_after_the_lsn(tmp_path):
+    path = str(tmp_path / "agency.wal")
+    wal = WriteAheadLog(path)
+    for number in range(5):
+        wal.append({"op": "test", "args": {"number": number}})
+    wal.truncate(3)
+    wal.append({"op": "test", "args": {"number": 5}})
+    wal.close()
+
+    assert [(record["lsn"], record["args"]["number"]) for record in read_log(path)] == [(4, 3), (5, 4), (6, 5)]
+    # A reopened log continues after the last lsn
+    wal = WriteAheadLog(path, last_lsn=6)
+    assert wal.enqueue({"op": "test", "args": {}}) == 7
+    wal.close()